@@ -0,0 +1,28 @@
+"""permission version
+
+Revision ID: 3f1a9c2d7b4e
+Revises: ccb8831f5dc8
+Create Date: 2026-10-18 10:12:31.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1a9c2d7b4e'
+down_revision: Union[str, None] = 'ccb8831f5dc8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users',
+                  sa.Column('permission_version', sa.Integer(),
+                            server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'permission_version')
@@ -0,0 +1,63 @@
+"""login lookup
+
+Revision ID: 8d2c4e6f1a3b
+Revises: 3f1a9c2d7b4e
+Create Date: 2026-10-18 12:40:05.918273
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2c4e6f1a3b'
+down_revision: Union[str, None] = '3f1a9c2d7b4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # unique indexes on a partitioned table must contain the partition key,
+    # so this guarantees uniqueness per partition and gives each one a
+    # login index; the lookup table below makes logins globally unique
+    op.create_index('ix_users_login_continent', 'users',
+                    ['login', 'continent'], unique=True)
+    op.create_table('users_login_lookup',
+                    sa.Column('login', sa.String(length=255), nullable=False),
+                    sa.Column('user_id', sa.UUID(), nullable=False),
+                    sa.Column('continent', sa.String(length=50), nullable=False),
+                    sa.PrimaryKeyConstraint('login')
+                    )
+    op.execute(text(
+        'INSERT INTO users_login_lookup (login, user_id, continent) '
+        'SELECT login, id, continent FROM users'
+    ))
+    op.execute(text("""
+        CREATE FUNCTION sync_users_login_lookup() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM users_login_lookup WHERE login = OLD.login;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO users_login_lookup (login, user_id, continent)
+                VALUES (NEW.login, NEW.id, NEW.continent);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """))
+    op.execute(text(
+        'CREATE TRIGGER users_login_lookup_sync '
+        'AFTER INSERT OR DELETE OR UPDATE OF login, continent ON users '
+        'FOR EACH ROW EXECUTE FUNCTION sync_users_login_lookup()'
+    ))
+
+
+def downgrade() -> None:
+    op.execute(text('DROP TRIGGER users_login_lookup_sync ON users'))
+    op.execute(text('DROP FUNCTION sync_users_login_lookup()'))
+    op.drop_table('users_login_lookup')
+    op.drop_index('ix_users_login_continent', table_name='users')
@@ -0,0 +1,29 @@
+"""refresh token jti
+
+Revision ID: a4c6e8f0b2d9
+Revises: e2b8c4d6f9a1
+Create Date: 2026-10-18 19:05:41.382519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c6e8f0b2d9'
+down_revision: Union[str, None] = 'e2b8c4d6f9a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # tokens issued before this revision have no jti; their access tokens
+    # expire on their own within the access token lifetime
+    op.add_column('refresh_tokens',
+                  sa.Column('jti', sa.String(length=36), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('refresh_tokens', 'jti')
@@ -0,0 +1,87 @@
+"""partition users_logins
+
+Revision ID: c5f3a8e1d2b7
+Revises: 8d2c4e6f1a3b
+Create Date: 2026-10-18 14:05:47.330172
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5f3a8e1d2b7'
+down_revision: Union[str, None] = '8d2c4e6f1a3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PREMADE_MONTHS = 2
+
+
+def upgrade() -> None:
+    op.rename_table('users_logins', 'users_logins_old')
+    op.execute(text('ALTER TABLE users_logins_old RENAME CONSTRAINT '
+                    'users_logins_pkey TO users_logins_old_pkey'))
+    # the partition key has to be part of the primary key; the foreign key
+    # to users is not recreated, users.id alone is not unique across
+    # partitions
+    op.create_table('users_logins',
+                    sa.Column('id', sa.UUID(), nullable=False),
+                    sa.Column('user_id', sa.UUID(), nullable=False),
+                    sa.Column('signin_data', sa.String(length=255), nullable=True),
+                    sa.Column('login_at', sa.DateTime(), nullable=False,
+                              server_default=sa.text('now()')),
+                    sa.PrimaryKeyConstraint('id', 'login_at'),
+                    postgresql_partition_by='RANGE (login_at)'
+                    )
+    op.execute(text(f"""
+        DO $$
+        DECLARE month date;
+        BEGIN
+            FOR month IN SELECT generate_series(
+                date_trunc('month', COALESCE(
+                    (SELECT min(login_at) FROM users_logins_old), now())),
+                date_trunc('month', now()) + interval '{PREMADE_MONTHS} months',
+                interval '1 month')::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF users_logins '
+                    'FOR VALUES FROM (%L) TO (%L)',
+                    'users_logins_' || to_char(month, 'YYYY_MM'),
+                    month, month + interval '1 month');
+            END LOOP;
+        END $$
+    """))
+    op.execute(text(
+        'INSERT INTO users_logins (id, user_id, signin_data, login_at) '
+        'SELECT id, user_id, signin_data, COALESCE(login_at, now()) '
+        'FROM users_logins_old'
+    ))
+    op.drop_table('users_logins_old')
+    op.execute(text(
+        'CREATE INDEX ix_users_logins_user_id_login_at '
+        'ON users_logins (user_id, login_at DESC, id DESC)'
+    ))
+
+
+def downgrade() -> None:
+    op.rename_table('users_logins', 'users_logins_partitioned')
+    op.execute(text('ALTER TABLE users_logins_partitioned RENAME CONSTRAINT '
+                    'users_logins_pkey TO users_logins_partitioned_pkey'))
+    op.create_table('users_logins',
+                    sa.Column('id', sa.UUID(), nullable=False),
+                    sa.Column('user_id', sa.UUID(), nullable=False),
+                    sa.Column('signin_data', sa.String(length=255), nullable=True),
+                    sa.Column('login_at', sa.DateTime(), nullable=True),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('id')
+                    )
+    op.execute(text(
+        'INSERT INTO users_logins (id, user_id, signin_data, login_at) '
+        'SELECT id, user_id, signin_data, login_at '
+        'FROM users_logins_partitioned'
+    ))
+    op.drop_table('users_logins_partitioned')
@@ -0,0 +1,58 @@
+"""refresh token hash
+
+Revision ID: d7a9b3c5e8f1
+Revises: c5f3a8e1d2b7
+Create Date: 2026-10-18 15:22:09.614730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a9b3c5e8f1'
+down_revision: Union[str, None] = 'c5f3a8e1d2b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('refresh_tokens',
+                  sa.Column('token_hash', sa.String(length=64), nullable=True))
+    op.add_column('refresh_tokens',
+                  sa.Column('family_id', sa.UUID(), nullable=True))
+    op.add_column('refresh_tokens',
+                  sa.Column('used_at', sa.DateTime(), nullable=True))
+    # existing tokens keep working: each one becomes its own family
+    op.execute(text(
+        "UPDATE refresh_tokens SET token_hash = "
+        "encode(sha256(convert_to(token, 'UTF8')), 'hex'), family_id = id"
+    ))
+    op.alter_column('refresh_tokens', 'token_hash', nullable=False)
+    op.alter_column('refresh_tokens', 'family_id', nullable=False)
+    op.drop_column('refresh_tokens', 'token')
+    op.create_index(op.f('ix_refresh_tokens_token_hash'), 'refresh_tokens',
+                    ['token_hash'], unique=True)
+    op.create_index(op.f('ix_refresh_tokens_family_id'), 'refresh_tokens',
+                    ['family_id'], unique=False)
+    op.create_index(op.f('ix_refresh_tokens_user_id'), 'refresh_tokens',
+                    ['user_id'], unique=False)
+    op.create_index(op.f('ix_refresh_tokens_expires_at'), 'refresh_tokens',
+                    ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_refresh_tokens_expires_at'), table_name='refresh_tokens')
+    op.drop_index(op.f('ix_refresh_tokens_user_id'), table_name='refresh_tokens')
+    op.drop_index(op.f('ix_refresh_tokens_family_id'), table_name='refresh_tokens')
+    op.drop_index(op.f('ix_refresh_tokens_token_hash'), table_name='refresh_tokens')
+    # raw tokens cannot be recovered from their hashes
+    op.execute(text('DELETE FROM refresh_tokens'))
+    op.add_column('refresh_tokens',
+                  sa.Column('token', sa.String(length=255), nullable=False))
+    op.drop_column('refresh_tokens', 'used_at')
+    op.drop_column('refresh_tokens', 'family_id')
+    op.drop_column('refresh_tokens', 'token_hash')
@@ -0,0 +1,41 @@
+"""users socials
+
+Revision ID: e2b8c4d6f9a1
+Revises: d7a9b3c5e8f1
+Create Date: 2026-10-18 16:48:33.207156
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b8c4d6f9a1'
+down_revision: Union[str, None] = 'd7a9b3c5e8f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # no foreign key to users: users.id alone is not unique across the
+    # continent partitions
+    op.create_table('users_socials',
+                    sa.Column('id', sa.UUID(), nullable=False),
+                    sa.Column('user_id', sa.UUID(), nullable=False),
+                    sa.Column('provider', sa.String(length=50), nullable=False),
+                    sa.Column('provider_user_id', sa.String(length=255), nullable=False),
+                    sa.Column('access_token', sa.String(length=255), nullable=True),
+                    sa.Column('refresh_token', sa.String(length=255), nullable=True),
+                    sa.Column('token_expiry', sa.DateTime(), nullable=True),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('user_id', 'provider')
+                    )
+    op.create_index('ix_users_socials_provider_user', 'users_socials',
+                    ['provider', 'provider_user_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_socials_provider_user', table_name='users_socials')
+    op.drop_table('users_socials')
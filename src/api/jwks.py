@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Request, Response, status
+
+from services.jwt_keys import KeyStore, get_key_store
+
+router = APIRouter()
+
+
+@router.get('/jwks.json')
+async def jwks(
+        request: Request,
+        response: Response,
+        key_store: KeyStore = Depends(get_key_store)
+):
+    etag = key_store.jwks_etag()
+    headers = {'Cache-Control': 'public, max-age=300', 'ETag': etag}
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in (tag.strip().removeprefix('W/')
+                for tag in if_none_match.split(',')) \
+            or if_none_match.strip() == '*':
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                        headers=headers)
+    response.headers.update(headers)
+    return key_store.jwks()
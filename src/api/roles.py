@@ -3,12 +3,12 @@ from typing import Optional, List
 from uuid import UUID
 
 from fastapi import APIRouter, HTTPException, Depends
-from fastapi_limiter.depends import RateLimiter
 from pydantic import BaseModel
 
-from models import User
+from models import Principal
 from services.roles import RoleService, get_role_service
 from services.decorators import superuser_required
+from services.rate_limiter import RateLimit
 from services.users import get_current_user
 
 router = APIRouter()
@@ -29,19 +29,19 @@ class RoleInDB(BaseModel):
 
 
 @router.post("/roles/", response_model=RoleInDB, status_code=HTTPStatus.CREATED,
-             dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+             dependencies=[Depends(RateLimit('roles_create'))])
 @superuser_required
 async def create_role(
     role: RoleCreate,
     role_service: RoleService = Depends(get_role_service),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     new_role = await role_service.create_role(name=role.name, description=role.description)
     return new_role
 
 
 @router.get("/roles/", response_model=List[RoleInDB],
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
+            dependencies=[Depends(RateLimit('roles_list'))])
 async def get_roles(
     role_service: RoleService = Depends(get_role_service),
 ):
@@ -50,7 +50,7 @@ async def get_roles(
 
 
 @router.get("/roles/{role_id}", response_model=RoleInDB,
-            dependencies=[Depends(RateLimiter(times=15, seconds=60))])
+            dependencies=[Depends(RateLimit('roles_get'))])
 async def get_role(
     role_id: UUID,
     role_service: RoleService = Depends(get_role_service),
@@ -65,24 +65,24 @@ async def get_role(
 
 
 @router.put("/roles/{role_id}", response_model=RoleInDB,
-            dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+            dependencies=[Depends(RateLimit('roles_update'))])
 @superuser_required
 async def update_role(
     role_id: UUID,
     role: RoleCreate,
     role_service: RoleService = Depends(get_role_service),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     updated_role = await role_service.update_role(role_id=role_id, name=role.name, description=role.description)
     return updated_role
 
 
 @router.delete("/roles/{role_id}", status_code=HTTPStatus.NO_CONTENT,
-               dependencies=[Depends(RateLimiter(times=3, seconds=60))])
+               dependencies=[Depends(RateLimit('roles_delete'))])
 @superuser_required
 async def delete_role(
     role_id: UUID,
     role_service: RoleService = Depends(get_role_service),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     await role_service.delete_role(role_id=role_id)
@@ -4,16 +4,18 @@ from http import HTTPStatus
 from typing import Optional, Annotated, Any
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import ORJSONResponse
-from fastapi_limiter.depends import RateLimiter
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.postgres import get_session
 from models.user import User
 
+from services.password_hasher import PasswordHasher, get_password_hasher
+from services.rate_limiter import RateLimit
 from services.users import get_user_service, UserService
 
 router = APIRouter()
@@ -52,20 +54,30 @@ class Token(BaseModel):
 
 
 @router.post('/signup', response_model=UserInDB, status_code=HTTPStatus.CREATED,
-             dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+             dependencies=[Depends(RateLimit('signup'))])
 async def create_user(
-        user_create: UserCreate, db: AsyncSession = Depends(get_session)
+        user_create: UserCreate, db: AsyncSession = Depends(get_session),
+        hasher: PasswordHasher = Depends(get_password_hasher)
 ):
     user_dto = jsonable_encoder(user_create)
+    user_dto['password_hash'] = await hasher.hash(user_dto.pop('password'))
     user = User(**user_dto)
     db.add(user)
-    await db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail='User with this login already exists.'
+        )
     await db.refresh(user)
     return user
 
 
 @router.post(
-    path='/signin', dependencies=[Depends(RateLimiter(times=5, seconds=60))]
+    path='/signin',
+    dependencies=[Depends(RateLimit('signin'))]
 )
 async def login_user(
         user_login: UserLogin,
@@ -77,24 +89,36 @@ async def login_user(
 
 @router.get(
     path='/signin_history', response_model=list[UserSignin],
-    dependencies=[Depends(RateLimiter(times=5, seconds=60))]
+    dependencies=[Depends(RateLimit('signin_history'))]
 )
 async def signin_history(
         login: str,
+        response: Response,
         page_number: Annotated[int, Query(title="Page number", ge=1)] = 1,
         page_size: Annotated[int, Query(title="Page size", ge=2, le=100)] = 50,
+        cursor: Optional[str] = Query(
+            None, description='X-Next-Cursor of the previous page; faster '
+                              'than page_number, which it overrides'
+        ),
         service: UserService = Depends(get_user_service)
 ) -> Any:
-    response = await service.login_history(login, page_number, page_size)
+    try:
+        logins, next_cursor = await service.login_history(
+            login, page_size, cursor, page_number
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(e))
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
     return [UserSignin(
         login_at=user_login.login_at,
         signin_data=user_login.signin_data
-    ) for user_login in response]
+    ) for user_login in logins]
 
 
 @router.post(
     path='/check_token',
-    dependencies=[Depends(RateLimiter(times=15, seconds=60))]
+    dependencies=[Depends(RateLimit('check_token'))]
 )
 async def check_token(
         token: Token,
@@ -107,7 +131,7 @@ async def check_token(
 
 @router.post(
     path='/refresh',
-    dependencies=[Depends(RateLimiter(times=5, seconds=120))]
+    dependencies=[Depends(RateLimit('refresh'))]
 )
 async def refresh_token(
         token: Token,
@@ -125,3 +149,13 @@ async def logout(
     response = await service.logout(token.token)
 
     return response
+
+
+@router.post(path='/logout_all')
+async def logout_all(
+        token: Token,
+        service: UserService = Depends(get_user_service)
+) -> ORJSONResponse:
+    response = await service.logout_all(token.token)
+
+    return response
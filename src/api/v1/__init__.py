@@ -0,0 +1,3 @@
+CURSOR_HELP = ('Pass an empty cursor (cursor=) to start a walk, then the '
+               'next_cursor of each page; the walk ends when next_cursor is '
+               'null. Starting walks is rate limited.')
@@ -2,11 +2,14 @@ from http import HTTPStatus
 from typing import Optional, Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-from models import User
+from api.v1 import CURSOR_HELP
+from db.films_storage import CursorLimitExceeded
+from models import Principal
 from services.decorators import authentication_required
 from services.film import FilmService, get_film_service
+from services.rate_limiter import RateLimit, starts_cursor_walk
 from services.users import get_current_user
 
 router = APIRouter()
@@ -25,19 +28,55 @@ class FilmItem(BaseModel):
 
 class Films(BaseModel):
     result: list[FilmItem]
+    next_cursor: Optional[str] = None
 
 
-@router.get('/', response_model=Films)
+class FilmIds(BaseModel):
+    ids: list[str] = Field(min_length=1, max_length=100)
+
+
+class FilmsBatch(BaseModel):
+    result: list[Film]
+
+
+@router.get('/', response_model=Films,
+            dependencies=[Depends(
+                RateLimit('cursor_start', when=starts_cursor_walk)
+            )])
 @authentication_required
 async def films_list(
         page_number: Annotated[int, Query(title="Page number", ge=0)] = 1,
         page_size: Annotated[int, Query(title="Page size", ge=2, le=50)] = 50,
         sort: str = Query(''),
         order: str = Query(''),
+        cursor: Optional[str] = Query(None, description=CURSOR_HELP),
         film_service: FilmService = Depends(get_film_service),
-        current_user: User =Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ) -> Films:
+    if cursor is not None:
+        try:
+            films, next_cursor = await film_service.get_items_after(
+                short=True,
+                page_size=page_size,
+                cursor=cursor,
+                sort=sort,
+                order=order
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST, detail=str(e)
+            )
+        except CursorLimitExceeded as e:
+            raise HTTPException(
+                status_code=HTTPStatus.TOO_MANY_REQUESTS, detail=str(e)
+            )
+        return Films(
+            result=[FilmItem(id=film.id, title=film.title) for film in films],
+            next_cursor=next_cursor
+        )
+
     films = await film_service.get_items(
+        short=True,
         page_size=page_size,
         page_number=page_number,
         sort=sort,
@@ -57,9 +96,10 @@ async def film_search(
         query: str = Query(None),
         film_service: FilmService = Depends(get_film_service),
         order: str = Query(''),
-        current_user: User =Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ) -> Films:
     films = await film_service.get_items(
+        short=True,
         query=query,
         page_size=page_size,
         page_number=page_number,
@@ -71,12 +111,26 @@ async def film_search(
     )
 
 
+@router.post('/batch', response_model=FilmsBatch)
+@authentication_required
+async def films_batch(
+        film_ids: FilmIds,
+        film_service: FilmService = Depends(get_film_service),
+        current_user: Principal = Depends(get_current_user)
+) -> FilmsBatch:
+    films = await film_service.get_many(film_ids.ids)
+    return FilmsBatch(
+        result=[Film(id=film.id, title=film.title,
+                     description=film.description) for film in films]
+    )
+
+
 @router.get('/{film_id}', response_model=Film)
 @authentication_required
 async def film_details(
         film_id: str,
         film_service: FilmService = Depends(get_film_service),
-        current_user: User =Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ) -> Film:
     film = await film_service.get_by_id(film_id)
     if not film:
@@ -3,9 +3,12 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from typing import Optional, List, Annotated
 
-from models import User
+from api.v1 import CURSOR_HELP
+from db.films_storage import CursorLimitExceeded
+from models import Principal
 from services.decorators import authentication_required
 from services.genre import GenreService, get_genre_service
+from services.rate_limiter import RateLimit, starts_cursor_walk
 from services.users import get_current_user
 
 router = APIRouter()
@@ -19,18 +22,41 @@ class Genre(BaseModel):
 
 class Genres(BaseModel):
     result: List[Genre]
+    next_cursor: Optional[str] = None
 
 
-@router.get('/', response_model=Genres)
+@router.get('/', response_model=Genres,
+            dependencies=[Depends(
+                RateLimit('cursor_start', when=starts_cursor_walk)
+            )])
 @authentication_required
 async def genres_list(
-        page_number: Annotated[int, Query(title="Page number", ge=1)],
-        page_size: Annotated[int, Query(title="Page size", ge=2, le=50)],
+        page_number: Annotated[int, Query(title="Page number", ge=1)] = 1,
+        page_size: Annotated[int, Query(title="Page size", ge=2, le=50)] = 50,
         sort: str = Query(''),
         query: Optional[str] = Query(None),
+        cursor: Optional[str] = Query(None, description=CURSOR_HELP),
         genre_service: GenreService = Depends(get_genre_service),
-        current_user: User =Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ) -> Genres:
+    if cursor is not None:
+        try:
+            genres, next_cursor = await genre_service.get_items_after(
+                page_size=page_size,
+                cursor=cursor,
+                sort=sort,
+                query=query
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST, detail=str(e)
+            )
+        except CursorLimitExceeded as e:
+            raise HTTPException(
+                status_code=HTTPStatus.TOO_MANY_REQUESTS, detail=str(e)
+            )
+        return Genres(result=genres, next_cursor=next_cursor)
+
     genres = await genre_service.get_items(
         query=query,
         page_size=page_size,
@@ -45,7 +71,7 @@ async def genres_list(
 async def genre_details(
         genre_id: str,
         genre_service: GenreService = Depends(get_genre_service),
-        current_user: User =Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ) -> Genre:
     genre = await genre_service.get_by_id(genre_id)
     if not genre:
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Cookie, HTTPException, Depends, Request
+from fastapi.responses import RedirectResponse
+
+from core.config import settings
+from services.oauth.oauth_service import (
+    ProviderRegistry, get_provider_registry
+)
+from services.oauth.state import STATE_COOKIE, issue_state, verify_state
+from services.users import UserService, get_user_service
+from services.rate_limiter import RateLimit
+
+router = APIRouter()
+
+
+@router.get("/login/{provider}",
+            dependencies=[Depends(RateLimit('oauth_login'))])
+async def login(provider: str, request: Request,
+                registry: ProviderRegistry = Depends(get_provider_registry)):
+    try:
+        oauth_provider = registry.get(provider)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    state, nonce = issue_state(provider)
+    oauth_url = await oauth_provider.get_authorization_url(state)
+    if not oauth_url:
+        raise HTTPException(status_code=400,
+                            detail=f"Failed to reach {provider}")
+    response = RedirectResponse(url=oauth_url)
+    # lax, so the cookie comes back on the provider's redirect
+    response.set_cookie(STATE_COOKIE, nonce,
+                        max_age=settings.oauth_state_ttl_seconds,
+                        httponly=True, samesite='lax',
+                        secure=request.url.scheme == 'https')
+    return response
+
+
+@router.get("/callback/{provider}",
+            dependencies=[Depends(RateLimit('oauth_callback'))])
+async def callback(provider: str, code: str = None, state: str = None,
+                   nonce: str = Cookie(None, alias=STATE_COOKIE),
+                   registry: ProviderRegistry = Depends(get_provider_registry),
+                   service: UserService = Depends(get_user_service)):
+    if not verify_state(provider, state, nonce):
+        raise HTTPException(status_code=400,
+                            detail="Invalid or expired OAuth state")
+    if not code:
+        raise HTTPException(status_code=400,
+                            detail=f"Code not provided by OAuth provider")
+    try:
+        oauth_provider = registry.get(provider)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    token = await oauth_provider.get_token(code)
+    if not token or not token.get('access_token'):
+        raise HTTPException(status_code=400,
+                            detail=f"Failed to obtain token "
+                                   f"from {provider}")
+
+    user_info = await oauth_provider.get_user_info(token)
+    if not user_info or not user_info.get('id'):
+        raise HTTPException(status_code=400,
+                            detail=f"Failed to obtain user info "
+                                   f"from {provider}")
+
+    response = await service.social_login(provider, user_info)
+    response.delete_cookie(STATE_COOKIE)
+    return response
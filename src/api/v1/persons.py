@@ -3,9 +3,12 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from typing import Optional, List, Annotated
 
-from models import User
+from api.v1 import CURSOR_HELP
+from db.films_storage import CursorLimitExceeded
+from models import Principal
 from services.decorators import authentication_required
 from services.person import PersonService, get_person_service
+from services.rate_limiter import RateLimit, starts_cursor_walk
 from services.users import get_current_user
 
 router = APIRouter()
@@ -19,18 +22,41 @@ class Person(BaseModel):
 
 class Persons(BaseModel):
     result: List[Person]
+    next_cursor: Optional[str] = None
 
 
-@router.get('/', response_model=Persons)
+@router.get('/', response_model=Persons,
+            dependencies=[Depends(
+                RateLimit('cursor_start', when=starts_cursor_walk)
+            )])
 @authentication_required
 async def persons_list(
-        page_number: Annotated[int, Query(title="Page size", ge=1)],
-        page_size: Annotated[int, Query(title="Page size", ge=2, le=50)],
+        page_number: Annotated[int, Query(title="Page number", ge=1)] = 1,
+        page_size: Annotated[int, Query(title="Page size", ge=2, le=50)] = 50,
         sort: str = Query(''),
         query: Optional[str] = Query(None),
+        cursor: Optional[str] = Query(None, description=CURSOR_HELP),
         person_service: PersonService = Depends(get_person_service),
-        current_user: User =Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ) -> Persons:
+    if cursor is not None:
+        try:
+            persons, next_cursor = await person_service.get_items_after(
+                page_size=page_size,
+                cursor=cursor,
+                sort=sort,
+                query=query
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST, detail=str(e)
+            )
+        except CursorLimitExceeded as e:
+            raise HTTPException(
+                status_code=HTTPStatus.TOO_MANY_REQUESTS, detail=str(e)
+            )
+        return Persons(result=persons, next_cursor=next_cursor)
+
     persons = await person_service.get_items(
         query=query,
         page_size=page_size,
@@ -45,7 +71,7 @@ async def persons_list(
 async def person_details(
         person_id: str,
         person_service: PersonService = Depends(get_person_service),
-        current_user: User =Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ) -> Person:
     person = await person_service.get_by_id(person_id)
     if not person:
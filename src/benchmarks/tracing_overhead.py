@@ -0,0 +1,82 @@
+"""Per-request cost of the tracing pipeline.
+
+    python -m benchmarks.tracing_overhead [requests]
+
+Runs the same trivial endpoint without instrumentation and with the
+configured sampler at several ratios. Spans go to an exporter that drops
+them, so only the in-process cost is measured.
+"""
+import asyncio
+import logging
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+from core import tracing
+
+
+class NullExporter(SpanExporter):
+
+    def __init__(self):
+        self.exported = 0
+
+    def export(self, spans) -> SpanExportResult:
+        self.exported += len(spans)
+        return SpanExportResult.SUCCESS
+
+
+def make_app(ratio=None):
+    app = FastAPI()
+
+    @app.get('/ping')
+    async def ping():
+        return {'ok': True}
+
+    if ratio is None:
+        return app, None, None
+    # a provider per ratio, handed to the instrumentor directly: neither
+    # the shared settings nor the global provider are touched
+    exporter = NullExporter()
+    provider = tracing.create_tracer_provider(
+        [exporter], tracing.get_sampler(ratio)
+    )
+    FastAPIInstrumentor.instrument_app(app, tracer_provider=provider)
+    return app, provider, exporter
+
+
+async def run(app, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport,
+                                 base_url='http://bench') as client:
+        for _ in range(200):
+            await client.get('/ping')
+        started = time.perf_counter()
+        for _ in range(requests):
+            await client.get('/ping')
+        return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    baseline = None
+    print(f'{"sampling":>12} {"us/request":>11} {"overhead":>9} {"exported":>9}')
+    for ratio in (None, 0.0, 0.01, 0.1, 1.0):
+        app, provider, exporter = make_app(ratio)
+        per_request = asyncio.run(run(app, requests))
+        if provider:
+            provider.shutdown()
+        if baseline is None:
+            baseline = per_request
+        label = 'off' if ratio is None else f'{ratio:.0%}'
+        print(f'{label:>12} {per_request:11.1f} '
+              f'{per_request - baseline:+9.1f} '
+              f'{exporter.exported if exporter else 0:9d}')
+
+
+if __name__ == '__main__':
+    main()
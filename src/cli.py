@@ -1,8 +1,12 @@
 import typer
 from models.user import User
-from db.postgres import get_session
+from db.partitions import (
+    drop_expired_login_partitions, ensure_login_partitions
+)
+from db.postgres import async_session, engine
+from core.config import settings
+from services.password_hasher import password_hasher
 from sqlalchemy.exc import SQLAlchemyError
-from werkzeug.security import generate_password_hash
 import asyncio
 
 app = typer.Typer()
@@ -20,12 +24,12 @@ async def _create_superuser(username: str,
                             password: str,
                             first_name: str,
                             last_name: str):
-    async with get_session() as session:
+    async with async_session() as session:
         try:
-            hashed_password = generate_password_hash(password)
+            hashed_password = await password_hasher.hash(password)
             superuser = User(
                 login=username,
-                password=hashed_password,
+                password_hash=hashed_password,
                 first_name=first_name,
                 last_name=last_name,
                 is_superuser=True
@@ -38,6 +42,24 @@ async def _create_superuser(username: str,
             typer.echo(f"Error creating superuser: {str(e)}")
         finally:
             await session.close()
+            password_hasher.shutdown()
+
+
+@app.command()
+def maintain_login_partitions(
+        retention_months: int = settings.login_history_retention_months,
+        premake_months: int = settings.login_history_premake_months):
+    asyncio.run(_maintain_login_partitions(retention_months, premake_months))
+
+
+async def _maintain_login_partitions(retention_months: int,
+                                     premake_months: int):
+    async with engine.begin() as conn:
+        created = await ensure_login_partitions(conn, premake_months)
+        dropped = await drop_expired_login_partitions(conn, retention_months)
+    await engine.dispose()
+    typer.echo(f"Created partitions: {', '.join(created) or 'none'}")
+    typer.echo(f"Dropped partitions: {', '.join(dropped) or 'none'}")
 
 
 if __name__ == "__main__":
@@ -1,13 +1,12 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
+from typing import Optional
 import os
 from logging import config as logging_config
 from starlette.config import Config
 from authlib.integrations.starlette_client import OAuth
 
-from core.logger import LOGGING
-
-logging_config.dictConfig(LOGGING)
+from core.logger import get_logging_config
 
 env_file_path = os.path.join(
     os.path.dirname(os.path.dirname(os.path.dirname(__file__))), ".env"
@@ -16,6 +15,14 @@ env_file_path = os.path.join(
 class Settings(BaseSettings):
     project_name: str = Field('movies_auth', alias='PROJECT_NAME')
 
+    log_level: str = Field('INFO', alias='LOG_LEVEL')
+    log_json: bool = Field(True, alias='LOG_JSON')
+    log_queue_size: int = Field(10000, alias='LOG_QUEUE_SIZE')
+    # DEBUG sampling rates by logger name, e.g. {"services.users": 0.01}
+    log_sampling: dict[str, float] = Field(
+        {'services.users': 0.01}, alias='LOG_SAMPLING'
+    )
+
     redis_host: str = Field('redis', alias='REDIS_HOST')
     redis_port: int = Field(6379, alias='REDIS_PORT')
 
@@ -29,22 +36,152 @@ class Settings(BaseSettings):
     film_index: str = 'movies'
     genre_index: str = 'genres'
     person_index: str = 'persons'
+    es_pit_keep_alive: str = Field('1m', alias='ES_PIT_KEEP_ALIVE')
+    # per worker; abandoned cursor walks count until their keep alive ends
+    es_max_open_pits: int = Field(100, alias='ES_MAX_OPEN_PITS')
 
     cache_expire_in_seconds: int = 5
+    # entries refresh as often as they used to expire; past the soft TTL a
+    # stale copy is served while a single request refreshes it, and the
+    # hard TTL bounds how long that copy can outlive an Elasticsearch outage
+    cache_soft_ttl_in_seconds: dict[str, int] = Field(
+        {'movies': 5, 'genres': 5, 'persons': 5},
+        alias='CACHE_SOFT_TTL_IN_SECONDS'
+    )
+    cache_hard_ttl_in_seconds: dict[str, int] = Field(
+        {'movies': 600, 'genres': 3600, 'persons': 1200},
+        alias='CACHE_HARD_TTL_IN_SECONDS'
+    )
+    cache_ttl_jitter: float = Field(0.1, alias='CACHE_TTL_JITTER')
+    local_cache_max_items: int = Field(10000, alias='LOCAL_CACHE_MAX_ITEMS')
+    local_cache_ttl_in_seconds: int = Field(2, alias='LOCAL_CACHE_TTL_IN_SECONDS')
+    cache_lock_enabled: bool = Field(False, alias='CACHE_LOCK_ENABLED')
+    cache_lock_timeout_in_seconds: int = Field(3, alias='CACHE_LOCK_TIMEOUT_IN_SECONDS')
 
     postgres_db: str = Field('postgres', alias='POSTGRES_DB')
     postgres_user: str = Field('postgres', alias='POSTGRES_USER')
     postgres_password: str = Field('postgres', alias='POSTGRES_PASSWORD')
     db_host: str = Field('127.0.0.1', alias='DB_HOST')
     db_port: int = Field(5432, alias='DB_PORT')
+    db_echo: bool = Field(False, alias='DB_ECHO')
+    db_pool_size: int = Field(10, alias='DB_POOL_SIZE')
+    db_max_overflow: int = Field(20, alias='DB_MAX_OVERFLOW')
+    db_pool_timeout: int = Field(10, alias='DB_POOL_TIMEOUT')
+    db_pool_recycle: int = Field(1800, alias='DB_POOL_RECYCLE')
+    db_pool_pre_ping: bool = Field(True, alias='DB_POOL_PRE_PING')
+    db_statement_timeout_ms: int = Field(
+        5000, alias='DB_STATEMENT_TIMEOUT_MS'
+    )
+    db_prepared_statement_cache_size: int = Field(
+        500, alias='DB_PREPARED_STATEMENT_CACHE_SIZE'
+    )
+    db_replica_hosts: list[str] = Field([], alias='DB_REPLICA_HOSTS')
+    db_replica_max_lag_seconds: float = Field(
+        5.0, alias='DB_REPLICA_MAX_LAG_SECONDS'
+    )
+    db_replica_check_interval_seconds: int = Field(
+        10, alias='DB_REPLICA_CHECK_INTERVAL_SECONDS'
+    )
+
+    login_events_batch_size: int = Field(500, alias='LOGIN_EVENTS_BATCH_SIZE')
+    login_events_flush_interval_seconds: float = Field(
+        1.0, alias='LOGIN_EVENTS_FLUSH_INTERVAL_SECONDS'
+    )
+    login_events_queue_size: int = Field(
+        10000, alias='LOGIN_EVENTS_QUEUE_SIZE'
+    )
+    login_history_retention_months: int = Field(
+        12, alias='LOGIN_HISTORY_RETENTION_MONTHS'
+    )
+    login_history_premake_months: int = Field(
+        2, alias='LOGIN_HISTORY_PREMAKE_MONTHS'
+    )
+    login_history_maintenance_interval_seconds: int = Field(
+        21600, alias='LOGIN_HISTORY_MAINTENANCE_INTERVAL_SECONDS'
+    )
 
     secret_key: str = Field('q!@#j4k3l2m9z8y7x6v5u4t3s2r1p0', alias='SECRET_KEY')
     access_token_lifetime: int = Field(15, alias='ACCESS_TOKEN_LIFETIME')
     refresh_token_lifetime: int = Field(14400, alias='REFRESH_TOKEN_LIFETIME')
+    refresh_token_sweep_interval_seconds: int = Field(
+        300, alias='REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS'
+    )
+    refresh_token_sweep_batch_size: int = Field(
+        5000, alias='REFRESH_TOKEN_SWEEP_BATCH_SIZE'
+    )
     algorithm: str = Field('HS256', alias='ALGORITHM')
+    jwt_keys_dir: Optional[str] = Field(None, alias='JWT_KEYS_DIR')
+    jwt_active_kid: Optional[str] = Field(None, alias='JWT_ACTIVE_KID')
+    token_format: str = Field('legacy', alias='TOKEN_FORMAT')
+    revocation_bloom_capacity: int = Field(
+        1000000, alias='REVOCATION_BLOOM_CAPACITY'
+    )
+    revocation_bloom_error_rate: float = Field(
+        0.001, alias='REVOCATION_BLOOM_ERROR_RATE'
+    )
+    revocation_resync_in_seconds: int = Field(
+        300, alias='REVOCATION_RESYNC_IN_SECONDS'
+    )
+    password_hash_method: str = Field(
+        'scrypt:32768:8:1', alias='PASSWORD_HASH_METHOD'
+    )
+    password_hash_workers: int = Field(2, alias='PASSWORD_HASH_WORKERS')
+    password_verify_cache_max_items: int = Field(
+        10000, alias='PASSWORD_VERIFY_CACHE_MAX_ITEMS'
+    )
+    password_verify_cache_ttl_in_seconds: int = Field(
+        60, alias='PASSWORD_VERIFY_CACHE_TTL_IN_SECONDS'
+    )
+    password_hash_concurrency: int = Field(
+        8, alias='PASSWORD_HASH_CONCURRENCY'
+    )
+    principal_cache_max_items: int = Field(
+        100000, alias='PRINCIPAL_CACHE_MAX_ITEMS'
+    )
+
+    rate_limit_enabled: bool = Field(True, alias='RATE_LIMIT_ENABLED')
+    rate_limit_sync_interval_seconds: float = Field(
+        1.0, alias='RATE_LIMIT_SYNC_INTERVAL_SECONDS'
+    )
+    rate_limit_policies: dict[str, dict] = Field(
+        {}, alias='RATE_LIMIT_POLICIES'
+    )
+    rate_limit_trusted_proxies: list[str] = Field(
+        [], alias='RATE_LIMIT_TRUSTED_PROXIES'
+    )
+    rate_limit_client_header: str = Field(
+        'X-Client-Id', alias='RATE_LIMIT_CLIENT_HEADER'
+    )
 
     jaeger_host: str = Field('127.0.0.1', alias='JAEGER_HOST')
     jaeger_port: int = Field(6831, alias='JAEGER_PORT')
+    tracing_enabled: bool = Field(True, alias='TRACING_ENABLED')
+    tracing_exporters: list[str] = Field(['jaeger'], alias='TRACING_EXPORTERS')
+    tracing_sample_ratio: float = Field(0.1, alias='TRACING_SAMPLE_RATIO')
+    tracing_parent_based: bool = Field(True, alias='TRACING_PARENT_BASED')
+    # records every span so unsampled ones that fail can still be exported;
+    # this costs as much as 100% sampling and the kept spans arrive without
+    # their parents. Prefer tail sampling in the collector for errors.
+    tracing_keep_errors: bool = Field(False, alias='TRACING_KEEP_ERRORS')
+    tracing_max_queue_size: int = Field(2048, alias='TRACING_MAX_QUEUE_SIZE')
+    tracing_max_export_batch_size: int = Field(
+        512, alias='TRACING_MAX_EXPORT_BATCH_SIZE'
+    )
+    tracing_schedule_delay_millis: int = Field(
+        5000, alias='TRACING_SCHEDULE_DELAY_MILLIS'
+    )
+    tracing_export_timeout_millis: int = Field(
+        30000, alias='TRACING_EXPORT_TIMEOUT_MILLIS'
+    )
+    otlp_endpoint: str = Field('http://127.0.0.1:4317', alias='OTLP_ENDPOINT')
+    otlp_insecure: bool = Field(True, alias='OTLP_INSECURE')
+    metrics_enabled: bool = Field(True, alias='METRICS_ENABLED')
+    metrics_exporters: list[str] = Field(
+        ['prometheus'], alias='METRICS_EXPORTERS'
+    )
+    metrics_export_interval_millis: int = Field(
+        60000, alias='METRICS_EXPORT_INTERVAL_MILLIS'
+    )
 
     client_id: str = Field(None, alias="CLIENT_ID")
     client_secret: str = Field(None, alias="CLIENT_SECRET")
@@ -52,6 +189,36 @@ class Settings(BaseSettings):
     authorize_url: str = Field(None, alias="AUTHORIZE_URL")
     access_token_url: str = Field(None, alias="ACCESS_TOKEN_URL")
     authorize_provider: str = Field("yandex", alias="AUTHORIZE_PROVIDER")
+    oauth_providers: dict[str, dict] = Field({}, alias='OAUTH_PROVIDERS')
+    oauth_metadata_ttl_seconds: int = Field(
+        3600, alias='OAUTH_METADATA_TTL_SECONDS'
+    )
+    oauth_metadata_refresh_seconds: int = Field(
+        900, alias='OAUTH_METADATA_REFRESH_SECONDS'
+    )
+    oauth_state_ttl_seconds: int = Field(600, alias='OAUTH_STATE_TTL_SECONDS')
+    oauth_http_timeout_seconds: float = Field(
+        5.0, alias='OAUTH_HTTP_TIMEOUT_SECONDS'
+    )
+    oauth_http_connect_timeout_seconds: float = Field(
+        2.0, alias='OAUTH_HTTP_CONNECT_TIMEOUT_SECONDS'
+    )
+    oauth_http_max_connections: int = Field(
+        100, alias='OAUTH_HTTP_MAX_CONNECTIONS'
+    )
+    oauth_http_keepalive_seconds: float = Field(
+        30.0, alias='OAUTH_HTTP_KEEPALIVE_SECONDS'
+    )
+    oauth_http_provider_concurrency: int = Field(
+        20, alias='OAUTH_HTTP_PROVIDER_CONCURRENCY'
+    )
+    oauth_http_retries: int = Field(2, alias='OAUTH_HTTP_RETRIES')
+    oauth_http_backoff_seconds: float = Field(
+        0.2, alias='OAUTH_HTTP_BACKOFF_SECONDS'
+    )
+    oauth_http_backoff_max_seconds: float = Field(
+        2.0, alias='OAUTH_HTTP_BACKOFF_MAX_SECONDS'
+    )
 
     @property
     def dsn(self) -> dict:
@@ -71,6 +238,11 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
+logging_config.dictConfig(get_logging_config(
+    settings.log_level, settings.log_json, settings.log_sampling,
+    settings.log_queue_size
+))
+
 config = Config(env_file_path)
 oauth = OAuth(config)
 oauth.register(
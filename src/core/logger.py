@@ -1,57 +1,169 @@
-LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s -%(message)s'
-LOG_DEFAULT_HANDLERS = ['console', ]
-
-LOGGING = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'formatters': {
-        'verbose': {
-            'format': LOG_FORMAT
-        },
-        'default': {
-            '()': 'uvicorn.logging.DefaultFormatter',
-            'fmt': '%(levelprefix)s %(message)s',
-            'use_colors': None,
-        },
-        'access': {
-            '()': 'uvicorn.logging.AccessFormatter',
-            'fmt': "%(levelprefix)s %(client_addr)s - '%(request_line)s' %(status_code)s",
-        },
-    },
-    'handlers': {
-        'console': {
-            'level': 'DEBUG',
-            'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
-        },
-        'default': {
-            'formatter': 'default',
-            'class': 'logging.StreamHandler',
-            'stream': 'ext://sys.stdout',
-        },
-        'access': {
-            'formatter': 'access',
-            'class': 'logging.StreamHandler',
-            'stream': 'ext://sys.stdout',
+import atexit
+import datetime
+import logging
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+import orjson
+from opentelemetry import trace
+
+LOG_FORMAT = ('%(asctime)s - %(name)s - %(levelname)s - '
+              '[%(request_id)s %(trace_id)s] %(message)s')
+
+request_id_var: ContextVar[Optional[str]] = ContextVar(
+    'request_id', default=None
+)
+
+listener: Optional[QueueListener] = None
+
+
+class ContextFilter(logging.Filter):
+    # runs in the thread that logs, where the request context is still set
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        span_context = trace.get_current_span().get_span_context()
+        if span_context.is_valid:
+            record.trace_id = format(span_context.trace_id, '032x')
+            record.span_id = format(span_context.span_id, '016x')
+        else:
+            record.trace_id = record.span_id = None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    # {'services.users': 0.01} keeps one in a hundred DEBUG records of that
+    # logger and its children; INFO and above are never sampled
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        if name not in self._resolved:
+            rate, prefix = 1.0, name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition('.')[0]
+            self._resolved[name] = rate
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'trace_id': getattr(record, 'trace_id', None),
+            'span_id': getattr(record, 'span_id', None),
+        }
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return orjson.dumps(data, default=str).decode()
+
+
+class DroppingQueueHandler(QueueHandler):
+    # a full queue drops records: logging must never block the event loop
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # only the message and traceback text cross the thread boundary,
+        # formatting is left to the listener
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def get_queue_handler(json_output: bool = True,
+                      queue_size: int = 10000) -> DroppingQueueHandler:
+    global listener
+    if listener is not None:
+        listener.stop()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if json_output
+                        else logging.Formatter(LOG_FORMAT))
+    handler = DroppingQueueHandler(queue.Queue(queue_size))
+    listener = QueueListener(handler.queue, stream)
+    listener.start()
+    return handler
+
+
+def stop_logging() -> None:
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+atexit.register(stop_logging)
+
+
+def get_logging_config(level: str = 'INFO', json_output: bool = True,
+                       sampling: Optional[dict[str, float]] = None,
+                       queue_size: int = 10000) -> dict:
+    return {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'filters': {
+            'context': {'()': ContextFilter},
+            'sampling': {'()': SamplingFilter, 'rates': sampling or {}},
         },
-    },
-    'loggers': {
-        '': {
-            'handlers': LOG_DEFAULT_HANDLERS,
-            'level': 'INFO',
+        'handlers': {
+            'queue': {
+                '()': get_queue_handler,
+                'json_output': json_output,
+                'queue_size': queue_size,
+                'filters': ['sampling', 'context'],
+            },
         },
-        'uvicorn.error': {
-            'level': 'INFO',
+        'loggers': {
+            'uvicorn': {
+                'handlers': ['queue'],
+                'level': level,
+                'propagate': False,
+            },
+            'uvicorn.access': {
+                'handlers': ['queue'],
+                'level': level,
+                'propagate': False,
+            },
         },
-        'uvicorn.access': {
-            'handlers': ['access'],
-            'level': 'INFO',
-            'propagate': False,
+        'root': {
+            'level': level,
+            'handlers': ['queue'],
         },
-    },
-    'root': {
-        'level': 'INFO',
-        'formatter': 'verbose',
-        'handlers': LOG_DEFAULT_HANDLERS,
-    },
-}
+    }
@@ -0,0 +1,130 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from opentelemetry import metrics, trace
+from opentelemetry.metrics import CallbackOptions, Observation
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.view import (ExplicitBucketHistogramAggregation,
+                                            View)
+from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+
+from core.config import settings
+
+PAYLOAD_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+tracer = trace.get_tracer('auth-service')
+meter = metrics.get_meter('auth-service')
+
+operation_duration = meter.create_histogram(
+    'auth_operation_duration', unit='ms',
+    description='Time spent in cache, storage, database and hashing calls'
+)
+payload_size = meter.create_histogram(
+    'auth_operation_payload_size', unit='By',
+    description='Size of values read from and written to caches and storage'
+)
+
+# component name -> callable returning the component's stats() dict
+stats_sources: dict[str, Callable[[], Optional[dict]]] = {}
+
+
+class Operation:
+
+    def __init__(self, span, attributes: dict):
+        self.span = span
+        self.attributes = attributes
+
+    def set(self, key: str, value) -> None:
+        # attributes set here are also metric labels, so values have to
+        # come from a small fixed set (hit/miss, index names, ...)
+        self.attributes[key] = value
+        self.span.set_attribute(key, value)
+
+    def record_size(self, size: int) -> None:
+        self.span.set_attribute('payload.bytes', size)
+        payload_size.record(size, self.attributes)
+
+
+@contextmanager
+def observe(component: str, operation: str, **attributes) -> Iterator[Operation]:
+    attributes = {'component': component, 'operation': operation,
+                  **attributes}
+    with tracer.start_as_current_span(f'{component}.{operation}',
+                                      attributes=attributes) as span:
+        current = Operation(span, attributes)
+        started = time.perf_counter()
+        try:
+            yield current
+        except Exception:
+            current.attributes['error'] = True
+            raise
+        finally:
+            operation_duration.record(
+                (time.perf_counter() - started) * 1000, current.attributes
+            )
+
+
+def register_stats(component: str,
+                   source: Callable[[], Optional[dict]]) -> None:
+    stats_sources[component] = source
+
+
+def _flatten(stats: dict, prefix: str = '') -> Iterator[tuple[str, float]]:
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f'{prefix}{name}.')
+        elif isinstance(value, (int, float)):
+            yield f'{prefix}{name}', value
+
+
+def observe_stats(options: CallbackOptions) -> Iterator[Observation]:
+    for component, source in list(stats_sources.items()):
+        stats = source()
+        if not stats:
+            continue
+        for name, value in _flatten(stats):
+            yield Observation(value, {'component': component, 'stat': name})
+
+
+meter.create_observable_gauge(
+    'auth_component_stats', callbacks=[observe_stats],
+    description='Counters and gauges reported by the components stats()'
+)
+
+
+def get_metric_reader(name: str):
+    if name == 'prometheus':
+        from opentelemetry.exporter.prometheus import PrometheusMetricReader
+        return PrometheusMetricReader()
+    if name == 'otlp':
+        from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import \
+            OTLPMetricExporter
+        from opentelemetry.sdk.metrics.export import \
+            PeriodicExportingMetricReader
+        return PeriodicExportingMetricReader(
+            OTLPMetricExporter(endpoint=settings.otlp_endpoint,
+                               insecure=settings.otlp_insecure),
+            export_interval_millis=settings.metrics_export_interval_millis
+        )
+    raise ValueError(f'Unknown metrics exporter: {name}')
+
+
+def configure_meter(readers: Optional[list] = None) -> Optional[MeterProvider]:
+    if not settings.metrics_enabled:
+        return None
+    if readers is None:
+        readers = [get_metric_reader(name)
+                   for name in settings.metrics_exporters]
+    provider = MeterProvider(
+        metric_readers=readers,
+        resource=Resource.create({SERVICE_NAME: 'auth-service'}),
+        views=[
+            View(instrument_name='auth_operation_payload_size',
+                 aggregation=ExplicitBucketHistogramAggregation(
+                     PAYLOAD_BUCKETS
+                 )),
+        ]
+    )
+    metrics.set_meter_provider(provider)
+    return provider
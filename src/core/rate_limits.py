@@ -0,0 +1,51 @@
+from dataclasses import dataclass, replace
+
+from core.config import settings
+
+SECOND = 1
+MINUTE = 60
+DAY = 86400
+
+
+@dataclass(frozen=True)
+class Policy:
+    # (times, seconds) pairs; a request has to fit into every window
+    windows: tuple[tuple[int, int], ...]
+    # who the quota belongs to: 'principal' falls back to 'client', and
+    # 'client' falls back to 'ip' when the request does not carry one
+    key: str = 'principal'
+    # exact policies are counted in Redis on every request, the rest by
+    # the per-worker engine that syncs to Redis periodically
+    exact: bool = False
+
+
+POLICIES = {
+    'signup': Policy(((5, MINUTE), (20, DAY)), key='ip', exact=True),
+    'signin': Policy(((5, MINUTE), (50, DAY)), key='ip', exact=True),
+    'signin_history': Policy(((5, MINUTE),)),
+    'check_token': Policy(((5, SECOND), (15, MINUTE))),
+    'refresh': Policy(((5, 2 * MINUTE), (500, DAY))),
+    # an empty cursor= opens an Elasticsearch point in time
+    'cursor_start': Policy(((10, MINUTE), (200, DAY))),
+    'oauth_login': Policy(((5, MINUTE),), key='ip'),
+    'oauth_callback': Policy(((5, 2 * MINUTE),), key='ip'),
+    'roles_create': Policy(((5, MINUTE),)),
+    'roles_list': Policy(((10, MINUTE),)),
+    'roles_get': Policy(((5, SECOND), (15, MINUTE))),
+    'roles_update': Policy(((5, MINUTE),)),
+    'roles_delete': Policy(((3, MINUTE),)),
+}
+
+
+def get_policy(name: str) -> Policy:
+    # RATE_LIMIT_POLICIES='{"signin": {"windows": [[10, 60]]}}' overrides
+    # single fields of a policy without a redeploy of this table
+    policy = POLICIES[name]
+    override = settings.rate_limit_policies.get(name)
+    if override:
+        if 'windows' in override:
+            override = dict(override, windows=tuple(
+                tuple(window) for window in override['windows']
+            ))
+        policy = replace(policy, **override)
+    return policy
@@ -0,0 +1,137 @@
+from typing import Optional
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (BatchSpanProcessor,
+                                            ConsoleSpanExporter, SpanExporter)
+from opentelemetry.sdk.trace.sampling import (ALWAYS_OFF, ALWAYS_ON, Decision,
+                                              ParentBased, Sampler,
+                                              SamplingResult,
+                                              TraceIdRatioBased)
+from opentelemetry.trace import SpanContext, StatusCode, TraceFlags
+
+from core.config import settings
+
+
+class RecordUnsampled(Sampler):
+    # Spans the head sampler drops are still recorded, but not flagged as
+    # sampled, so they are never exported unless they end with an error.
+    # Every span is then created, timed and attributed: only export is
+    # sampled, and a kept error span is exported without its parents.
+
+    def __init__(self, sampler: Sampler):
+        self.sampler = sampler
+
+    def should_sample(self, parent_context, trace_id, name, kind=None,
+                      attributes=None, links=None, trace_state=None):
+        result = self.sampler.should_sample(
+            parent_context, trace_id, name, kind, attributes, links,
+            trace_state
+        )
+        if result.decision is Decision.DROP:
+            return SamplingResult(Decision.RECORD_ONLY, attributes,
+                                  result.trace_state)
+        return result
+
+    def get_description(self) -> str:
+        return f'RecordUnsampled{{{self.sampler.get_description()}}}'
+
+
+class ErrorKeepingSpanProcessor(BatchSpanProcessor):
+
+    def on_end(self, span: ReadableSpan) -> None:
+        context = span.context
+        if not context.trace_flags.sampled:
+            if span.status.status_code is not StatusCode.ERROR:
+                return
+            span = ReadableSpan(
+                name=span.name,
+                context=SpanContext(
+                    context.trace_id, context.span_id, context.is_remote,
+                    TraceFlags(TraceFlags.SAMPLED), context.trace_state
+                ),
+                parent=span.parent,
+                resource=span.resource,
+                attributes=span.attributes,
+                events=span.events,
+                links=span.links,
+                kind=span.kind,
+                status=span.status,
+                start_time=span.start_time,
+                end_time=span.end_time,
+                instrumentation_scope=span.instrumentation_scope,
+            )
+        super().on_end(span)
+
+
+def get_sampler(ratio: Optional[float] = None) -> Sampler:
+    if ratio is None:
+        ratio = settings.tracing_sample_ratio
+    if ratio >= 1:
+        sampler = ALWAYS_ON
+    elif ratio <= 0:
+        sampler = ALWAYS_OFF
+    else:
+        sampler = TraceIdRatioBased(ratio)
+    if settings.tracing_parent_based:
+        # an upstream decision wins, so a trace is never exported half way
+        sampler = ParentBased(sampler)
+    if settings.tracing_keep_errors and ratio < 1:
+        sampler = RecordUnsampled(sampler)
+    return sampler
+
+
+def get_exporter(name: str) -> SpanExporter:
+    if name == 'jaeger':
+        from opentelemetry.exporter.jaeger.thrift import JaegerExporter
+        return JaegerExporter(
+            agent_host_name=settings.jaeger_host,
+            agent_port=settings.jaeger_port,
+        )
+    if name == 'otlp':
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import \
+            OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=settings.otlp_endpoint,
+                                insecure=settings.otlp_insecure)
+    if name == 'console':
+        return ConsoleSpanExporter()
+    raise ValueError(f'Unknown tracing exporter: {name}')
+
+
+def get_span_processor(exporter: SpanExporter) -> BatchSpanProcessor:
+    # the queue is bounded: when the exporter falls behind, new spans are
+    # dropped instead of growing memory or blocking requests
+    processor = ErrorKeepingSpanProcessor if settings.tracing_keep_errors \
+        else BatchSpanProcessor
+    return processor(
+        exporter,
+        max_queue_size=settings.tracing_max_queue_size,
+        max_export_batch_size=settings.tracing_max_export_batch_size,
+        schedule_delay_millis=settings.tracing_schedule_delay_millis,
+        export_timeout_millis=settings.tracing_export_timeout_millis,
+    )
+
+
+def create_tracer_provider(
+        exporters: Optional[list[SpanExporter]] = None,
+        sampler: Optional[Sampler] = None
+) -> TracerProvider:
+    provider = TracerProvider(
+        resource=Resource.create({SERVICE_NAME: 'auth-service'}),
+        sampler=sampler or get_sampler()
+    )
+    if exporters is None:
+        exporters = [get_exporter(name) for name in settings.tracing_exporters]
+    for exporter in exporters:
+        provider.add_span_processor(get_span_processor(exporter))
+    return provider
+
+
+def configure_tracer() -> Optional[TracerProvider]:
+    if not settings.tracing_enabled:
+        return None
+    # the global provider can be set only once per process
+    provider = create_tracer_provider()
+    trace.set_tracer_provider(provider)
+    return provider
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Optional
 
 
 class Cache(ABC):
@@ -11,6 +12,21 @@ class Cache(ABC):
     async def put(self, key, val: str, timeout: int):
         pass
 
+    @abstractmethod
+    async def get_many(self, keys: list) -> list[Optional[str]]:
+        pass
+
+    async def put_many(self, items: dict, timeout: int):
+        for key, val in items.items():
+            await self.put(key, val, timeout)
+
+    @abstractmethod
+    async def delete(self, key):
+        pass
+
     @abstractmethod
     async def close(self):
         pass
+
+    def lock(self, key, timeout: int):
+        return None
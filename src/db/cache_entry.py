@@ -0,0 +1,43 @@
+import random
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+ENTRY_PREFIX = 'v1'
+
+
+@dataclass
+class CacheEntry:
+    payload: str
+    soft_expire: float
+    hard_expire: float
+
+    @classmethod
+    def create(cls, payload: str, soft_ttl: float,
+               hard_ttl: float) -> 'CacheEntry':
+        now = time.time()
+        return cls(payload, now + soft_ttl, now + hard_ttl)
+
+    def is_stale(self) -> bool:
+        return time.time() >= self.soft_expire
+
+    def dumps(self) -> str:
+        return (f'{ENTRY_PREFIX}|{self.soft_expire:.3f}|'
+                f'{self.hard_expire:.3f}|{self.payload}')
+
+    @classmethod
+    def loads(cls, data) -> Optional['CacheEntry']:
+        if isinstance(data, bytes):
+            data = data.decode()
+        parts = data.split('|', 3)
+        if len(parts) != 4 or parts[0] != ENTRY_PREFIX:
+            return None
+        _, soft_expire, hard_expire, payload = parts
+        entry = cls(payload, float(soft_expire), float(hard_expire))
+        if time.time() >= entry.hard_expire:
+            return None
+        return entry
+
+
+def jittered(ttl: float, jitter: float) -> float:
+    return ttl * random.uniform(1 - jitter, 1 + jitter)
@@ -1,21 +1,38 @@
+import base64
+import binascii
 import json
 import pkgutil
+import re
+import time
+from contextlib import suppress
 from typing import Optional
 
-from elasticsearch import AsyncElasticsearch, NotFoundError
+from elasticsearch import (AsyncElasticsearch, BadRequestError,
+                           NotFoundError)
 
 from core.config import settings
+from core.metrics import observe
 
-from db.films_storage import FilmsStorage
-from models.film import Film
+from db.films_storage import CursorLimitExceeded, FilmsStorage
+from models.film import Film, FilmShort
 from models.genre import Genre
 from models.person import Person
 
+# fields a cursor walk may sort on; text fields have no doc values to sort by
+SORT_FIELDS = {
+    settings.film_index: ('id', 'created', 'imdb_rating'),
+    settings.genre_index: ('rating',),
+    settings.person_index: (),
+}
+
 
 class EsStorage(FilmsStorage):
 
     def __init__(self):
         self.es: Optional[AsyncElasticsearch] = None
+        # point in time id -> when Elasticsearch lets it expire; cursor
+        # walks that are abandoned hold their PIT until then
+        self.open_pits: dict[str, float] = {}
 
     async def open(self):
         self.es = AsyncElasticsearch(
@@ -45,16 +62,33 @@ class EsStorage(FilmsStorage):
     async def get_person(self, person_id: str) -> Optional[Person]:
         return await self.__get_item__(person_id, settings.person_index, Person)
 
+    async def get_films_by_ids(self, film_ids: list[str]) -> list[Film]:
+        return await self.__get_items_by_ids__(
+            film_ids, settings.film_index, Film
+        )
+
+    async def get_genres_by_ids(self, genre_ids: list[str]) -> list[Genre]:
+        return await self.__get_items_by_ids__(
+            genre_ids, settings.genre_index, Genre
+        )
+
+    async def get_persons_by_ids(self, person_ids: list[str]) -> list[Person]:
+        return await self.__get_items_by_ids__(
+            person_ids, settings.person_index, Person
+        )
+
     async def get_films(
             self,
             page_number: int,
             page_size: int,
             sort: str = None,
             order: str = None,
-            query: str = None
-    ) -> Optional[list[Film]]:
+            query: str = None,
+            fields: list[str] = None
+    ) -> Optional[list[Film | FilmShort]]:
         return await self.__get_items__(
-            page_number, page_size, settings.film_index, Film, sort, order, query
+            page_number, page_size, settings.film_index,
+            FilmShort if fields else Film, sort, order, query, fields
         )
 
     async def get_genres(
@@ -81,17 +115,76 @@ class EsStorage(FilmsStorage):
             page_num, page_size, settings.person_index, Person, sort, order, query
         )
 
+    async def get_films_after(
+            self,
+            page_size: int,
+            cursor: str = None,
+            sort: str = None,
+            order: str = None,
+            query: str = None,
+            fields: list[str] = None
+    ) -> tuple[list[Film | FilmShort], Optional[str]]:
+        return await self.__get_items_after__(
+            page_size, settings.film_index, FilmShort if fields else Film,
+            cursor, sort, order, query, fields
+        )
+
+    async def get_genres_after(
+            self,
+            page_size: int,
+            cursor: str = None,
+            sort: str = None,
+            order: str = None,
+            query: str = None
+    ) -> tuple[list[Genre], Optional[str]]:
+        return await self.__get_items_after__(
+            page_size, settings.genre_index, Genre, cursor, sort, order, query
+        )
+
+    async def get_persons_after(
+            self,
+            page_size: int,
+            cursor: str = None,
+            sort: str = None,
+            order: str = None,
+            query: str = None
+    ) -> tuple[list[Person], Optional[str]]:
+        return await self.__get_items_after__(
+            page_size, settings.person_index, Person, cursor, sort, order,
+            query
+        )
+
     async def __get_item__(
             self,
             item_id: str,
             item_index: str,
             item_class: type[Film, Genre, Person]
     ) -> Optional[Film|Genre|Person]:
-        try:
-            doc = await self.es.get(index=item_index, id=item_id)
-        except NotFoundError:
-            return None
-        return item_class(**doc['_source'])
+        with observe('elasticsearch', 'get', index=item_index) as operation:
+            try:
+                doc = await self.es.get(index=item_index, id=item_id)
+            except NotFoundError:
+                operation.set('result', 'miss')
+                return None
+            operation.set('result', 'hit')
+            EsStorage.__record_size__(operation, doc)
+        return EsStorage.__parse__(item_class, [doc['_source']])[0]
+
+    async def __get_items_by_ids__(
+            self,
+            item_ids: list[str],
+            item_index: str,
+            item_class: type[Film, Genre, Person]
+    ) -> list[Film | Genre | Person]:
+        if not item_ids:
+            return []
+        with observe('elasticsearch', 'mget', index=item_index) as operation:
+            data = await self.es.mget(index=item_index, ids=item_ids)
+            EsStorage.__record_size__(operation, data)
+        return EsStorage.__parse__(
+            item_class,
+            [doc['_source'] for doc in data['docs'] if doc.get('found')]
+        )
 
     @staticmethod
     def __get_params__(
@@ -122,17 +215,184 @@ class EsStorage(FilmsStorage):
             item_class: type[Film, Genre, Person],
             sort: str = None,
             order: str = None,
-            query: str = None
+            query: str = None,
+            fields: list[str] = None
     ) -> Optional[list[Film|Genre|Person]]:
-        data = await self.es.search(
-            index=item_index,
-            params=EsStorage.__get_params__(page_number, page_size, sort, order),
-            body=EsStorage.__get_body__(query)
-        )
+        with observe('elasticsearch', 'search',
+                     index=item_index) as operation:
+            data = await self.es.search(
+                index=item_index,
+                params=EsStorage.__get_params__(
+                    page_number, page_size, sort, order
+                ),
+                body=EsStorage.__get_body__(query),
+                source_includes=fields
+            )
+            EsStorage.__record_size__(operation, data)
         if not data:
             return None
-        return [item_class(**item.get('_source'))
-                for item in data['hits']['hits']]
+        return EsStorage.__parse__(
+            item_class, [item.get('_source') for item in data['hits']['hits']]
+        )
+
+    @staticmethod
+    def __parse__(
+            item_class: type[Film, Genre, Person], sources: list[dict]
+    ) -> list[Film | Genre | Person]:
+        with observe('pydantic', 'parse',
+                     model=item_class.__name__) as operation:
+            operation.span.set_attribute('items', len(sources))
+            return [item_class(**source) for source in sources]
+
+    @staticmethod
+    def __record_size__(operation, response) -> None:
+        # the client does not keep the raw body; Content-Length is there
+        # unless the node compresses responses
+        meta = getattr(response, 'meta', None)
+        size = meta.headers.get('content-length') if meta else None
+        if size:
+            operation.record_size(int(size))
+
+    @staticmethod
+    def __encode_cursor__(state: dict) -> str:
+        return base64.urlsafe_b64encode(
+            json.dumps(state, separators=(',', ':')).encode()
+        ).decode()
+
+    @staticmethod
+    def __decode_cursor__(cursor: str, item_index: str) -> dict:
+        # the cursor comes back from the client, so every field is checked
+        # against the shape __get_items_after__ produces
+        try:
+            state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValueError('Invalid cursor')
+        if not isinstance(state, dict) \
+                or set(state) != {'pit', 'index', 'sort', 'query', 'after'} \
+                or not isinstance(state['pit'], str) or not state['pit'] \
+                or state['index'] != item_index \
+                or not isinstance(state['after'], list) \
+                or not isinstance(state['query'], (str, type(None))) \
+                or not EsStorage.__is_valid_sort__(state['sort'],
+                                                   item_index):
+            raise ValueError('Invalid cursor')
+        return state
+
+    @staticmethod
+    def __is_valid_sort__(sort_clause, item_index: str) -> bool:
+        if not isinstance(sort_clause, list) or not 1 <= len(sort_clause) <= 2:
+            return False
+        if sort_clause[-1] != {'_shard_doc': 'asc'}:
+            return False
+        if len(sort_clause) == 2:
+            field = sort_clause[0]
+            return (isinstance(field, dict) and len(field) == 1
+                    and list(field)[0] in SORT_FIELDS.get(item_index, ())
+                    and list(field.values())[0] in ({'order': 'asc'},
+                                                    {'order': 'desc'}))
+        return True
+
+    @staticmethod
+    def __keep_alive_seconds__(keep_alive: str) -> float:
+        units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+        match = re.fullmatch(r'(\d+)(ms|s|m|h|d)', keep_alive)
+        if not match:
+            raise ValueError(f'Invalid keep alive: {keep_alive}')
+        return int(match.group(1)) * units[match.group(2)]
+
+    def __track_pit__(self, pit_id: str,
+                      previous: Optional[str] = None) -> None:
+        self.open_pits.pop(previous, None)
+        self.open_pits[pit_id] = time.monotonic() + \
+            EsStorage.__keep_alive_seconds__(settings.es_pit_keep_alive)
+
+    def __reserve_pit__(self) -> None:
+        now = time.monotonic()
+        for pit_id in [pit_id for pit_id, expires in self.open_pits.items()
+                       if expires <= now]:
+            del self.open_pits[pit_id]
+        if len(self.open_pits) >= settings.es_max_open_pits:
+            raise CursorLimitExceeded('Too many open cursors')
+
+    async def __close_pit__(self, *pit_ids: str) -> None:
+        for pit_id in pit_ids:
+            self.open_pits.pop(pit_id, None)
+        with suppress(NotFoundError):
+            await self.es.close_point_in_time(id=pit_ids[-1])
+
+    async def __get_items_after__(
+            self,
+            page_size: int,
+            item_index: str,
+            item_class: type[Film, Genre, Person],
+            cursor: str = None,
+            sort: str = None,
+            order: str = None,
+            query: str = None,
+            fields: list[str] = None
+    ) -> tuple[list[Film | Genre | Person], Optional[str]]:
+        if cursor:
+            state = EsStorage.__decode_cursor__(cursor, item_index)
+        else:
+            if sort and sort not in SORT_FIELDS.get(item_index, ()):
+                raise ValueError(f'Cannot sort by {sort}')
+            self.__reserve_pit__()
+            pit = await self.es.open_point_in_time(
+                index=item_index, keep_alive=settings.es_pit_keep_alive
+            )
+            self.__track_pit__(pit['id'])
+            sort_clause = []
+            if sort:
+                sort_clause.append(
+                    {sort: {'order': order if order in ('asc', 'desc')
+                            else 'asc'}}
+                )
+            sort_clause.append({'_shard_doc': 'asc'})
+            state = {'pit': pit['id'], 'index': item_index,
+                     'sort': sort_clause, 'query': query, 'after': None}
+
+        body = EsStorage.__get_body__(state['query']) or {}
+        with observe('elasticsearch', 'search_after',
+                     index=item_index) as operation:
+            try:
+                data = await self.es.search(
+                    pit={'id': state['pit'],
+                         'keep_alive': settings.es_pit_keep_alive},
+                    size=page_size,
+                    sort=state['sort'],
+                    search_after=state['after'],
+                    query=body.get('query'),
+                    source_includes=fields
+                )
+            except NotFoundError:
+                self.open_pits.pop(state['pit'], None)
+                raise ValueError('Cursor expired')
+            except Exception as e:
+                # a first page that fails hands no cursor back, so nothing
+                # else would ever release the PIT it opened
+                if not cursor:
+                    await self.__close_pit__(state['pit'])
+                if isinstance(e, BadRequestError):
+                    raise ValueError(
+                        'Invalid cursor' if cursor else 'Invalid query'
+                    )
+                raise
+            EsStorage.__record_size__(operation, data)
+
+        hits = data['hits']['hits']
+        items = EsStorage.__parse__(
+            item_class, [item.get('_source') for item in hits]
+        )
+        pit_id = data.get('pit_id', state['pit'])
+        if len(hits) < page_size:
+            # the last page releases the PIT instead of waiting for keep_alive
+            await self.__close_pit__(state['pit'], pit_id)
+            return items, None
+
+        if state['pit'] in self.open_pits:
+            self.__track_pit__(pit_id, state['pit'])
+        state.update(pit=pit_id, after=hits[-1]['sort'])
+        return items, EsStorage.__encode_cursor__(state)
 
     async def __create_index__(self, index_name: str, index_mapping: dict):
         index_exists = await self.es.indices.exists(index=index_name)
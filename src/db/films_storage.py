@@ -1,11 +1,15 @@
 from abc import ABC, abstractmethod
 from typing import Optional
 
-from models.film import Film
+from models.film import Film, FilmShort
 from models.genre import Genre
 from models.person import Person
 
 
+class CursorLimitExceeded(Exception):
+    pass
+
+
 class FilmsStorage(ABC):
 
     @abstractmethod
@@ -28,6 +32,18 @@ class FilmsStorage(ABC):
     async def get_person(self, person_id: str) -> Optional[Person]:
         pass
 
+    @abstractmethod
+    async def get_films_by_ids(self, film_ids: list[str]) -> list[Film]:
+        pass
+
+    @abstractmethod
+    async def get_genres_by_ids(self, genre_ids: list[str]) -> list[Genre]:
+        pass
+
+    @abstractmethod
+    async def get_persons_by_ids(self, person_ids: list[str]) -> list[Person]:
+        pass
+
     @abstractmethod
     async def get_films(
             self,
@@ -35,8 +51,9 @@ class FilmsStorage(ABC):
             page_size: int,
             sort: str = None,
             order: str = None,
-            query: str = None
-    ) -> Optional[list[Film]]:
+            query: str = None,
+            fields: list[str] = None
+    ) -> Optional[list[Film | FilmShort]]:
         pass
 
     @abstractmethod
@@ -58,3 +75,37 @@ class FilmsStorage(ABC):
             order: str = None
     ) -> Optional[list[Person]]:
         pass
+
+    @abstractmethod
+    async def get_films_after(
+            self,
+            page_size: int,
+            cursor: str = None,
+            sort: str = None,
+            order: str = None,
+            query: str = None,
+            fields: list[str] = None
+    ) -> tuple[list[Film | FilmShort], Optional[str]]:
+        pass
+
+    @abstractmethod
+    async def get_genres_after(
+            self,
+            page_size: int,
+            cursor: str = None,
+            sort: str = None,
+            order: str = None,
+            query: str = None
+    ) -> tuple[list[Genre], Optional[str]]:
+        pass
+
+    @abstractmethod
+    async def get_persons_after(
+            self,
+            page_size: int,
+            cursor: str = None,
+            sort: str = None,
+            order: str = None,
+            query: str = None
+    ) -> tuple[list[Person], Optional[str]]:
+        pass
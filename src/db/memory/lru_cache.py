@@ -0,0 +1,56 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from db.cache import Cache
+
+
+class LRUCache(Cache):
+
+    def __init__(self, max_items: int, ttl: int):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, key) -> Optional[str]:
+        entry = self._items.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expire_at, val = entry
+        if expire_at <= time.monotonic():
+            del self._items[key]
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return val
+
+    async def put(self, key, val: str, timeout: int):
+        ttl = min(timeout, self.ttl) if timeout else self.ttl
+        self._items[key] = (time.monotonic() + ttl, val)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    async def get_many(self, keys: list) -> list[Optional[str]]:
+        return [await self.get(key) for key in keys]
+
+    async def delete(self, key):
+        self._items.pop(key, None)
+
+    async def close(self):
+        self._items.clear()
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._items),
+            'max_items': self.max_items,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,56 @@
+from typing import Optional
+
+from db.cache import Cache
+from db.memory.lru_cache import LRUCache
+
+
+class TieredCache(Cache):
+
+    def __init__(self, local: LRUCache, remote: Cache):
+        self.local = local
+        self.remote = remote
+
+    async def get(self, key) -> Optional[str]:
+        val = await self.local.get(key)
+        if val is not None:
+            return val
+        val = await self.remote.get(key)
+        if val is not None:
+            await self.local.put(key, val, self.local.ttl)
+        return val
+
+    async def put(self, key, val: str, timeout: int):
+        await self.remote.put(key, val, timeout)
+        await self.local.put(key, val, timeout)
+
+    async def get_many(self, keys: list) -> list[Optional[str]]:
+        values = await self.local.get_many(keys)
+        missing = [key for key, val in zip(keys, values) if val is None]
+        if not missing:
+            return values
+
+        found = dict(zip(missing, await self.remote.get_many(missing)))
+        for key, val in found.items():
+            if val is not None:
+                await self.local.put(key, val, self.local.ttl)
+        return [val if val is not None else found[key]
+                for key, val in zip(keys, values)]
+
+    async def put_many(self, items: dict, timeout: int):
+        await self.remote.put_many(items, timeout)
+        await self.local.put_many(items, timeout)
+
+    async def delete(self, key):
+        # other workers keep their local copy until its short TTL ends
+        await self.remote.delete(key)
+        await self.local.delete(key)
+
+    def lock(self, key, timeout: int):
+        return self.remote.lock(key, timeout)
+
+    async def close(self):
+        await self.local.close()
+        await self.remote.close()
+
+    def stats(self) -> dict:
+        return self.local.stats()
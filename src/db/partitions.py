@@ -0,0 +1,78 @@
+import datetime
+import re
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+LOGINS_TABLE = 'users_logins'
+LOGINS_PARTITION = re.compile(rf'^{LOGINS_TABLE}_(\d{{4}})_(\d{{2}})$')
+# serialises maintenance between workers sharing the database
+MAINTENANCE_LOCK_ID = 7_014_017
+
+
+def month_start(day: datetime.date) -> datetime.date:
+    return datetime.date(day.year, day.month, 1)
+
+
+def add_months(day: datetime.date, months: int) -> datetime.date:
+    month = day.year * 12 + day.month - 1 + months
+    return datetime.date(month // 12, month % 12 + 1, 1)
+
+
+def login_partition_name(month: datetime.date) -> str:
+    return f'{LOGINS_TABLE}_{month:%Y_%m}'
+
+
+async def ensure_login_partitions(
+        conn: AsyncConnection, months_ahead: int,
+        today: datetime.date = None
+) -> list[str]:
+    await conn.execute(text('SELECT pg_advisory_xact_lock(:id)'),
+                       {'id': MAINTENANCE_LOCK_ID})
+    existing = await get_login_partitions(conn)
+    created = []
+    month = month_start(today or datetime.date.today())
+    for _ in range(months_ahead + 1):
+        name = login_partition_name(month)
+        if name not in existing:
+            await conn.execute(text(
+                f'CREATE TABLE {name} PARTITION OF {LOGINS_TABLE} '
+                f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+            ))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+async def drop_expired_login_partitions(
+        conn: AsyncConnection, retention_months: int,
+        today: datetime.date = None
+) -> list[str]:
+    await conn.execute(text('SELECT pg_advisory_xact_lock(:id)'),
+                       {'id': MAINTENANCE_LOCK_ID})
+    cutoff = add_months(month_start(today or datetime.date.today()),
+                        -retention_months)
+    dropped = []
+    for name in await get_login_partitions(conn):
+        match = LOGINS_PARTITION.match(name)
+        if not match:
+            continue
+        month = datetime.date(int(match[1]), int(match[2]), 1)
+        # a partition goes only once every row in it is past retention
+        if add_months(month, 1) <= cutoff:
+            await conn.execute(text(
+                f'ALTER TABLE {LOGINS_TABLE} DETACH PARTITION {name}'
+            ))
+            await conn.execute(text(f'DROP TABLE {name}'))
+            dropped.append(name)
+    return dropped
+
+
+async def get_login_partitions(conn: AsyncConnection) -> list[str]:
+    result = await conn.execute(text(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        'WHERE parent.relname = :table ORDER BY child.relname'
+    ), {'table': LOGINS_TABLE})
+    return list(result.scalars().all())
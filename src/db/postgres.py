@@ -1,20 +1,184 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import (
-    create_async_engine, AsyncSession, async_sessionmaker
+    create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 )
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from core.config import settings
 
 Base = declarative_base()
 
-dsn = (f'postgresql+asyncpg://{settings.postgres_user}:'
-       f'{settings.postgres_password}@{settings.db_host}:'
-       f'{settings.db_port}/{settings.postgres_db}')
-engine = create_async_engine(dsn, echo=True, future=True)
+
+class PoolMetrics:
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checkout_seconds_total = 0.0
+        self.checkout_seconds_max = 0.0
+        self.checkout_timeouts = 0
+        self.waiting = 0
+
+    def observe_checkout(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.checkout_seconds_total += seconds
+        self.checkout_seconds_max = max(self.checkout_seconds_max, seconds)
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+
+    def _do_get(self):
+        # only a caller that finds no idle connection and no overflow left
+        # to open one actually waits for a checkin
+        waits = (self.checkedin() == 0
+                 and -1 < self._max_overflow <= self._overflow)
+        if waits:
+            pool_metrics.waiting += 1
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_metrics.checkout_timeouts += 1
+            raise
+        finally:
+            if waits:
+                pool_metrics.waiting -= 1
+        pool_metrics.observe_checkout(time.perf_counter() - start)
+        return connection
+
+
+def get_dsn(host: str, port: int) -> str:
+    return (f'postgresql+asyncpg://{settings.postgres_user}:'
+            f'{settings.postgres_password}@{host}:'
+            f'{port}/{settings.postgres_db}'
+            f'?prepared_statement_cache_size='
+            f'{settings.db_prepared_statement_cache_size}')
+
+
+def create_engine(dsn: str, **kwargs) -> AsyncEngine:
+    return create_async_engine(
+        dsn,
+        echo=settings.db_echo,
+        future=True,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args={'server_settings': {
+            'statement_timeout': str(settings.db_statement_timeout_ms)
+        }},
+        **kwargs
+    )
+
+
+dsn = get_dsn(settings.db_host, settings.db_port)
+engine = create_engine(dsn, poolclass=InstrumentedPool)
 async_session = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# NULL for a host that is not in recovery: a primary, or a promoted
+# replica, has no replay position and must not be routed reads as a replica
+REPLICA_LAG_QUERY = text(
+    'SELECT CASE WHEN NOT pg_is_in_recovery() THEN NULL '
+    'WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+    'THEN 0 ELSE COALESCE(EXTRACT(EPOCH FROM now() '
+    '- pg_last_xact_replay_timestamp()), 0) END'
+)
+
+
+class SessionRouter:
+
+    def __init__(self, primary: async_sessionmaker, replica_hosts: list[str]):
+        self.primary = primary
+        self.replicas: list[tuple[AsyncEngine, async_sessionmaker]] = []
+        for replica_host in replica_hosts:
+            host, _, port = replica_host.partition(':')
+            replica_engine = create_engine(
+                get_dsn(host, int(port or settings.db_port))
+            )
+            self.replicas.append((replica_engine, async_sessionmaker(
+                replica_engine, class_=AsyncSession, expire_on_commit=False
+            )))
+        self.healthy: list[async_sessionmaker] = []
+        self._next = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if not self.replicas:
+            return
+        await self.check_replicas()
+        self._task = asyncio.create_task(self._check_periodically())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        for replica_engine, _ in self.replicas:
+            await replica_engine.dispose()
+
+    async def check_replicas(self) -> None:
+        healthy = []
+        for replica_engine, sessionmaker in self.replicas:
+            try:
+                async with replica_engine.connect() as conn:
+                    lag = (await conn.execute(REPLICA_LAG_QUERY)).scalar()
+            except Exception:
+                logging.warning('Replica %s is unreachable',
+                                replica_engine.url.host)
+                continue
+            if lag is None:
+                logging.warning('Replica %s is not in recovery',
+                                replica_engine.url.host)
+            elif lag <= settings.db_replica_max_lag_seconds:
+                healthy.append(sessionmaker)
+            else:
+                logging.warning('Replica %s lags by %ss',
+                                replica_engine.url.host, lag)
+        self.healthy = healthy
+
+    async def _check_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.db_replica_check_interval_seconds)
+            await self.check_replicas()
+
+    def read_session(self) -> AsyncSession:
+        # fall back to the primary when no replica is within the lag budget
+        if not self.healthy:
+            return self.primary()
+        return self.healthy[next(self._next) % len(self.healthy)]()
+
+    def write_session(self) -> AsyncSession:
+        return self.primary()
+
+
+session_router = SessionRouter(async_session, settings.db_replica_hosts)
+
+
+def get_pool_stats() -> dict:
+    pool = engine.sync_engine.pool
+    return {
+        'size': pool.size(),
+        'in_use': pool.checkedout(),
+        'idle': pool.checkedin(),
+        'overflow': pool.overflow(),
+        'waiting': pool_metrics.waiting,
+        'checkouts': pool_metrics.checkouts,
+        'checkout_timeouts': pool_metrics.checkout_timeouts,
+        'checkout_seconds_total': pool_metrics.checkout_seconds_total,
+        'checkout_seconds_max': pool_metrics.checkout_seconds_max,
+    }
+
 
 async def get_session() -> AsyncSession:
     async with async_session() as session:
@@ -27,6 +191,17 @@ async def get_session() -> AsyncSession:
             await session.close()
 
 
+async def get_read_session() -> AsyncSession:
+    async with session_router.read_session() as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+
 async def create_database() -> None:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
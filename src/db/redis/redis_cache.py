@@ -1,6 +1,7 @@
 from typing import Optional
 
 from core.config import settings
+from core.metrics import observe
 from db.cache import Cache
 from redis.asyncio import Redis
 
@@ -11,10 +12,50 @@ class RedisCache(Cache):
         self.redis = Redis(host=settings.redis_host, port=settings.redis_port)
 
     async def get(self, key) -> Optional[str]:
-        return await self.redis.get(key)
+        with observe('redis', 'get') as operation:
+            value = await self.redis.get(key)
+            operation.set('result', 'hit' if value else 'miss')
+            if value:
+                operation.record_size(len(value))
+            return value
 
     async def put(self, key, val: str, timeout: int):
-        await self.redis.set(key, val, settings.cache_expire_in_seconds)
+        with observe('redis', 'set') as operation:
+            operation.record_size(len(val))
+            await self.redis.set(
+                key, val, timeout or settings.cache_expire_in_seconds
+            )
+
+    async def get_many(self, keys: list) -> list[Optional[str]]:
+        if not keys:
+            return []
+        with observe('redis', 'mget') as operation:
+            values = await self.redis.mget(keys)
+            hits = [value for value in values if value]
+            operation.span.set_attribute('cache.keys', len(keys))
+            operation.span.set_attribute('cache.hits', len(hits))
+            operation.record_size(sum(len(value) for value in hits))
+            return values
+
+    async def put_many(self, items: dict, timeout: int):
+        with observe('redis', 'mset') as operation:
+            operation.span.set_attribute('cache.keys', len(items))
+            operation.record_size(sum(len(val) for val in items.values()))
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, val in items.items():
+                    pipe.set(
+                        key, val, timeout or settings.cache_expire_in_seconds
+                    )
+                await pipe.execute()
+
+    async def delete(self, key):
+        with observe('redis', 'delete'):
+            await self.redis.delete(key)
+
+    def lock(self, key, timeout: int):
+        return self.redis.lock(
+            key, timeout=timeout, blocking_timeout=timeout
+        )
 
     async def close(self):
         if self.redis:
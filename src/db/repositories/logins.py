@@ -0,0 +1,42 @@
+import datetime
+import uuid
+from typing import Optional
+
+from sqlalchemy import lambda_stmt, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.user import UserLogin
+
+
+class UserLoginRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_page(
+            self, user_id: uuid.UUID, page_size: int,
+            before: Optional[tuple[datetime.datetime, uuid.UUID]] = None,
+            offset: int = 0
+    ) -> list[UserLogin]:
+        # keyset pagination walks ix_users_logins_user_id_login_at instead
+        # of counting past OFFSET rows; offset is kept for page_number
+        if before is None:
+            stmt = lambda_stmt(
+                lambda: select(UserLogin)
+                .where(UserLogin.user_id == user_id)
+                .order_by(UserLogin.login_at.desc(), UserLogin.id.desc())
+                .offset(offset)
+                .limit(page_size)
+            )
+        else:
+            login_at, login_id = before
+            stmt = lambda_stmt(
+                lambda: select(UserLogin)
+                .where(UserLogin.user_id == user_id,
+                       tuple_(UserLogin.login_at, UserLogin.id)
+                       < tuple_(login_at, login_id))
+                .order_by(UserLogin.login_at.desc(), UserLogin.id.desc())
+                .limit(page_size)
+            )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
@@ -0,0 +1,87 @@
+import datetime
+import uuid
+from typing import Optional
+
+from sqlalchemy import delete, lambda_stmt, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.refresh_token import RefreshToken
+
+# serialises the expired token sweep between workers sharing the database
+SWEEP_LOCK_ID = 7_014_022
+
+
+class RefreshTokenRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    def add(self, token_hash: str, user_id: uuid.UUID,
+            family_id: uuid.UUID, expires_at: datetime.datetime,
+            jti: Optional[str] = None) -> None:
+        self.session.add(
+            RefreshToken(token_hash, user_id, family_id, expires_at, jti)
+        )
+
+    async def consume(
+            self, token_hash: str, now: datetime.datetime
+    ) -> Optional[RefreshToken]:
+        # marks the token used and returns it in one statement, so two
+        # concurrent refreshes with the same token cannot both succeed
+        result = await self.session.execute(lambda_stmt(
+            lambda: update(RefreshToken)
+            .where(RefreshToken.token_hash == token_hash,
+                   RefreshToken.used_at.is_(None),
+                   RefreshToken.expires_at > now)
+            .values(used_at=now)
+            .returning(RefreshToken)
+            .execution_options(synchronize_session=False)
+        ))
+        return result.scalars().first()
+
+    async def get_by_hash(self, token_hash: str) -> Optional[RefreshToken]:
+        result = await self.session.execute(lambda_stmt(
+            lambda: select(RefreshToken)
+            .where(RefreshToken.token_hash == token_hash)
+        ))
+        return result.scalars().first()
+
+    async def revoke_family(self, family_id: uuid.UUID) -> list[str]:
+        # returns the jtis of the access tokens issued with the family
+        result = await self.session.execute(lambda_stmt(
+            lambda: delete(RefreshToken)
+            .where(RefreshToken.family_id == family_id)
+            .returning(RefreshToken.jti)
+            .execution_options(synchronize_session=False)
+        ))
+        return [jti for jti in result.scalars().all() if jti]
+
+    async def revoke_user(self, user_id: uuid.UUID) -> int:
+        result = await self.session.execute(lambda_stmt(
+            lambda: delete(RefreshToken)
+            .where(RefreshToken.user_id == user_id)
+        ))
+        return result.rowcount
+
+    async def try_lock_sweep(self) -> bool:
+        # held until the transaction ends; a worker that does not get it
+        # leaves the batch to the one that did
+        result = await self.session.execute(
+            text('SELECT pg_try_advisory_xact_lock(:id)'),
+            {'id': SWEEP_LOCK_ID}
+        )
+        return bool(result.scalar())
+
+    async def delete_expired(
+            self, now: datetime.datetime, limit: int
+    ) -> int:
+        # bounded batches keep each delete short instead of holding locks
+        # on millions of rows at once
+        expired = (select(RefreshToken.id)
+                   .where(RefreshToken.expires_at <= now)
+                   .limit(limit).scalar_subquery())
+        result = await self.session.execute(
+            delete(RefreshToken).where(RefreshToken.id.in_(expired))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
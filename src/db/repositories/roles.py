@@ -0,0 +1,31 @@
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import lambda_stmt, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.role import Role
+
+
+class RoleRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_by_id(self, role_id: UUID) -> Optional[Role]:
+        result = await self.session.execute(
+            lambda_stmt(lambda: select(Role).where(Role.id == role_id))
+        )
+        return result.scalars().first()
+
+    async def get_by_name(self, name: str) -> Optional[Role]:
+        result = await self.session.execute(
+            lambda_stmt(lambda: select(Role).where(Role.name == name))
+        )
+        return result.scalars().first()
+
+    async def get_page(self, offset: int, limit: int) -> list[Role]:
+        result = await self.session.execute(
+            lambda_stmt(lambda: select(Role).offset(offset).limit(limit))
+        )
+        return list(result.scalars().all())
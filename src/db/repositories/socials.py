@@ -0,0 +1,22 @@
+from typing import Optional
+
+from sqlalchemy import lambda_stmt, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.user import UserSocial
+
+
+class UserSocialRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_by_provider_user(
+            self, provider: str, provider_user_id: str
+    ) -> Optional[UserSocial]:
+        result = await self.session.execute(lambda_stmt(
+            lambda: select(UserSocial)
+            .where(UserSocial.provider == provider,
+                   UserSocial.provider_user_id == provider_user_id)
+        ))
+        return result.scalars().first()
@@ -0,0 +1,61 @@
+import uuid
+from typing import Optional
+
+from sqlalchemy import lambda_stmt, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from models.user import User, UserLoginLookup
+
+
+class UserRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_by_login(
+            self, login: str, with_roles: bool = False,
+            continent: Optional[str] = None
+    ) -> Optional[User]:
+        # users is partitioned by continent; filtering on it lets the
+        # planner prune every other partition
+        if continent is None:
+            continent = await self.get_continent(login)
+            if continent is None:
+                return None
+        # lambda statements are built and compiled once per call site;
+        # later calls only bind the new values
+        if with_roles:
+            stmt = lambda_stmt(
+                lambda: select(User).options(selectinload(User.roles))
+                .where(User.login == login, User.continent == continent)
+            )
+        else:
+            stmt = lambda_stmt(
+                lambda: select(User)
+                .where(User.login == login, User.continent == continent)
+            )
+        result = await self.session.execute(stmt)
+        return result.scalars().first()
+
+    async def get_continent(self, login: str) -> Optional[str]:
+        result = await self.session.execute(lambda_stmt(
+            lambda: select(UserLoginLookup.continent)
+            .where(UserLoginLookup.login == login)
+        ))
+        return result.scalars().first()
+
+    async def get_by_id(
+            self, user_id: uuid.UUID, with_roles: bool = False
+    ) -> Optional[User]:
+        # without the continent every partition is probed through its
+        # primary key index
+        if with_roles:
+            stmt = lambda_stmt(
+                lambda: select(User).options(selectinload(User.roles))
+                .where(User.id == user_id)
+            )
+        else:
+            stmt = lambda_stmt(lambda: select(User).where(User.id == user_id))
+        result = await self.session.execute(stmt)
+        return result.scalars().first()
@@ -1,62 +1,91 @@
-import logging
 from contextlib import asynccontextmanager
 
 import uvicorn
 from fastapi import FastAPI, Request, status
 from fastapi.responses import ORJSONResponse
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
 from redis.asyncio import Redis
 
-from opentelemetry.sdk.resources import Resource
-from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
-from opentelemetry.exporter.jaeger.thrift import JaegerExporter
 
-from api import users, roles
+from api import users, roles, jwks, metrics
 from api.v1 import films, persons, genres, oauth
 from core.config import settings
-from core.logger import LOGGING
+from core.logger import request_id_var
+from core.metrics import configure_meter, register_stats
+from core.tracing import configure_tracer
 from db import db_cache, db_storage
 from db.elastic.EsStorage import EsStorage
+from db.memory.lru_cache import LRUCache
+from db.memory.tiered_cache import TieredCache
+from db.postgres import async_session, engine, get_pool_stats, session_router
 from db.redis.redis_cache import RedisCache
+from services import login_events, refresh_tokens, revocation
+from services.login_events import LoginEventWriter
+from services.oauth import http_client, oauth_service
+from services.password_hasher import password_hasher
+from services.principal_cache import principal_cache
+from services.rate_limiter import rate_limiter
+from services.refresh_tokens import RefreshTokenSweeper
+from services.revocation import RevocationSet
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     redis = Redis(host=settings.redis_host, port=settings.redis_port,
                   db=0, decode_responses=True)
-    await FastAPILimiter.init(redis)
+    await rate_limiter.start(redis)
 
-    db_cache.cache = RedisCache()
+    db_cache.cache = TieredCache(
+        LRUCache(settings.local_cache_max_items,
+                 settings.local_cache_ttl_in_seconds),
+        RedisCache()
+    )
     db_storage.storage = EsStorage()
     await db_storage.storage.open()
 
+    revocation.revocations = RevocationSet(
+        Redis(host=settings.redis_host, port=settings.redis_port,
+              db=0, decode_responses=True)
+    )
+    await revocation.revocations.start()
+    await session_router.start()
+    login_events.login_events = LoginEventWriter(engine)
+    await login_events.login_events.start()
+    refresh_tokens.refresh_token_sweeper = RefreshTokenSweeper(async_session)
+    await refresh_tokens.refresh_token_sweeper.start()
+    oauth_service.provider_registry = oauth_service.ProviderRegistry.from_settings()
+    await oauth_service.provider_registry.start()
+
+    register_stats('local_cache', db_cache.cache.stats)
+    register_stats('principal_cache', principal_cache.stats)
+    register_stats('db_pool', get_pool_stats)
+    register_stats('password_hasher', password_hasher.stats)
+    register_stats('revocations', revocation.revocations.stats)
+    register_stats('rate_limiter', rate_limiter.stats)
+    register_stats('login_events', login_events.login_events.stats)
+    register_stats('refresh_token_sweeper',
+                   refresh_tokens.refresh_token_sweeper.stats)
+    register_stats('oauth_http', lambda: http_client.oauth_http_client
+                   and http_client.oauth_http_client.stats())
+
     yield
 
+    await oauth_service.provider_registry.stop()
+    await rate_limiter.stop()
+    await refresh_tokens.refresh_token_sweeper.stop()
+    await login_events.login_events.stop()
+    await session_router.stop()
+    await revocation.revocations.stop()
+    password_hasher.shutdown()
+    if http_client.oauth_http_client:
+        await http_client.oauth_http_client.close()
     await db_cache.cache.close()
     if db_storage.storage:
         await db_storage.storage.close()
 
 
-def configure_tracer() -> None:
-    resource = Resource(attributes={"SERVICE_NAME": "auth-service"})
-    provider = TracerProvider(resource=resource)
-    trace.set_tracer_provider(provider)
-    trace.get_tracer_provider().add_span_processor(
-        BatchSpanProcessor(
-            JaegerExporter(
-                agent_host_name=settings.jaeger_host,
-                agent_port=settings.jaeger_port,
-            )
-        )
-    )
-    trace.get_tracer_provider().add_span_processor(BatchSpanProcessor(ConsoleSpanExporter()))
-
-
 configure_tracer()
+configure_meter()
 
 app = FastAPI(
     title=settings.project_name,
@@ -65,20 +94,27 @@ app = FastAPI(
     default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
-FastAPIInstrumentor.instrument_app(app)
+FastAPIInstrumentor.instrument_app(app, excluded_urls='/metrics')
 
 
 @app.middleware('http')
 async def before_request(request: Request, call_next):
-    response = await call_next(request)
     request_id = request.headers.get('X-Request-Id')
-    if not request_id:
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    if not request_id and request.url.path != '/metrics':
         return ORJSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={'detail': 'X-Request-Id is required'})
+    response.headers.update(getattr(request.state, 'rate_limit_headers', {}))
     return response
 
 
 app.include_router(users.router, prefix='/api/users', tags=['users'])
 app.include_router(roles.router, prefix='/api/roles', tags=['roles'])
+app.include_router(jwks.router, prefix='/.well-known', tags=['jwks'])
+app.include_router(metrics.router, tags=['metrics'])
 
 app.include_router(films.router, prefix='/api/v1/films', tags=['films'])
 app.include_router(persons.router, prefix='/api/v1/persons', tags=['persons'])
@@ -90,6 +126,7 @@ if __name__ == '__main__':
     uvicorn.run(
         'main:app',
         host='localhost',
-        log_config=LOGGING,
-        log_level=logging.DEBUG
+        # logging is already set up by core.config
+        log_config=None,
+        log_level=settings.log_level.lower()
     )
@@ -1,3 +1,4 @@
 from .user import User
+from .principal import Principal
 from .refresh_token import RefreshToken
 from db.postgres import Base
@@ -18,3 +18,11 @@ class Film(BaseModel):
 class Films(BaseModel):
     items: list[Film]
 
+
+class FilmShort(BaseModel):
+    id: str
+    title: str
+
+
+class FilmsShort(BaseModel):
+    items: list[FilmShort]
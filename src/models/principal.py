@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+
+class Principal(BaseModel):
+    id: str
+    login: str
+    first_name: str | None = None
+    last_name: str | None = None
+    is_superuser: bool = False
+    roles: list[str] = []
+    permission_version: int = 0
+    jti: str
+    expire: str
@@ -11,15 +11,25 @@ class RefreshToken(Base):
     __tablename__ = 'refresh_tokens'
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
-    token = Column(String(255), nullable=False)
-    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
+    # only a sha256 of the token is stored, the token itself never is
+    token_hash = Column(String(64), nullable=False, unique=True, index=True)
+    family_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.datetime.now)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    used_at = Column(DateTime, nullable=True)
+    # shared with the access token issued alongside, so revoking the family
+    # can reach the access tokens too
+    jti = Column(String(36), nullable=True)
 
-    def __init__(self, token: str, user_id: uuid.UUID, expires_at: datetime):
-        self.token = token
+    def __init__(self, token_hash: str, user_id: uuid.UUID,
+                 family_id: uuid.UUID, expires_at: datetime,
+                 jti: str = None):
+        self.token_hash = token_hash
         self.user_id = user_id
+        self.family_id = family_id
         self.expires_at = expires_at
+        self.jti = jti
 
     def __repr__(self) -> str:
         return f'<Refresh Token {self.id}>'
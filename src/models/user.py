@@ -3,10 +3,9 @@ import enum
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, DateTime, String, ForeignKey, Boolean, text, Enum, UniqueConstraint
+from sqlalchemy import Column, DateTime, String, ForeignKey, Boolean, Integer, text, Enum, UniqueConstraint, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
-from werkzeug.security import check_password_hash, generate_password_hash
 
 from db.postgres import Base
 from models.role import user_roles_table
@@ -25,12 +24,16 @@ class Continent(str, enum.Enum):
 
 class UserSocial(Base):
     __tablename__ = 'users_socials'
-    __table_args__ = (UniqueConstraint('user_id', 'provider'),)
+    __table_args__ = (
+        UniqueConstraint('user_id', 'provider'),
+        Index('ix_users_socials_provider_user', 'provider', 'provider_user_id',
+              unique=True),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
-    provider = Column(String(50), nullable=False, index=True)
-    provider_user_id = Column(String(255), nullable=False, index=True)
+    provider = Column(String(50), nullable=False)
+    provider_user_id = Column(String(255), nullable=False)
     access_token = Column(String(255), nullable=True)
     refresh_token = Column(String(255), nullable=True)
     token_expiry = Column(DateTime, nullable=True)
@@ -58,6 +61,9 @@ class UserSocial(Base):
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ix_users_login_continent', 'login', 'continent', unique=True),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, unique=True, default=uuid.uuid4, nullable=False)
     login = Column(String(255), nullable=False)
@@ -65,6 +71,7 @@ class User(Base):
     first_name = Column(String(50))
     last_name = Column(String(50))
     is_superuser = Column(Boolean, default=False)
+    permission_version = Column(Integer, nullable=False, default=0, server_default='0')
     continent = Column(String(50), primary_key=True, nullable=False, server_default=Continent.EUROPE.value)
     created_at = Column(
         DateTime, default=datetime.now(timezone.utc).replace(tzinfo=None)
@@ -77,31 +84,45 @@ class User(Base):
     social_accounts = relationship('UserSocial', back_populates='user')
 
     def __init__(
-            self, login: str, password: str, first_name: str, last_name: str,
-            is_superuser: bool = False
+            self, login: str, password_hash: str, first_name: str,
+            last_name: str, is_superuser: bool = False
     ) -> None:
+        # hashing is CPU-bound: callers get the hash from PasswordHasher
         self.login = login
-        self.password = generate_password_hash(password)
+        self.password = password_hash
         self.first_name = first_name
         self.last_name = last_name
         self.is_superuser = is_superuser
 
-    def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password, password)
-
     def __repr__(self) -> str:
         return f'<User {self.login}>'
 
 
+class UserLoginLookup(Base):
+    # kept in sync by a trigger on users; makes logins globally unique and
+    # tells lookups which partition a login lives in
+    __tablename__ = 'users_login_lookup'
+
+    login = Column(String(255), primary_key=True, nullable=False)
+    user_id = Column(UUID(as_uuid=True), nullable=False)
+    continent = Column(String(50), nullable=False)
+
+
 class UserLogin(Base):
     __tablename__ = 'users_logins'
+    __table_args__ = (
+        Index('ix_users_logins_user_id_login_at',
+              'user_id', text('login_at DESC'), text('id DESC')),
+        {'postgresql_partition_by': 'RANGE (login_at)'},
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4,
-                unique=True, nullable=False)
+                nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
     signin_data = Column(String(255))
     login_at = Column(
-        DateTime, default=datetime.now(timezone.utc).replace(tzinfo=None)
+        DateTime, primary_key=True, nullable=False,
+        default=lambda: datetime.now(timezone.utc).replace(tzinfo=None)
     )
     user = relationship('User', back_populates='user_logins')
 
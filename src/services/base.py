@@ -1,13 +1,23 @@
-from typing import Optional
+import asyncio
+import logging
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Optional
 
 from elasticsearch import NotFoundError
+from redis.exceptions import LockError
 
 from core.config import settings
+from core.metrics import observe
 from db.cache import Cache
+from db.cache_entry import CacheEntry, jittered
 from db.storage import Storage
-from models.film import Film, Films
+from models.film import Film, Films, FilmShort, FilmsShort
 from models.genre import Genre, Genres
 from models.person import Person, Persons
+from services.single_flight import SingleFlight
+
+single_flight = SingleFlight()
+refresh_tasks: set[asyncio.Task] = set()
 
 
 class BaseService:
@@ -24,28 +34,170 @@ class BaseService:
         return {'genres': Genres,
                 'persons': Persons}.get(self.index_name, Films)
 
-    def _get_page_key(self, params: dict, query: dict):
-        return f"{self.index_name}:{params.get('sort', '')}:{params['from']}:{params['size']}:{query}"
+    def _get_short_classes(self):
+        return {settings.film_index: (FilmShort, FilmsShort)}.get(
+            self.index_name
+        )
+
+    def _get_fields(self, short: bool) -> Optional[list[str]]:
+        short_classes = self._get_short_classes()
+        if not short or not short_classes:
+            return None
+        return list(short_classes[0].model_fields)
+
+    def _get_page_key(self, params: dict, query: dict,
+                      fields: Optional[list[str]] = None):
+        return (f"{self.index_name}:{params.get('sort', '')}:"
+                f"{params['from']}:{params['size']}:{query}:"
+                f"{','.join(fields or [])}")
+
+    def _get_ttl(self) -> tuple[float, float]:
+        soft_ttl = jittered(
+            settings.cache_soft_ttl_in_seconds.get(
+                self.index_name, settings.cache_expire_in_seconds
+            ),
+            settings.cache_ttl_jitter
+        )
+        hard_ttl = jittered(
+            settings.cache_hard_ttl_in_seconds.get(
+                self.index_name, settings.cache_expire_in_seconds
+            ),
+            settings.cache_ttl_jitter
+        )
+        return soft_ttl, max(soft_ttl, hard_ttl)
+
+    async def _get_from_cache(
+            self,
+            key: str,
+            refresh: Optional[Callable[[], Awaitable[Any]]] = None
+    ) -> Optional[str]:
+        with observe('cache', 'get', index=self.index_name) as operation:
+            data = await self.cache.get(key)
+            entry = CacheEntry.loads(data) if data else None
+            if not entry:
+                operation.set('result', 'miss')
+                return None
+            stale = entry.is_stale()
+            operation.set('result', 'stale' if stale else 'hit')
+            operation.record_size(len(entry.payload))
+        if refresh and stale:
+            self._refresh_in_background(key, refresh)
+        return entry.payload
+
+    async def _put_to_cache(self, key: str, payload: str):
+        soft_ttl, hard_ttl = self._get_ttl()
+        await self.cache.put(
+            key,
+            CacheEntry.create(payload, soft_ttl, hard_ttl).dumps(),
+            int(hard_ttl)
+        )
+
+    def _refresh_in_background(
+            self, key: str, refresh: Callable[[], Awaitable[Any]]
+    ):
+        if single_flight.is_running(key):
+            return
+
+        async def run():
+            try:
+                await single_flight.do(key, refresh)
+            except Exception:
+                logging.exception('Failed to refresh cache entry %s', key)
 
-    async def get_items(self, **kwargs) -> Optional[list[Film | Genre | Person]]:
+        task = asyncio.create_task(run())
+        refresh_tasks.add(task)
+        task.add_done_callback(refresh_tasks.discard)
+
+    async def get_items(
+            self, short: bool = False, **kwargs
+    ) -> Optional[list[Film | FilmShort | Genre | Person]]:
+        with observe('service', 'get_items', index=self.index_name):
+            return await self._get_items(short, **kwargs)
+
+    async def _get_items(
+            self, short: bool = False, **kwargs
+    ) -> Optional[list[Film | FilmShort | Genre | Person]]:
         body = await self.get_body(kwargs)
         params = await self.get_params(kwargs)
-        page_key = self._get_page_key(params, body)
-        items = await self._page_from_cache(page_key)
+        fields = self._get_fields(short)
+        if fields:
+            kwargs['fields'] = fields
+        page_key = self._get_page_key(params, body, fields)
+        items = await self._page_from_cache(
+            page_key, lambda: self._page_from_storage(page_key, kwargs),
+            short=bool(fields)
+        )
         if not items:
-            items: Optional[list[Film | Genre | Person]] = None
-            if self.index_name == settings.film_index:
-                items = await self.storage.get_films(**kwargs)
-            elif self.index_name == settings.genre_index:
-                items = await self.storage.get_genres(**kwargs)
-            elif self.index_name == settings.person_index:
-                items = await self.storage.get_persons(**kwargs)
-            if not items:
-                return None
-            await self._put_page_to_cache(page_key, items)
+            items = await self._load_once(
+                page_key,
+                lambda: self._page_from_storage(page_key, kwargs),
+                lambda: self._page_from_cache(page_key, short=bool(fields))
+            )
+
+        return items
 
+    async def get_items_after(
+            self, short: bool = False, **kwargs
+    ) -> tuple[list[Film | FilmShort | Genre | Person], Optional[str]]:
+        fields = self._get_fields(short)
+        if fields:
+            kwargs['fields'] = fields
+        if self.index_name == settings.film_index:
+            return await self.storage.get_films_after(**kwargs)
+        elif self.index_name == settings.genre_index:
+            return await self.storage.get_genres_after(**kwargs)
+        elif self.index_name == settings.person_index:
+            return await self.storage.get_persons_after(**kwargs)
+        return [], None
+
+    async def _page_from_storage(
+            self, page_key: str, kwargs: dict
+    ) -> Optional[list[Film | Genre | Person]]:
+        items: Optional[list[Film | Genre | Person]] = None
+        if self.index_name == settings.film_index:
+            items = await self.storage.get_films(**kwargs)
+        elif self.index_name == settings.genre_index:
+            items = await self.storage.get_genres(**kwargs)
+        elif self.index_name == settings.person_index:
+            items = await self.storage.get_persons(**kwargs)
+        if not items:
+            return None
+        await self._put_page_to_cache(
+            page_key, items, short=bool(kwargs.get('fields'))
+        )
         return items
 
+    async def _load_once(
+            self,
+            key: str,
+            load: Callable[[], Awaitable[Any]],
+            from_cache: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        async def leader():
+            lock = None
+            if settings.cache_lock_enabled:
+                lock = self.cache.lock(
+                    f'lock:{key}', settings.cache_lock_timeout_in_seconds
+                )
+            if lock is None:
+                return await load()
+
+            acquired = False
+            with suppress(LockError):
+                acquired = await lock.acquire()
+            try:
+                # another worker may have filled the cache while we waited
+                cached = await from_cache()
+                if cached:
+                    return cached
+                return await load()
+            finally:
+                if acquired:
+                    with suppress(LockError):
+                        await lock.release()
+
+        return await single_flight.do(key, leader)
+
     @staticmethod
     async def get_params(kwargs):
         page_size = kwargs.get('page_size')
@@ -80,12 +232,74 @@ class BaseService:
         return body
 
     async def get_by_id(self, item_id: str) -> Optional[Film | Genre | Person]:
-        item = await self._item_from_cache(item_id)
-        if not item:
-            item = await self._get_item_from_elastic(item_id)
+        with observe('service', 'get_by_id', index=self.index_name):
+            item = await self._item_from_cache(
+                item_id, lambda: self._item_from_storage(item_id)
+            )
             if not item:
-                return None
-            await self._put_item_to_cache(item)
+                item = await self._load_once(
+                    f'{self.index_name}:{item_id}',
+                    lambda: self._item_from_storage(item_id),
+                    lambda: self._item_from_cache(item_id)
+                )
+            return item
+
+    async def get_many(
+            self, item_ids: list[str]
+    ) -> list[Film | Genre | Person]:
+        with observe('service', 'get_many', index=self.index_name):
+            return await self._get_many(item_ids)
+
+    async def _get_many(
+            self, item_ids: list[str]
+    ) -> list[Film | Genre | Person]:
+        item_ids = list(dict.fromkeys(item_ids))
+        keys = [f'{self.index_name}:{item_id}' for item_id in item_ids]
+        found: dict[str, Film | Genre | Person] = {}
+        missing: list[str] = []
+        for item_id, data in zip(item_ids, await self.cache.get_many(keys)):
+            entry = CacheEntry.loads(data) if data else None
+            if not entry:
+                missing.append(item_id)
+                continue
+            if entry.is_stale():
+                self._refresh_in_background(
+                    f'{self.index_name}:{item_id}',
+                    lambda item_id=item_id: self._item_from_storage(item_id)
+                )
+            found[item_id] = self._parse(self._get_class(), entry.payload)
+
+        if missing:
+            items = await self._get_items_from_elastic(missing)
+            soft_ttl, hard_ttl = self._get_ttl()
+            await self.cache.put_many(
+                {f'{self.index_name}:{item.id}': CacheEntry.create(
+                    item.json(), soft_ttl, hard_ttl).dumps()
+                 for item in items},
+                int(hard_ttl)
+            )
+            found.update({item.id: item for item in items})
+
+        return [found[item_id] for item_id in item_ids if item_id in found]
+
+    async def _get_items_from_elastic(
+            self, item_ids: list[str]
+    ) -> list[Film | Genre | Person]:
+        if self.index_name == settings.film_index:
+            return await self.storage.get_films_by_ids(item_ids)
+        elif self.index_name == settings.genre_index:
+            return await self.storage.get_genres_by_ids(item_ids)
+        elif self.index_name == settings.person_index:
+            return await self.storage.get_persons_by_ids(item_ids)
+        return []
+
+    async def _item_from_storage(self, item_id: str) -> Optional[
+        Film | Genre | Person
+    ]:
+        item = await self._get_item_from_elastic(item_id)
+        if not item:
+            return None
+        await self._put_item_to_cache(item)
         return item
 
     async def _get_item_from_elastic(self, item_id: str) -> Optional[
@@ -103,32 +317,49 @@ class BaseService:
             return None
         return doc
 
-    async def _item_from_cache(self, item_id: str) -> Optional[
-        Film | Genre | Person]:
-        data = await self.cache.get(f'{self.index_name}:{item_id}')
+    async def _item_from_cache(
+            self,
+            item_id: str,
+            refresh: Optional[Callable[[], Awaitable[Any]]] = None
+    ) -> Optional[Film | Genre | Person]:
+        data = await self._get_from_cache(
+            f'{self.index_name}:{item_id}', refresh
+        )
         if not data:
             return None
 
-        return self._get_class().parse_raw(data)
+        return self._parse(self._get_class(), data)
 
     async def _put_item_to_cache(self, item: [Film | Genre | Person]):
-        await self.cache.put(
-            f'{self.index_name}:{item.id}',
-            item.json(),
-            settings.cache_expire_in_seconds
-        )
+        await self._put_to_cache(f'{self.index_name}:{item.id}', item.json())
 
-    async def _page_from_cache(self, page_key: str) -> Optional[list[
-        Film | Genre | Person]]:
-        data = await self.cache.get(page_key)
+    async def _page_from_cache(
+            self,
+            page_key: str,
+            refresh: Optional[Callable[[], Awaitable[Any]]] = None,
+            short: bool = False
+    ) -> Optional[list[Film | FilmShort | Genre | Person]]:
+        data = await self._get_from_cache(page_key, refresh)
         if not data:
             return None
 
-        return self._get_items_class().parse_raw(data).items
+        items_class = (self._get_short_classes()[1] if short
+                       else self._get_items_class())
+        return self._parse(items_class, data).items
+
+    @staticmethod
+    def _parse(model, data: str):
+        with observe('pydantic', 'parse_raw', model=model.__name__):
+            return model.parse_raw(data)
 
-    async def _put_page_to_cache(self, page_key: str,
-                                 items_page: list[Film | Genre | Person]):
-        items_list: Films | Genres | Persons = self._get_items_class()(
+    async def _put_page_to_cache(
+            self,
+            page_key: str,
+            items_page: list[Film | FilmShort | Genre | Person],
+            short: bool = False
+    ):
+        items_class = (self._get_short_classes()[1] if short
+                       else self._get_items_class())
+        items_list: Films | FilmsShort | Genres | Persons = items_class(
             items=items_page)
-        await self.cache.put(page_key, items_list.json(),
-                             settings.cache_expire_in_seconds)
+        await self._put_to_cache(page_key, items_list.json())
@@ -3,14 +3,14 @@ from functools import wraps
 from inspect import signature, Parameter
 from http import HTTPStatus
 from typing import Callable
-from models.user import User
+from models.principal import Principal
 from services.users import get_current_user
 
 
 def superuser_required(func: Callable) -> Callable:
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        current_user: User = kwargs.get('current_user')
+        current_user: Principal = kwargs.get('current_user')
         if not current_user:
             raise HTTPException(
                 status_code=HTTPStatus.UNAUTHORIZED,
@@ -30,7 +30,7 @@ def superuser_required(func: Callable) -> Callable:
         current_user_param = Parameter(
             'current_user',
             kind=Parameter.KEYWORD_ONLY,
-            annotation=User,
+            annotation=Principal,
             default=Depends(get_current_user)
         )
         parameters.append(current_user_param)
@@ -44,12 +44,13 @@ def superuser_required(func: Callable) -> Callable:
 def authentication_required(func: Callable) -> Callable:
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        current_user: User = kwargs.get('current_user')
+        current_user: Principal = kwargs.get('current_user')
         if not current_user:
             raise HTTPException(
                 status_code=HTTPStatus.UNAUTHORIZED,
                 detail="Not authenticated"
             )
+        return await func(*args, **kwargs)
 
     original_sig = signature(func)
     parameters = list(original_sig.parameters.values())
@@ -58,7 +59,7 @@ def authentication_required(func: Callable) -> Callable:
         current_user_param = Parameter(
             'current_user',
             kind=Parameter.KEYWORD_ONLY,
-            annotation=User,
+            annotation=Principal,
             default=Depends(get_current_user)
         )
         parameters.append(current_user_param)
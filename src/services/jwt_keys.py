@@ -0,0 +1,89 @@
+import hashlib
+import os
+from functools import lru_cache
+from typing import Optional
+
+import orjson
+from jose import jwk, jwt, JWTError
+
+from core.config import settings
+
+
+class KeyStore:
+
+    def __init__(self, algorithm: str, secret_key: str,
+                 keys_dir: Optional[str] = None,
+                 active_kid: Optional[str] = None):
+        self.algorithm = algorithm
+        self.secret_key = secret_key
+        self.private_keys: dict[str, str] = {}
+        self.public_keys: dict[str, dict] = {}
+        self.active_kid: Optional[str] = None
+        if self.is_symmetric:
+            return
+
+        if not keys_dir:
+            raise ValueError(
+                f'JWT_KEYS_DIR is required for {algorithm} signing'
+            )
+        for name in sorted(os.listdir(keys_dir)):
+            if not name.endswith('.pem'):
+                continue
+            with open(os.path.join(keys_dir, name)) as f:
+                self.add_key(name[:-len('.pem')], f.read())
+        if not self.private_keys:
+            raise ValueError(f'No signing keys found in {keys_dir}')
+        # the newest key (by file name) signs unless one is pinned
+        self.active_kid = active_kid or sorted(self.private_keys)[-1]
+
+    @property
+    def is_symmetric(self) -> bool:
+        return self.algorithm.startswith('HS')
+
+    def add_key(self, kid: str, private_pem: str) -> None:
+        public_key = jwk.construct(private_pem, self.algorithm).public_key()
+        self.private_keys[kid] = private_pem
+        self.public_keys[kid] = {
+            **public_key.to_dict(), 'kid': kid, 'use': 'sig'
+        }
+
+    def encode(self, claims: dict) -> str:
+        if self.is_symmetric:
+            return jwt.encode(claims, self.secret_key, self.algorithm)
+        return jwt.encode(
+            claims,
+            self.private_keys[self.active_kid],
+            self.algorithm,
+            headers={'kid': self.active_kid}
+        )
+
+    def decode(self, token: str) -> dict:
+        if self.is_symmetric:
+            return jwt.decode(token, self.secret_key,
+                              algorithms=self.algorithm)
+        kid = jwt.get_unverified_header(token).get('kid')
+        key = self.public_keys.get(kid)
+        if key is None:
+            raise JWTError(f'Unknown signing key: {kid}')
+        return jwt.decode(token, key, algorithms=self.algorithm)
+
+    def jwks(self) -> dict:
+        return {'keys': list(self.public_keys.values())}
+
+    def jwks_etag(self) -> str:
+        # hash the published document itself so that new key material
+        # under an existing kid changes the tag as well
+        digest = hashlib.sha256(
+            orjson.dumps(self.jwks(), option=orjson.OPT_SORT_KEYS)
+        ).hexdigest()
+        return f'"{digest}"'
+
+
+@lru_cache()
+def get_key_store() -> KeyStore:
+    return KeyStore(
+        settings.algorithm,
+        settings.secret_key,
+        settings.jwt_keys_dir,
+        settings.jwt_active_kid
+    )
@@ -0,0 +1,77 @@
+import asyncio
+import datetime
+import time
+from typing import Optional
+
+import httpx
+from jose import jwt, ExpiredSignatureError, JWTError
+
+
+# Lets downstream services validate our tokens without calling check_token:
+# the key set is fetched from /.well-known/jwks.json, kept for ``ttl``
+# seconds and refetched early only when a token names an unknown key id.
+class JWKSVerifier:
+
+    def __init__(self, jwks_url: str, algorithms: list[str],
+                 ttl: int = 300, min_refresh_interval: int = 10,
+                 timeout: float = 2.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.jwks_url = jwks_url
+        self.algorithms = algorithms
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self.transport = transport
+        self._keys: dict[str, dict] = {}
+        self._fetched_at = 0.0
+        # last fetch attempt, successful or not, to throttle refetches
+        self._attempted_at = float('-inf')
+        self._lock = asyncio.Lock()
+
+    async def verify(self, token: str) -> dict:
+        kid = jwt.get_unverified_header(token).get('kid')
+        key = await self._get_key(kid)
+        if key is None:
+            raise JWTError(f'Unknown signing key: {kid}')
+        claims = jwt.decode(token, key, algorithms=self.algorithms)
+        # exp is enforced by jwt.decode; tokens issued before it was added
+        # only carry the service's own expire claim
+        try:
+            expire = datetime.datetime.fromisoformat(claims['expire'])
+        except (KeyError, TypeError, ValueError):
+            raise JWTError('Token has no valid expire claim')
+        if datetime.datetime.now() > expire:
+            raise ExpiredSignatureError('Signature has expired.')
+        return claims
+
+    async def _get_key(self, kid: str) -> Optional[dict]:
+        age = time.monotonic() - self._fetched_at
+        if kid in self._keys and age < self.ttl:
+            return self._keys[kid]
+        if time.monotonic() - self._attempted_at >= self.min_refresh_interval:
+            try:
+                await self._refresh()
+            except JWTError:
+                # a known key outlives a JWKS outage; an unknown one cannot
+                if kid not in self._keys:
+                    raise
+        return self._keys.get(kid)
+
+    async def _refresh(self) -> None:
+        async with self._lock:
+            if time.monotonic() - self._attempted_at \
+                    < self.min_refresh_interval:
+                return
+            self._attempted_at = time.monotonic()
+            try:
+                async with httpx.AsyncClient(
+                        timeout=self.timeout, transport=self.transport
+                ) as client:
+                    response = await client.get(self.jwks_url)
+                    response.raise_for_status()
+                keys = {key['kid']: key
+                        for key in response.json().get('keys', [])}
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                raise JWTError(f'Failed to fetch JWKS: {e}')
+            self._keys = keys
+            self._fetched_at = time.monotonic()
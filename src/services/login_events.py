@@ -0,0 +1,141 @@
+import asyncio
+import datetime
+import logging
+import uuid
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.config import settings
+from db.partitions import (
+    LOGINS_TABLE, drop_expired_login_partitions, ensure_login_partitions
+)
+
+COLUMNS = ('id', 'user_id', 'signin_data', 'login_at')
+
+
+class LoginEventWriter:
+    # signin events are buffered in memory and copied to users_logins in
+    # batches, so a signin never waits on the insert
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.queue: asyncio.Queue = asyncio.Queue(
+            settings.login_events_queue_size
+        )
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self._tasks: list[asyncio.Task] = []
+        self._flushing: Optional[asyncio.Future] = None
+
+    async def start(self) -> None:
+        await self.maintain_partitions()
+        self._tasks = [asyncio.create_task(self._run()),
+                       asyncio.create_task(self._maintain_periodically())]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._flushing:
+            await asyncio.gather(self._flushing, return_exceptions=True)
+        while not self.queue.empty():
+            await self._write(self._take_batch())
+
+    def record(self, user_id: uuid.UUID,
+               signin_data: Optional[str] = None) -> None:
+        event = (uuid.uuid4(), user_id, signin_data,
+                 datetime.datetime.now(datetime.timezone.utc)
+                 .replace(tzinfo=None))
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logging.warning('Login event queue is full, dropping event')
+
+    def _take_batch(self) -> list[tuple]:
+        batch = []
+        while (len(batch) < settings.login_events_batch_size
+               and not self.queue.empty()):
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                batch.append(await self.queue.get())
+                # asyncio.timeout, unlike wait_for, never swallows a
+                # cancellation that races with a get() completing
+                try:
+                    async with asyncio.timeout_at(
+                        loop.time()
+                        + settings.login_events_flush_interval_seconds
+                    ):
+                        while len(batch) < settings.login_events_batch_size:
+                            batch.append(await self.queue.get())
+                except TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                # events already taken off the queue are not seen by the
+                # drain in stop(), which waits for this write instead
+                if batch:
+                    self._flushing = asyncio.ensure_future(self._write(batch))
+                raise
+            # a shutdown must not cut a COPY off halfway
+            self._flushing = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    async def _write(self, batch: list[tuple]) -> None:
+        try:
+            async with self.engine.connect() as conn:
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.copy_records_to_table(
+                    LOGINS_TABLE, records=batch, columns=COLUMNS
+                )
+        except Exception:
+            self.dropped += len(batch)
+            logging.exception('Failed to write %s login events', len(batch))
+            return
+        self.written += len(batch)
+        self.batches += 1
+
+    async def maintain_partitions(self) -> None:
+        async with self.engine.begin() as conn:
+            created = await ensure_login_partitions(
+                conn, settings.login_history_premake_months
+            )
+            dropped = await drop_expired_login_partitions(
+                conn, settings.login_history_retention_months
+            )
+        if created or dropped:
+            logging.info('Login partitions created: %s, dropped: %s',
+                         created, dropped)
+
+    async def _maintain_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(
+                settings.login_history_maintenance_interval_seconds
+            )
+            try:
+                await self.maintain_partitions()
+            except Exception:
+                logging.exception('Failed to maintain login partitions')
+
+    def stats(self) -> dict:
+        return {
+            'queued': self.queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'batches': self.batches,
+        }
+
+
+login_events: Optional[LoginEventWriter] = None
+
+
+def get_login_events() -> Optional[LoginEventWriter]:
+    return login_events
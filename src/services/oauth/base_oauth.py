@@ -1,26 +1,179 @@
-import requests
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import urlencode
+
+import httpx
+from jose import jwt, JWTError
+
+from core.config import settings
+from services.oauth.http_client import get_oauth_http_client
+
+
+@dataclass
+class ProviderMetadata:
+    authorize_url: str
+    token_url: str
+    userinfo_url: Optional[str] = None
+    jwks_url: Optional[str] = None
+    issuer: Optional[str] = None
+    jwks: dict = field(default_factory=dict)
+    fetched_at: float = field(default_factory=time.monotonic)
+
+    def is_fresh(self) -> bool:
+        return (time.monotonic() - self.fetched_at
+                < settings.oauth_metadata_ttl_seconds)
 
 
 class BaseOAuth:
+    name = ""
+    authorize_url = ""
+    token_url = ""
     user_info_url = ""
+    user_info_scheme = "Bearer"
+    scope = ""
 
-    def __init__(self, client_id, client_secret, redirect_uri):
+    def __init__(self, client_id, client_secret, redirect_uri,
+                 discovery_url=None, scope=None, name=None, **endpoints):
+        self.name = name or self.name
         self.client_id = client_id
         self.client_secret = client_secret
         self.redirect_uri = redirect_uri
+        self.discovery_url = discovery_url
+        self.scope = scope if scope is not None else self.scope
+        self.endpoints = endpoints
+        self.metadata: Optional[ProviderMetadata] = None
+        self._lock = asyncio.Lock()
+
+    async def get_metadata(self) -> ProviderMetadata:
+        # the registry refreshes metadata in the background, so requests
+        # only fetch it themselves on a cold start or after a long outage
+        if self.metadata is None or not self.metadata.is_fresh():
+            await self.refresh_metadata()
+        return self.metadata
+
+    async def refresh_metadata(self, force: bool = False) -> None:
+        async with self._lock:
+            # another request may have refreshed it while this one waited
+            if not force and self.metadata is not None \
+                    and self.metadata.is_fresh():
+                return
+            self.metadata = await self._fetch_metadata()
+
+    async def _fetch_metadata(self) -> ProviderMetadata:
+        http = get_oauth_http_client()
+        document = {}
+        if self.discovery_url:
+            response = await http.request(self.name, "GET", self.discovery_url)
+            document = response.json()
+        metadata = ProviderMetadata(
+            authorize_url=self.endpoints.get('authorize_url')
+            or document.get('authorization_endpoint') or self.authorize_url,
+            token_url=self.endpoints.get('token_url')
+            or document.get('token_endpoint') or self.token_url,
+            userinfo_url=self.endpoints.get('userinfo_url')
+            or document.get('userinfo_endpoint') or self.user_info_url,
+            jwks_url=self.endpoints.get('jwks_url') or document.get('jwks_uri'),
+            issuer=document.get('issuer'),
+        )
+        if metadata.jwks_url:
+            response = await http.request(self.name, "GET", metadata.jwks_url)
+            metadata.jwks = response.json()
+        return metadata
+
+    async def get_authorization_url(
+            self, state: Optional[str] = None
+    ) -> Optional[str]:
+        try:
+            metadata = await self.get_metadata()
+        except (httpx.HTTPError, ValueError) as e:
+            logging.error(f"Error obtaining {self.name} metadata: {e}")
+            return None
+        params = {
+            "response_type": "code",
+            "client_id": self.client_id,
+            "redirect_uri": self.redirect_uri,
+        }
+        if self.scope:
+            params["scope"] = self.scope
+        if state:
+            params["state"] = state
+        return f"{metadata.authorize_url}?{urlencode(params)}"
 
-    async def get_user_info(self, token: str) -> dict:
-        headers = {"Authorization": f"OAuth {token}"}
+    async def get_token(self, code: str) -> Optional[dict]:
+        data = {
+            "grant_type": "authorization_code",
+            "code": code,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "redirect_uri": self.redirect_uri,
+        }
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
 
         try:
-            response = requests.get(self.user_info_url, headers=headers)
-            response.raise_for_status()
+            metadata = await self.get_metadata()
+            response = await get_oauth_http_client().request(
+                self.name, "POST", metadata.token_url,
+                data=data, headers=headers
+            )
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logging.error(f"Error obtaining {self.name} token: {e}")
+            return None
+
+    async def get_user_info(self, token: dict) -> Optional[dict]:
+        try:
+            metadata = await self.get_metadata()
+        except (httpx.HTTPError, ValueError) as e:
+            logging.error(f"Error obtaining {self.name} metadata: {e}")
+            return None
+        # a verified id_token already carries the claims, which saves the
+        # userinfo round trip
+        if token.get('id_token') and metadata.jwks:
+            try:
+                claims = jwt.decode(
+                    token['id_token'], metadata.jwks,
+                    algorithms=['RS256', 'ES256'],
+                    audience=self.client_id, issuer=metadata.issuer,
+                    access_token=token.get('access_token')
+                )
+                return self.parse_user_info(claims)
+            except (JWTError, ValueError) as e:
+                logging.warning(f"Invalid {self.name} id_token: {e}")
+
+        headers = {
+            "Authorization": f"{self.user_info_scheme} {token.get('access_token')}"
+        }
+        try:
+            response = await get_oauth_http_client().request(
+                self.name, "GET", metadata.userinfo_url, headers=headers
+            )
             user_info = response.json()
             return self.parse_user_info(user_info)
-        except requests.RequestException as e:
-            print(f"Error obtaining user info: {e}")
+        except (httpx.HTTPError, ValueError) as e:
+            logging.error(f"Error obtaining user info: {e}")
             return None
 
     def parse_user_info(self, user_info: dict) -> dict:
         raise NotImplementedError(
             "This method should be overridden in subclasses")
+
+
+class OIDCOAuth(BaseOAuth):
+    scope = "openid email profile"
+
+    def parse_user_info(self, user_info: dict) -> dict:
+        # without a subject every such response would map to one account
+        if user_info.get('sub') in (None, ''):
+            raise ValueError(f"{self.name} user info has no subject")
+        return {
+            'id': str(user_info['sub']),
+            'login': user_info.get('preferred_username')
+            or user_info.get('email'),
+            'default_email': user_info.get('email'),
+            'first_name': user_info.get('given_name', ''),
+            'last_name': user_info.get('family_name', ''),
+            'display_name': user_info.get('name', '')
+        }
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import random
+from typing import Optional
+
+import httpx
+
+from core.config import settings
+
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+class OAuthHTTPClient:
+    # one pooled client shared by every provider call, so callbacks reuse
+    # keep-alive connections instead of opening a new TLS session each time
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                settings.oauth_http_timeout_seconds,
+                connect=settings.oauth_http_connect_timeout_seconds
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.oauth_http_max_connections,
+                max_keepalive_connections=settings.oauth_http_max_connections,
+                keepalive_expiry=settings.oauth_http_keepalive_seconds
+            ),
+            transport=transport
+        )
+        self.semaphores: dict[str, asyncio.Semaphore] = {}
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _semaphore(self, provider: str) -> asyncio.Semaphore:
+        if provider not in self.semaphores:
+            self.semaphores[provider] = asyncio.Semaphore(
+                settings.oauth_http_provider_concurrency
+            )
+        return self.semaphores[provider]
+
+    async def request(
+            self, provider: str, method: str, url: str, **kwargs
+    ) -> httpx.Response:
+        # a token exchange is not idempotent: an authorization code can be
+        # redeemed once, so it is retried only when it never reached the
+        # provider
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        async with self._semaphore(provider):
+            attempt = 0
+            while True:
+                self.requests += 1
+                try:
+                    response = await self.client.request(method, url, **kwargs)
+                except httpx.TransportError as e:
+                    retryable = idempotent or isinstance(
+                        e, (httpx.ConnectError, httpx.ConnectTimeout,
+                            httpx.PoolTimeout)
+                    )
+                    if not retryable or attempt >= settings.oauth_http_retries:
+                        self.failures += 1
+                        raise
+                    delay = self._backoff(attempt)
+                else:
+                    if (response.status_code not in RETRY_STATUSES
+                            or attempt >= settings.oauth_http_retries
+                            or not (idempotent or response.status_code == 429)):
+                        if response.is_error:
+                            self.failures += 1
+                        response.raise_for_status()
+                        return response
+                    delay = self._retry_after(response) or self._backoff(attempt)
+                logging.warning('Retrying %s %s for %s in %.2fs',
+                                method, url, provider, delay)
+                self.retries += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        # full jitter keeps retries from many workers from lining up
+        return random.uniform(0, min(
+            settings.oauth_http_backoff_max_seconds,
+            settings.oauth_http_backoff_seconds * 2 ** attempt
+        ))
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> Optional[float]:
+        try:
+            delay = float(response.headers.get('Retry-After', ''))
+        except ValueError:
+            return None
+        return min(max(delay, 0), settings.oauth_http_backoff_max_seconds)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'failures': self.failures,
+        }
+
+
+oauth_http_client: Optional[OAuthHTTPClient] = None
+
+
+def get_oauth_http_client() -> OAuthHTTPClient:
+    global oauth_http_client
+    if oauth_http_client is None:
+        oauth_http_client = OAuthHTTPClient()
+    return oauth_http_client
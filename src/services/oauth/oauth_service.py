@@ -1,15 +1,82 @@
-from ya_oauth import YandexOAuth
+import asyncio
+import logging
+from typing import Optional
 
-PROVIDERS = {
-    'yandex': YandexOAuth()
+from core.config import settings
+from services.oauth.base_oauth import BaseOAuth, OIDCOAuth
+from services.oauth.ya_oauth import YandexOAuth
+
+PROVIDER_CLASSES = {
+    'yandex': YandexOAuth,
+    'oidc': OIDCOAuth,
 }
 
 
-class OAuthService:
-    def __init__(self, provider_name: str):
-        self.oauth_provider = PROVIDERS.get(provider_name)
-        if not self.oauth_provider:
-            raise ValueError(f"Unsupported provider: {provider_name}")
+class ProviderRegistry:
+
+    def __init__(self, providers: dict[str, BaseOAuth]):
+        self.providers = providers
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(cls) -> 'ProviderRegistry':
+        configs = {name: dict(config)
+                   for name, config in settings.oauth_providers.items()}
+        # the single-provider settings still work as one registry entry
+        if settings.client_id and settings.authorize_provider not in configs:
+            configs[settings.authorize_provider] = {
+                'client_id': settings.client_id,
+                'client_secret': settings.client_secret,
+                'redirect_uri': settings.redirect_uri,
+                'authorize_url': settings.authorize_url,
+                'token_url': settings.access_token_url,
+            }
+        providers = {}
+        for name, config in configs.items():
+            provider_class = PROVIDER_CLASSES[
+                config.pop('type', name if name in PROVIDER_CLASSES else 'oidc')
+            ]
+            providers[name] = provider_class(name=name, **config)
+        return cls(providers)
+
+    def get(self, name: str) -> BaseOAuth:
+        provider = self.providers.get(name)
+        if not provider:
+            raise ValueError(f"Unsupported provider: {name}")
+        return provider
+
+    async def start(self) -> None:
+        await self.refresh()
+        self._task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def refresh(self) -> None:
+        results = await asyncio.gather(
+            *(provider.refresh_metadata(force=True)
+              for provider in self.providers.values()),
+            return_exceptions=True
+        )
+        for name, result in zip(self.providers, results):
+            # a provider that is down keeps its last metadata until the ttl
+            # runs out and is retried on the next round
+            if isinstance(result, Exception):
+                logging.error(f"Failed to refresh {name} metadata: {result}")
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.oauth_metadata_refresh_seconds)
+            await self.refresh()
+
+
+provider_registry: Optional[ProviderRegistry] = None
+
 
-    async def get_user_info(self, token: str) -> dict:
-        return await self.oauth_provider.get_user_info(token)
+def get_provider_registry() -> ProviderRegistry:
+    global provider_registry
+    if provider_registry is None:
+        provider_registry = ProviderRegistry.from_settings()
+    return provider_registry
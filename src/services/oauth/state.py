@@ -0,0 +1,36 @@
+import hmac
+import secrets
+import time
+
+from jose import JWTError
+
+from core.config import settings
+from services.jwt_keys import get_key_store
+
+STATE_COOKIE = 'oauth_state'
+
+
+def issue_state(provider: str) -> tuple[str, str]:
+    # the signed state goes to the provider and the nonce to the browser as
+    # a cookie; a callback is only accepted with both, so a code obtained in
+    # someone else's browser cannot be completed in this one
+    nonce = secrets.token_urlsafe(16)
+    state = get_key_store().encode({
+        'typ': 'oauth_state',
+        'provider': provider,
+        'nonce': nonce,
+        'exp': int(time.time()) + settings.oauth_state_ttl_seconds,
+    })
+    return state, nonce
+
+
+def verify_state(provider: str, state: str, nonce: str) -> bool:
+    if not state or not nonce:
+        return False
+    try:
+        claims = get_key_store().decode(state)
+    except JWTError:
+        return False
+    return (claims.get('typ') == 'oauth_state'
+            and claims.get('provider') == provider
+            and hmac.compare_digest(str(claims.get('nonce')), nonce))
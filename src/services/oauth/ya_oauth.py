@@ -1,15 +1,13 @@
-from base_oauth import BaseOAuth
-from core.config import settings
+from services.oauth.base_oauth import BaseOAuth
+
 
 class YandexOAuth(BaseOAuth):
+    name = "yandex"
+    authorize_url = "https://oauth.yandex.ru/authorize"
+    token_url = "https://oauth.yandex.ru/token"
     user_info_url = "https://login.yandex.ru/info"
+    user_info_scheme = "OAuth"
 
-    def __init__(self):
-        super().__init__(
-            client_id=settings.client_id,
-            client_secret=settings.client_secret,
-            redirect_uri=settings.redirect_uri
-        )
     def parse_user_info(self, user_info: dict) -> dict:
         return {
             'id': user_info.get('id'),
@@ -18,4 +16,4 @@ class YandexOAuth(BaseOAuth):
             'first_name': user_info.get('first_name', ''),
             'last_name': user_info.get('last_name', ''),
             'display_name': user_info.get('display_name', '')
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import hmac
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from core.config import settings
+from core.metrics import observe
+from db.memory.lru_cache import LRUCache
+
+
+class PasswordHasher:
+
+    def __init__(self, method: str, max_workers: int, max_concurrency: int,
+                 verified: LRUCache, secret_key: str):
+        self.method = method
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self.verified = verified
+        self.secret_key = secret_key.encode()
+        # werkzeug expands shorthands like 'scrypt' or 'pbkdf2:sha256' with
+        # its default cost parameters, so the prefix of a fresh hash is what
+        # stored hashes are compared against
+        self.hash_prefix = generate_password_hash('', method).split('$', 1)[0]
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # forking would copy the tracing and logging threads' locks in
+            # whatever state they happen to be; spawn starts clean
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=get_context('spawn')
+            )
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), func, *args
+            )
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        with observe('hasher', 'hash', method=self.method.split(':')[0]):
+            return await self._run(
+                generate_password_hash, password, self.method
+            )
+
+    async def verify(self, password_hash: str, password: str) -> bool:
+        # the stored hash is part of the key, so a password change or
+        # rehash invalidates earlier successful verifications
+        key = hmac.new(
+            self.secret_key,
+            f'{password_hash}\0{password}'.encode(),
+            hashlib.sha256
+        ).hexdigest()
+        with observe('hasher', 'verify') as operation:
+            if await self.verified.get(key):
+                operation.set('result', 'cached')
+                return True
+            operation.set('result', 'computed')
+            if not await self._run(
+                    check_password_hash, password_hash, password
+            ):
+                return False
+        await self.verified.put(key, '1', self.verified.ttl)
+        return True
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        # werkzeug stores the method and its cost parameters in front of
+        # the salt, e.g. 'scrypt:32768:8:1$<salt>$<hash>'
+        return password_hash.split('$', 1)[0] != self.hash_prefix
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            'waiting': self.waiting,
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'max_workers': self.max_workers,
+            'max_concurrency': self.max_concurrency,
+            'verify_cache': self.verified.stats(),
+        }
+
+
+password_hasher = PasswordHasher(
+    settings.password_hash_method,
+    settings.password_hash_workers,
+    settings.password_hash_concurrency,
+    LRUCache(settings.password_verify_cache_max_items,
+             settings.password_verify_cache_ttl_in_seconds),
+    settings.secret_key
+)
+
+
+def get_password_hasher() -> PasswordHasher:
+    return password_hasher
@@ -0,0 +1,14 @@
+import hashlib
+
+from core.config import settings
+from db.memory.lru_cache import LRUCache
+
+# principals decoded from access tokens, keyed by token digest; each entry
+# is kept until its own token expires
+principal_cache = LRUCache(
+    settings.principal_cache_max_items, settings.access_token_lifetime
+)
+
+
+def get_token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
@@ -0,0 +1,317 @@
+import asyncio
+import datetime
+import ipaddress
+import logging
+import math
+import time
+from collections import Counter
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Request
+from jose import JWTError
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from core.config import settings
+from core.rate_limits import Policy, get_policy
+from models.principal import Principal
+from services.jwt_keys import get_key_store
+from services.principal_cache import get_token_key, principal_cache
+
+
+class Decision:
+
+    def __init__(self, allowed: bool, limit: int, remaining: int,
+                 reset: float, retry_after: float = 0):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+        self.retry_after = retry_after
+
+    def headers(self, policy: Policy) -> dict:
+        headers = {
+            'RateLimit-Limit': str(self.limit),
+            'RateLimit-Remaining': str(self.remaining),
+            'RateLimit-Reset': str(math.ceil(self.reset)),
+            'RateLimit-Policy': ', '.join(
+                f'{times};w={seconds}' for times, seconds in policy.windows
+            ),
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(math.ceil(self.retry_after))
+        return headers
+
+
+class RateLimiter:
+    # Non-exact decisions are made against a per-worker GCRA state. Every
+    # sync interval the hits each worker allowed are added to shared Redis
+    # counters in one pipeline, and whatever the other workers consumed in
+    # the meantime is charged to the local state, so the cluster converges
+    # on the configured limit without a Redis call per request.
+
+    def __init__(self, redis: Optional[Redis] = None):
+        self.redis = redis
+        self.tats: dict[str, float] = {}
+        self.pending: dict[str, int] = {}
+        # redis key -> (last total seen, when the window is over)
+        self.seen: dict[str, tuple[int, float]] = {}
+        self.limits: dict[str, tuple[int, int]] = {}
+        self.decisions: Counter = Counter()
+        self.syncs = 0
+        self.sync_failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, redis: Redis) -> None:
+        self.redis = redis
+        self._task = asyncio.create_task(self._sync_periodically())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.sync()
+        except Exception:
+            logging.exception('Failed to flush rate limit counters')
+        if self.redis:
+            await self.redis.close()
+            self.redis = None
+
+    def hit(self, key: str, windows) -> Decision:
+        now = time.monotonic()
+        updates = []
+        decision = None
+        for times, seconds in windows:
+            window_key = f'{key}:{seconds}'
+            interval = seconds / times
+            new_tat = max(self.tats.get(window_key, now), now) + interval
+            if new_tat - now > seconds:
+                retry_after = new_tat - seconds - now
+                if decision is None or retry_after > decision.retry_after:
+                    decision = Decision(False, times, 0,
+                                        self.tats[window_key] - now,
+                                        retry_after)
+                continue
+            updates.append((window_key, new_tat, times, seconds))
+        if decision:
+            # a request rejected by one window uses up none of the others
+            return decision
+        for window_key, new_tat, times, seconds in updates:
+            self.tats[window_key] = new_tat
+            self.limits[window_key] = (times, seconds)
+            self.pending[window_key] = self.pending.get(window_key, 0) + 1
+            remaining = int((seconds - (new_tat - now)) // (seconds / times))
+            if decision is None or remaining < decision.remaining:
+                decision = Decision(True, times, remaining, new_tat - now)
+        return decision
+
+    async def hit_exact(self, key: str, windows) -> Decision:
+        # sliding windows: the previous fixed window counts in proportion
+        # to how much of it still overlaps; all windows are read and
+        # incremented in a single pipelined round trip
+        if self.redis is None:
+            return self.hit(key, windows)
+        now = time.time()
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for times, seconds in windows:
+                    current = f'rate:sw:{key}:{seconds}:{int(now // seconds)}'
+                    pipe.incr(current)
+                    pipe.expire(current, seconds * 2)
+                    pipe.get(f'rate:sw:{key}:{seconds}:'
+                             f'{int(now // seconds) - 1}')
+                results = await pipe.execute()
+        except RedisError:
+            logging.exception('Exact rate limit check failed, using local')
+            return self.hit(key, windows)
+
+        decision = None
+        for index, (times, seconds) in enumerate(windows):
+            count = int(results[index * 3])
+            previous = int(results[index * 3 + 2] or 0)
+            elapsed = now % seconds
+            estimated = previous * (1 - elapsed / seconds) + count
+            if estimated > times:
+                retry_after = seconds - elapsed
+                if count <= times and previous:
+                    # wait only until the previous window has decayed enough
+                    retry_after = min(
+                        retry_after, (estimated - times) * seconds / previous
+                    )
+                if decision is None or decision.allowed \
+                        or retry_after > decision.retry_after:
+                    decision = Decision(False, times, 0, seconds - elapsed,
+                                        retry_after)
+            elif decision is None or (decision.allowed and
+                                      times - estimated < decision.remaining):
+                decision = Decision(True, times, int(times - estimated),
+                                    seconds - elapsed)
+
+        if not decision.allowed:
+            # rejected requests should not count against the client
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for times, seconds in windows:
+                        pipe.decr(
+                            f'rate:sw:{key}:{seconds}:{int(now // seconds)}'
+                        )
+                    await pipe.execute()
+            except RedisError:
+                logging.exception('Failed to roll back rate limit counters')
+        return decision
+
+    async def sync(self) -> None:
+        if not self.redis or not (self.pending or self.tats):
+            return
+        pending, self.pending = self.pending, {}
+        keys = []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            # keys still inside their window are read back even without new
+            # hits, so a worker learns about traffic that went elsewhere
+            for key in pending.keys() | self.tats.keys():
+                count = pending.get(key, 0)
+                times, seconds = self.limits[key]
+                window = int(time.time() // seconds)
+                redis_key = f'rate:{key}:{window}'
+                pipe.incrby(redis_key, count)
+                pipe.expire(redis_key, seconds * 2)
+                keys.append((key, redis_key, count, seconds / times, seconds))
+            results = await pipe.execute()
+        now = time.monotonic()
+        for (key, redis_key, count, interval, seconds), total in zip(
+                keys, results[::2]):
+            last_total = self.seen.get(redis_key, (0, 0))[0]
+            others = total - last_total - count
+            if others > 0 and key in self.tats:
+                self.tats[key] = max(self.tats[key], now) + others * interval
+            self.seen[redis_key] = (total, now + seconds)
+        self.syncs += 1
+        self._prune()
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, tat in self.tats.items() if tat <= now]:
+            del self.tats[key]
+            if key not in self.pending:
+                self.limits.pop(key, None)
+        for redis_key in [redis_key for redis_key, (_, expires)
+                          in self.seen.items() if expires <= now]:
+            del self.seen[redis_key]
+
+    async def _sync_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.rate_limit_sync_interval_seconds)
+            try:
+                await self.sync()
+            except Exception:
+                self.sync_failures += 1
+                logging.exception('Failed to sync rate limit counters')
+
+    def stats(self) -> dict:
+        return {
+            'keys': len(self.tats),
+            'syncs': self.syncs,
+            'sync_failures': self.sync_failures,
+            'decisions': {f'{name}:{outcome}': count
+                          for (name, outcome), count in self.decisions.items()},
+        }
+
+
+rate_limiter = RateLimiter()
+
+trusted_proxies = [ipaddress.ip_network(network)
+                   for network in settings.rate_limit_trusted_proxies]
+
+
+def is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in trusted_proxies)
+
+
+def get_client_ip(request: Request) -> str:
+    # X-Forwarded-For is only believed when it was set by our own proxies;
+    # the client is the right-most hop that is not one of them
+    host = request.client.host if request.client else ''
+    if not is_trusted_proxy(host):
+        return host
+    forwarded = request.headers.get('X-Forwarded-For', '')
+    for hop in reversed([hop.strip() for hop in forwarded.split(',')]):
+        if hop and not is_trusted_proxy(hop):
+            return hop
+    return request.headers.get('X-Real-IP', host)
+
+
+async def get_principal_id(request: Request) -> Optional[str]:
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    # the cache holds the principals authentication already decoded, and
+    # drops each one when its token expires
+    data = await principal_cache.get(get_token_key(token))
+    if data:
+        return Principal.parse_raw(data).id
+    try:
+        payload = get_key_store().decode(token)
+        expire = datetime.datetime.fromisoformat(payload['expire'])
+    except (JWTError, KeyError, TypeError, ValueError):
+        return None
+    if datetime.datetime.now() > expire:
+        return None
+    # the user id, the same key a cached principal gives; tokens issued
+    # before sub was added are limited by address until they expire
+    return payload.get('sub')
+
+
+async def get_rate_limit_key(request: Request, policy: Policy) -> str:
+    if policy.key == 'principal':
+        principal_id = await get_principal_id(request)
+        if principal_id:
+            return f'principal:{principal_id}'
+    if policy.key in ('principal', 'client'):
+        host = request.client.host if request.client else ''
+        client_id = request.headers.get(settings.rate_limit_client_header)
+        # the client header is set by the gateway, never by the caller
+        if client_id and is_trusted_proxy(host):
+            return f'client:{client_id}'
+    return f'ip:{get_client_ip(request)}'
+
+
+def starts_cursor_walk(request: Request) -> bool:
+    return request.query_params.get('cursor') == ''
+
+
+class RateLimit:
+    # Depends(RateLimit('signin')) applies the named policy from
+    # core.rate_limits; the RateLimit-* headers are added to the response
+    # by the middleware in main.py; with ``when`` the policy only applies to
+    # the requests it selects
+
+    def __init__(self, name: str,
+                 when: Optional[Callable[[Request], bool]] = None):
+        self.name = name
+        self.when = when
+
+    async def __call__(self, request: Request) -> None:
+        if not settings.rate_limit_enabled \
+                or (self.when and not self.when(request)):
+            return
+        policy = get_policy(self.name)
+        key = f'{self.name}:{await get_rate_limit_key(request, policy)}'
+        if policy.exact:
+            decision = await rate_limiter.hit_exact(key, policy.windows)
+        else:
+            decision = rate_limiter.hit(key, policy.windows)
+        rate_limiter.decisions[
+            (self.name, 'allowed' if decision.allowed else 'limited')
+        ] += 1
+        headers = decision.headers(policy)
+        if not decision.allowed:
+            raise HTTPException(
+                status_code=429, detail='Too Many Requests', headers=headers
+            )
+        request.state.rate_limit_headers = headers
@@ -0,0 +1,61 @@
+import asyncio
+import datetime
+import logging
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core.config import settings
+from db.repositories.refresh_tokens import RefreshTokenRepository
+
+
+class RefreshTokenSweeper:
+
+    def __init__(self, sessionmaker: async_sessionmaker):
+        self.sessionmaker = sessionmaker
+        self.deleted = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._sweep_periodically())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def sweep(self) -> int:
+        deleted = 0
+        now = datetime.datetime.now()
+        while True:
+            async with self.sessionmaker() as session:
+                tokens = RefreshTokenRepository(session)
+                # another worker is sweeping the same rows already
+                if not await tokens.try_lock_sweep():
+                    break
+                count = await tokens.delete_expired(
+                    now, settings.refresh_token_sweep_batch_size
+                )
+                await session.commit()
+            deleted += count
+            if count < settings.refresh_token_sweep_batch_size:
+                break
+        self.deleted += deleted
+        return deleted
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.refresh_token_sweep_interval_seconds)
+            try:
+                deleted = await self.sweep()
+            except Exception:
+                logging.exception('Failed to sweep expired refresh tokens')
+                continue
+            if deleted:
+                logging.info('Deleted %s expired refresh tokens', deleted)
+
+    def stats(self) -> dict:
+        return {'deleted': self.deleted}
+
+
+refresh_token_sweeper: Optional[RefreshTokenSweeper] = None
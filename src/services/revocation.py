@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import logging
+import math
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from core.config import settings
+
+CHANNEL = 'revocations'
+
+
+class BloomFilter:
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate)
+                                / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7))
+                   for pos in self._positions(item))
+
+
+class RevocationSet:
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self.revoked = self._new_filter()
+        self.permission_versions: dict[str, int] = {}
+        self.checks = 0
+        self.possible_hits = 0
+        # filters and versions being rebuilt by a running resync; live
+        # updates go to them too, so none is lost when they are swapped in
+        self._rebuilds: list[tuple[BloomFilter, dict[str, int]]] = []
+        self._tasks: list[asyncio.Task] = []
+        self._synced = asyncio.Event()
+
+    @staticmethod
+    def _new_filter() -> BloomFilter:
+        return BloomFilter(settings.revocation_bloom_capacity,
+                           settings.revocation_bloom_error_rate)
+
+    async def start(self) -> None:
+        # the listener resyncs once it is subscribed; serve only after that
+        self._tasks = [asyncio.create_task(self._listen()),
+                       asyncio.create_task(self._resync_periodically())]
+        await self._synced.wait()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.redis.close()
+
+    def might_be_revoked(self, jti: str) -> bool:
+        self.checks += 1
+        if jti in self.revoked:
+            self.possible_hits += 1
+            return True
+        return False
+
+    def permission_version(self, user_id: str) -> Optional[int]:
+        return self.permission_versions.get(user_id)
+
+    async def publish_revocation(self, jti: str) -> None:
+        self._revoke(jti)
+        await self.redis.publish(CHANNEL, f'jti:{jti}')
+
+    async def publish_permission_versions(self, versions: dict) -> None:
+        for user_id, version in versions.items():
+            self._set_permission_version(user_id, int(version))
+            await self.redis.publish(CHANNEL, f'pv:{user_id}:{version}')
+
+    def _revoke(self, jti: str) -> None:
+        self.revoked.add(jti)
+        for revoked, _ in self._rebuilds:
+            revoked.add(jti)
+
+    def _set_permission_version(self, user_id: str, version: int) -> None:
+        for versions in [self.permission_versions,
+                         *(versions for _, versions in self._rebuilds)]:
+            versions[user_id] = max(version, versions.get(user_id, 0))
+
+    def _apply(self, message: str) -> None:
+        kind, _, value = message.partition(':')
+        if kind == 'jti':
+            self._revoke(value)
+        elif kind == 'pv':
+            user_id, _, version = value.partition(':')
+            self._set_permission_version(user_id, int(version))
+
+    async def resync(self) -> None:
+        # rebuilding from scratch also drops jtis whose Redis keys expired
+        revoked = self._new_filter()
+        live_versions: dict[str, int] = {}
+        rebuild = (revoked, live_versions)
+        self._rebuilds.append(rebuild)
+        try:
+            async for key in self.redis.scan_iter(match='token:*',
+                                                  count=1000):
+                revoked.add(key.partition(':')[2])
+
+            permission_versions = {}
+            keys = [key async for key in
+                    self.redis.scan_iter(match='perm_version:*', count=1000)]
+            if keys:
+                for key, version in zip(keys, await self.redis.mget(keys)):
+                    if version is not None:
+                        permission_versions[key.partition(':')[2]] = \
+                            int(version)
+            for user_id, version in live_versions.items():
+                permission_versions[user_id] = max(
+                    version, permission_versions.get(user_id, 0)
+                )
+
+            self.revoked = revoked
+            self.permission_versions = permission_versions
+        finally:
+            self._rebuilds.remove(rebuild)
+
+    async def _resync_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.revocation_resync_in_seconds)
+            try:
+                await self.resync()
+            except Exception:
+                logging.exception('Failed to resync revoked tokens')
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(CHANNEL)
+                    # cover anything published while we were not subscribed
+                    await self.resync()
+                    self._synced.set()
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self._apply(message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception('Revocation subscription failed')
+                await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        return {
+            'checks': self.checks,
+            'possible_hits': self.possible_hits,
+            'permission_versions': len(self.permission_versions),
+        }
+
+
+revocations: Optional[RevocationSet] = None
+
+
+def get_revocations() -> Optional[RevocationSet]:
+    return revocations
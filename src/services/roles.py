@@ -3,27 +3,33 @@ from uuid import UUID
 from dataclasses import dataclass
 
 from fastapi import HTTPException, status, Depends
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from models.role import Role
+from core.config import settings
+from models.role import Role, user_roles_table
 from models.user import User
-from db.postgres import get_session
+from db.cache import Cache
+from db.postgres import get_read_session, get_session
+from db.redis.redis_cache import RedisCache
+from db.repositories.roles import RoleRepository
+from db.repositories.users import UserRepository
+from services.revocation import get_revocations
 
 
 @dataclass
 class RoleService:
     pg_session: AsyncSession
+    redis: Cache
+    pg_read_session: AsyncSession
 
     async def create_role(
         self,
         name: str,
         description: Optional[str] = None,
     ) -> Role:
-        existing_role = await self.pg_session.execute(
-            select(Role).filter_by(name=name)
-        )
-        if existing_role.scalars().first():
+        if await RoleRepository(self.pg_session).get_by_name(name):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Role with this name already exists."
@@ -36,12 +42,10 @@ class RoleService:
         return new_role
 
     async def get_role(self, role_id: UUID) -> Optional[Role]:
-        result = await self.pg_session.execute(select(Role).filter(Role.id == role_id))
-        return result.scalars().first()
+        return await RoleRepository(self.pg_read_session).get_by_id(role_id)
 
     async def get_roles(self, offset: int = 0, limit: int = 100) -> List[Role]:
-        result = await self.pg_session.execute(select(Role).offset(offset).limit(limit))
-        return list(result.scalars().all())
+        return await RoleRepository(self.pg_read_session).get_page(offset, limit)
 
     async def update_role(
         self,
@@ -49,7 +53,7 @@ class RoleService:
         name: str,
         description: Optional[str] = None
     ) -> Role:
-        db_role = await self.get_role(role_id)
+        db_role = await self._get_role_for_update(role_id)
         if not db_role:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -58,20 +62,30 @@ class RoleService:
 
         db_role.name = name
         db_role.description = description
+        versions = await self._bump_permission_versions(
+            User.id.in_(select(user_roles_table.c.user_id).where(
+                user_roles_table.c.role_id == role_id))
+        )
         await self.pg_session.commit()
+        await self._publish_permission_versions(versions)
         await self.pg_session.refresh(db_role)
         return db_role
 
     async def delete_role(self, role_id: UUID) -> None:
-        db_role = await self.get_role(role_id)
+        db_role = await self._get_role_for_update(role_id)
         if not db_role:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Role not found."
             )
 
+        versions = await self._bump_permission_versions(
+            User.id.in_(select(user_roles_table.c.user_id).where(
+                user_roles_table.c.role_id == role_id))
+        )
         await self.pg_session.delete(db_role)
         await self.pg_session.commit()
+        await self._publish_permission_versions(versions)
 
     async def assign_role_to_user(self, login: str, role_name: str) -> User:
         user = await self.get_user(login)
@@ -89,7 +103,9 @@ class RoleService:
             )
 
         user.roles.append(role)
+        versions = await self._bump_permission_versions(User.id == user.id)
         await self.pg_session.commit()
+        await self._publish_permission_versions(versions)
         await self.pg_session.refresh(user)
         return user
 
@@ -109,20 +125,50 @@ class RoleService:
             )
 
         user.roles.remove(role)
+        versions = await self._bump_permission_versions(User.id == user.id)
         await self.pg_session.commit()
+        await self._publish_permission_versions(versions)
         await self.pg_session.refresh(user)
         return user
 
     async def get_user(self, login: str) -> Optional[User]:
-        result = await self.pg_session.execute(select(User).filter_by(login=login).options())
-        return result.scalars().first()
+        return await UserRepository(self.pg_session).get_by_login(login)
+
+    async def _get_role_for_update(self, role_id: UUID) -> Optional[Role]:
+        # mutations must read from the primary they are about to write to
+        return await RoleRepository(self.pg_session).get_by_id(role_id)
 
     async def get_role_by_name(self, name: str) -> Optional[Role]:
-        result = await self.pg_session.execute(select(Role).filter_by(name=name))
-        return result.scalars().first()
+        return await RoleRepository(self.pg_session).get_by_name(name)
+
+    async def _bump_permission_versions(self, condition) -> dict:
+        result = await self.pg_session.execute(
+            update(User).where(condition).values(
+                permission_version=User.permission_version + 1
+            ).returning(User.id, User.permission_version)
+            .execution_options(synchronize_session=False)
+        )
+        return {str(user_id): version for user_id, version in result.all()}
+
+    async def _publish_permission_versions(self, versions: dict) -> None:
+        # tokens issued before the bump are rejected by get_principal.
+        # The key only has to outlive those access tokens: a refresh reads
+        # the new version from the database, so once the key lapses there
+        # is no older token left for it to turn down
+        await self.redis.put_many(
+            {f'perm_version:{user_id}': str(version)
+             for user_id, version in versions.items()},
+            max(settings.access_token_lifetime,
+                settings.refresh_token_lifetime)
+        )
+        revocations = get_revocations()
+        if revocations:
+            await revocations.publish_permission_versions(versions)
 
 
 async def get_role_service(
-    pg_session: AsyncSession = Depends(get_session)
+    pg_session: AsyncSession = Depends(get_session),
+    redis: RedisCache = Depends(RedisCache),
+    pg_read_session: AsyncSession = Depends(get_read_session)
 ) -> RoleService:
-    return RoleService(pg_session)
+    return RoleService(pg_session, redis, pg_read_session)
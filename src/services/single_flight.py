@@ -0,0 +1,44 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        while key in self._calls:
+            future = self._calls[key]
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # the leader was cancelled (its client went away), not this
+                # caller: run the load again, possibly as the new leader
+                if not future.cancelled() \
+                        or asyncio.current_task().cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # mark the exception as retrieved when nobody else is waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def is_running(self, key: str) -> bool:
+        return key in self._calls
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -1,115 +1,246 @@
+import base64
 import datetime
 import logging
+import secrets
+import time
 import uuid
 
 from dataclasses import dataclass
 from functools import lru_cache
 from http import HTTPStatus
+from typing import Optional
 
 from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordBearer
 
-from jose import jwt, JWTError
+from jose import ExpiredSignatureError, JWTError
 from fastapi import Depends, HTTPException
-from sqlalchemy import select, desc
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from werkzeug.security import check_password_hash
 
 from db.cache import Cache
-from db.postgres import get_session
+from db.postgres import get_read_session, get_session
 from db.redis.redis_cache import RedisCache
-from models.user import User, UserLogin
+from db.repositories.logins import UserLoginRepository
+from db.repositories.refresh_tokens import RefreshTokenRepository
+from db.repositories.socials import UserSocialRepository
+from db.repositories.users import UserRepository
+from models.principal import Principal
+from models.user import Continent, User, UserLogin, UserSocial
 
 from core.config import settings
+from core.metrics import observe
 
-from models.refresh_token import RefreshToken
+from services.jwt_keys import get_key_store
+from services.login_events import LoginEventWriter, get_login_events
+from services.password_hasher import PasswordHasher, get_password_hasher
+from services.principal_cache import get_token_key, principal_cache
+from services.revocation import get_revocations
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_CLAIMS_VERSION = 1
+
 
 @dataclass
 class UserService:
     pg_session: AsyncSession
     redis: Cache
+    hasher: PasswordHasher
+    pg_read_session: AsyncSession
+    login_events: Optional[LoginEventWriter] = None
 
     async def check_user(self, user_data) -> ORJSONResponse:
-        result = await self.pg_session.execute(
-            select(User).options(selectinload(User.roles)).filter_by(
-                login=user_data.login
-            )
+        user = await UserRepository(self.pg_session).get_by_login(
+            user_data.login, with_roles=True
         )
-        user = None
-        if result:
-            user = result.scalars().first()
 
-        if user and check_password_hash(
+        if user and await self.hasher.verify(
                 user.password,
                 user_data.password
         ):
-            self.pg_session.add(UserLogin(user_id=user.id))
-            await self.pg_session.commit()
+            if self.hasher.needs_rehash(user.password):
+                user.password = await self.hasher.hash(user_data.password)
+            if self.login_events:
+                self.login_events.record(user.id)
+            else:
+                self.pg_session.add(UserLogin(user_id=user.id))
             token_pair = await self.get_token_pair(user)
+            await self.pg_session.commit()
             return token_pair
 
-    async def save_refresh_token(self, token: str, user) -> None:
-        refresh_token = RefreshToken(
-            token=token,
-            user_id=user.id,
-            expires_at=(datetime.datetime.now()
-                        + datetime.timedelta(
-                        minutes=settings.refresh_token_lifetime
-                    )))
-        self.pg_session.add(refresh_token)
+    async def social_login(
+            self, provider: str, user_info: dict
+    ) -> ORJSONResponse:
+        provider_user_id = str(user_info['id'])
+        users = UserRepository(self.pg_session)
+        social = await UserSocialRepository(
+            self.pg_session
+        ).get_by_provider_user(provider, provider_user_id)
+        if social:
+            user = await users.get_by_id(social.user_id, with_roles=True)
+        else:
+            login = user_info.get('login') or user_info.get('default_email')
+            if not login or await users.get_continent(login):
+                login = f'{provider}_{provider_user_id}'
+            # social accounts sign in through the provider only
+            user = User(
+                login=login,
+                password_hash=await self.hasher.hash(secrets.token_urlsafe(32)),
+                first_name=user_info.get('first_name', ''),
+                last_name=user_info.get('last_name', '')
+            )
+            user.id = uuid.uuid4()
+            user.continent = Continent.EUROPE.value
+            user.roles = []
+            self.pg_session.add(user)
+            self.pg_session.add(UserSocial(user.id, provider, provider_user_id))
+
+        if self.login_events:
+            self.login_events.record(user.id, provider)
+        else:
+            self.pg_session.add(UserLogin(user_id=user.id, signin_data=provider))
+        token_pair = await self.get_token_pair(user)
+        await self.pg_session.commit()
+        return token_pair
+
+    async def save_refresh_token(
+            self, token: str, user, family_id: uuid.UUID, jti: str
+    ) -> None:
+        RefreshTokenRepository(self.pg_session).add(
+            self._get_token_key(token),
+            user.id,
+            family_id,
+            datetime.datetime.now() + datetime.timedelta(
+                seconds=settings.refresh_token_lifetime
+            ),
+            jti
+        )
 
     async def login_history(
-            self, login: str, page_number: int, page_size: int
-    ) -> list[UserLogin]:
-        result = await self.pg_session.execute(
-            select(User).filter_by(login=login)
-        )
-        if not result:
-            return []
-        user = result.scalars().first()
-        result = await self.pg_session.execute(
-            select(UserLogin).filter_by(user_id=user.id).order_by(
-                desc(UserLogin.login_at)
-            ).offset((page_number - 1) * page_size).limit(page_size)
+            self, login: str, page_size: int, cursor: Optional[str] = None,
+            page_number: int = 1
+    ) -> tuple[list[UserLogin], Optional[str]]:
+        before = self._decode_login_cursor(cursor) if cursor else None
+        user = await UserRepository(self.pg_read_session).get_by_login(login)
+        if user is None:
+            return [], None
+        offset = 0 if before else (page_number - 1) * page_size
+        logins = await UserLoginRepository(self.pg_read_session).get_page(
+            user.id, page_size, before, offset
         )
-        return list(result.scalars().all())
+        next_cursor = None
+        if len(logins) == page_size:
+            next_cursor = self._encode_login_cursor(logins[-1])
+        return logins, next_cursor
+
+    @staticmethod
+    def _encode_login_cursor(user_login: UserLogin) -> str:
+        state = f'{user_login.login_at.isoformat()}|{user_login.id}'
+        return base64.urlsafe_b64encode(state.encode()).decode()
+
+    @staticmethod
+    def _decode_login_cursor(
+            cursor: str
+    ) -> tuple[datetime.datetime, uuid.UUID]:
+        try:
+            login_at, _, login_id = base64.urlsafe_b64decode(
+                cursor.encode()
+            ).decode().partition('|')
+            return (datetime.datetime.fromisoformat(login_at),
+                    uuid.UUID(login_id))
+        except ValueError:
+            raise ValueError('Invalid cursor')
 
     async def logout(self, token: str) -> ORJSONResponse:
         try:
             payload = await self.decode_token_jwt(token)
-            jti = payload.get('jti')
-
-            await self.redis.put(f'token:{jti}', token, settings.access_token_lifetime)
+            await self.revoke_access_token(payload.get('jti'), token)
+            await principal_cache.delete(self._get_token_key(token))
 
             return ORJSONResponse({'logout': 'Successfully!'}, status_code=HTTPStatus.OK)
 
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR, detail=str(e))
 
+    async def revoke_access_token(self, jti: str, token: str = '1') -> None:
+        await self.redis.put(f'token:{jti}', token, settings.access_token_lifetime)
+        revocations = get_revocations()
+        if revocations:
+            await revocations.publish_revocation(jti)
+
     async def decode_access_token(self, token: str) -> ORJSONResponse:
         data = await self.decode_token_jwt(token)
         return ORJSONResponse(data, status_code=HTTPStatus.OK)
 
+    async def logout_all(self, token: str) -> ORJSONResponse:
+        principal = await self.get_principal(token)
+        await RefreshTokenRepository(self.pg_session).revoke_user(
+            uuid.UUID(principal.id)
+        )
+        await self.pg_session.commit()
+        return await self.logout(token)
+
     async def decode_refresh_token(self, refresh_token: str) -> ORJSONResponse:
-        data = await self.decode_token_jwt(refresh_token)
-        user = data.get('user')
+        try:
+            payload = get_key_store().decode(refresh_token)
+        except JWTError:
+            raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail='Invalid token!')
+
+        tokens = RefreshTokenRepository(self.pg_session)
+        token_hash = self._get_token_key(refresh_token)
+        stored = await tokens.consume(token_hash, datetime.datetime.now())
+        if stored is None:
+            reused = await tokens.get_by_hash(token_hash)
+            if reused and reused.used_at:
+                # a rotated token came back, so someone else holds a copy:
+                # revoke every token descended from the same signin, the
+                # access tokens issued with them included
+                logger.warning('Refresh token reuse detected for user %s',
+                               reused.user_id)
+                jtis = await tokens.revoke_family(reused.family_id)
+                await self.pg_session.commit()
+                for jti in jtis:
+                    await self.revoke_access_token(jti)
+            raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail='Invalid token!')
+
+        user = await UserRepository(self.pg_session).get_by_login(
+            payload.get('user'), with_roles=True,
+            continent=payload.get('continent')
+        )
+        if user is None or user.id != stored.user_id:
+            await self.pg_session.rollback()
+            raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail='Invalid token!')
 
-        if user:
-            token_pair = await self.get_token_pair(user)
-            return token_pair
+        token_pair = await self.get_token_pair(user, stored.family_id)
+        await self.pg_session.commit()
+        return token_pair
 
-    async def get_token_pair(self, user):
+    async def get_token_pair(self, user, family_id: uuid.UUID = None):
         data = {
+            'sub': str(user.id),
             'user': user.login,
-            'roles': user.roles,
+            'continent': user.continent,
+            'roles': [role.name for role in user.roles],
             'jti': str(uuid.uuid4())
         }
+        # only access tokens authenticate requests; a refresh token is
+        # turned down by get_principal even though it is signed the same way
+        access_data = dict(data, typ='access')
+        data['typ'] = 'refresh'
+        if settings.token_format == 'principal':
+            access_data['pr'] = {
+                'v': PRINCIPAL_CLAIMS_VERSION,
+                'sub': str(user.id),
+                'rol': data['roles'],
+                'su': bool(user.is_superuser),
+                'pv': user.permission_version or 0,
+            }
         access_token = self._get_token(
-            data,
+            access_data,
             settings.access_token_lifetime
         )
         refresh_token = self._get_token(
@@ -117,29 +248,146 @@ class UserService:
             settings.refresh_token_lifetime
         )
 
-        await self.save_refresh_token(refresh_token, user)
+        await self.save_refresh_token(
+            refresh_token, user, family_id or uuid.uuid4(), data['jti']
+        )
 
         return ORJSONResponse({
             'token': access_token,
             'refresh_token': refresh_token,
         }, HTTPStatus.OK)
 
+    async def get_principal(self, token: str) -> Principal:
+        with observe('auth', 'get_principal') as operation:
+            return await self._get_principal(token, operation)
+
+    async def _get_principal(self, token: str, operation) -> Principal:
+        key = self._get_token_key(token)
+        data = await principal_cache.get(key)
+        operation.set('result', 'hit' if data else 'miss')
+        if data:
+            principal = Principal.parse_raw(data)
+        else:
+            principal = await self._decode_principal(token)
+        # an entry lives exactly as long as its token, a hit is checked
+        # all the same
+        ttl = (self._parse_expire(principal.expire)
+               - datetime.datetime.now()).total_seconds()
+        if ttl <= 0:
+            await principal_cache.delete(key)
+            raise HTTPException(
+                status_code=HTTPStatus.UNAUTHORIZED,
+                detail='Token expired!'
+            )
+        if not data:
+            await principal_cache.put(key, principal.json(), ttl)
+
+        revocations = get_revocations()
+        if revocations:
+            # only a possible Bloom filter hit needs a Redis round trip
+            revoked = (revocations.might_be_revoked(principal.jti)
+                       and await self.redis.get(f'token:{principal.jti}'))
+            permission_version = revocations.permission_version(principal.id)
+        else:
+            revoked, permission_version = await self.redis.get_many([
+                f'token:{principal.jti}', f'perm_version:{principal.id}'
+            ])
+        if revoked or (permission_version is not None
+                       and int(permission_version)
+                       > principal.permission_version):
+            await principal_cache.delete(key)
+            raise HTTPException(
+                status_code=HTTPStatus.UNAUTHORIZED,
+                detail='Token has been invalidated!'
+            )
+        return principal
+
+    async def _decode_principal(self, token: str) -> Principal:
+        try:
+            payload = get_key_store().decode(token)
+            if payload.get('typ') != 'access':
+                raise ValueError('Not an access token')
+            if datetime.datetime.now() > self._parse_expire(payload['expire']):
+                raise HTTPException(
+                    status_code=HTTPStatus.UNAUTHORIZED,
+                    detail='Token expired!'
+                )
+            claims = payload.get('pr')
+            if claims:
+                if claims.get('v') != PRINCIPAL_CLAIMS_VERSION:
+                    raise ValueError('Unsupported principal claims version')
+                return Principal(
+                    id=claims['sub'],
+                    login=payload['user'],
+                    is_superuser=claims['su'],
+                    roles=claims['rol'],
+                    permission_version=claims['pv'],
+                    jti=payload['jti'],
+                    expire=payload['expire']
+                )
+        except ExpiredSignatureError:
+            raise HTTPException(
+                status_code=HTTPStatus.UNAUTHORIZED,
+                detail='Token expired!'
+            )
+        except (JWTError, KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail='Invalid token!')
+
+        user = await self._get_user(
+            payload.get('user'), payload.get('continent')
+        )
+        return Principal(
+            id=str(user.id),
+            login=user.login,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            is_superuser=bool(user.is_superuser),
+            roles=[role.name for role in user.roles],
+            permission_version=user.permission_version or 0,
+            jti=payload.get('jti'),
+            expire=payload.get('expire')
+        )
+
+    async def _get_user(
+            self, login: str, continent: Optional[str] = None
+    ) -> User:
+        # tokens issued before the continent claim fall back to the lookup
+        with observe('postgres', 'get_user',
+                     continent_claim=continent is not None) as operation:
+            user = await UserRepository(self.pg_read_session).get_by_login(
+                login, with_roles=True, continent=continent
+            )
+            operation.set('result', 'hit' if user else 'miss')
+        if user is None:
+            raise HTTPException(
+                status_code=HTTPStatus.UNAUTHORIZED,
+                detail='User not found'
+            )
+        return user
+
     async def decode_token_jwt(self, token: str):
+        with observe('auth', 'decode_token_jwt'):
+            return await self._decode_token_jwt(token)
+
+    async def _decode_token_jwt(self, token: str):
         try:
-            payload = jwt.decode(token, settings.secret_key, algorithms=settings.algorithm)
-            expire = datetime.datetime.strptime(payload.get('expire'), "%Y-%m-%d %H:%M:%S.%f")
+            try:
+                payload = get_key_store().decode(token)
+            except ExpiredSignatureError:
+                logger.debug('TOKEN EXPIRED: current time: %s',
+                             datetime.datetime.now())
+                return {'data': 'token expired!'}
+            expire = self._parse_expire(payload.get('expire'))
             token_in_storage = await self.redis.get(f'token:{payload.get("jti")}')
 
             if datetime.datetime.now() > expire or token_in_storage:
-                logging.debug(
-                    f'TOKEN EXPIRED: current time: {datetime.datetime.now()},'
-                    f' expired: {expire}'
-                )
+                logger.debug('TOKEN EXPIRED: current time: %s, expired: %s',
+                             datetime.datetime.now(), expire)
                 return {'data': 'token expired!'}
 
-            result = await self.pg_session.execute(
-                select(User).filter_by(login=payload.get('user')).options(selectinload(User.roles)))
-            user = result.scalars().first()
+            user = await self._get_user(
+                payload.get('user'), payload.get('continent')
+            )
 
             return {
                 'user': payload.get('user'),
@@ -153,8 +401,16 @@ class UserService:
                 'jti': payload.get('jti')
             }
 
-        except JWTError:
-            HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail='Invalid token!')
+        except (JWTError, TypeError, ValueError):
+            raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail='Invalid token!')
+
+    @staticmethod
+    def _get_token_key(token: str) -> str:
+        return get_token_key(token)
+
+    @staticmethod
+    def _parse_expire(expire: str) -> datetime.datetime:
+        return datetime.datetime.fromisoformat(expire)
 
     @staticmethod
     def _get_token(data, lifetime):
@@ -162,12 +418,12 @@ class UserService:
             seconds=lifetime
         )
         data['expire'] = str(expire)
+        # registered claims, so that services verifying through the JWKS
+        # enforce the lifetime as well
+        data['iat'] = int(time.time())
+        data['exp'] = data['iat'] + lifetime
 
-        token = jwt.encode(
-            data,
-            settings.secret_key,
-            settings.algorithm
-        )
+        token = get_key_store().encode(data)
 
         return token
 
@@ -175,29 +431,17 @@ class UserService:
 @lru_cache()
 def get_user_service(
         pg_session: AsyncSession = Depends(get_session),
-        redis: RedisCache = Depends(RedisCache)
+        redis: RedisCache = Depends(RedisCache),
+        hasher: PasswordHasher = Depends(get_password_hasher),
+        pg_read_session: AsyncSession = Depends(get_read_session),
+        login_events: Optional[LoginEventWriter] = Depends(get_login_events)
 ) -> UserService:
-    return UserService(pg_session, redis)
+    return UserService(pg_session, redis, hasher, pg_read_session,
+                       login_events)
 
 
 async def get_current_user(
         token: str = Depends(oauth2_scheme),
-        session: AsyncSession = Depends(get_session),
         user_service = Depends(get_user_service)
-) -> User:
-    try:
-        data = await user_service.decode_token_jwt(token)
-
-        user_login = data.get('user')
-        if user_login is None:
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-
-        result = await session.execute(select(User).filter_by(login=user_login))
-        user = result.scalars().first()
-
-        if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
-
-        return user
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+) -> Principal:
+    return await user_service.get_principal(token)
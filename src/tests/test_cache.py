@@ -0,0 +1,90 @@
+from typing import Optional
+
+import pytest
+
+from db.cache import Cache
+from db.memory import lru_cache
+from db.memory.lru_cache import LRUCache
+from db.memory.tiered_cache import TieredCache
+
+
+class DictCache(Cache):
+
+    def __init__(self):
+        self.items: dict[str, str] = {}
+        self.gets = 0
+
+    async def get(self, key) -> Optional[str]:
+        self.gets += 1
+        return self.items.get(key)
+
+    async def put(self, key, val: str, timeout: int):
+        self.items[key] = val
+
+    async def get_many(self, keys: list) -> list[Optional[str]]:
+        self.gets += len(keys)
+        return [self.items.get(key) for key in keys]
+
+    async def delete(self, key):
+        self.items.pop(key, None)
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def now(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(lru_cache.time, 'monotonic', lambda: clock[0])
+    return clock
+
+
+@pytest.mark.asyncio
+async def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2, 60)
+    await cache.put('a', '1', 60)
+    await cache.put('b', '2', 60)
+    await cache.get('a')
+    await cache.put('c', '3', 60)
+
+    assert await cache.get_many(['a', 'b', 'c']) == ['1', None, '3']
+    assert cache.stats()['evictions'] == 1
+
+
+@pytest.mark.asyncio
+async def test_lru_expires_after_the_shorter_ttl(now):
+    cache = LRUCache(10, 5)
+    await cache.put('capped', '1', 60)
+    await cache.put('short', '2', 2)
+
+    now[0] += 2
+    assert await cache.get('short') is None
+    assert await cache.get('capped') == '1'
+    now[0] += 3
+    assert await cache.get('capped') is None
+
+
+@pytest.mark.asyncio
+async def test_tiered_promotes_remote_hits_to_local():
+    remote = DictCache()
+    remote.items = {'a': '1', 'b': '2'}
+    cache = TieredCache(LRUCache(10, 60), remote)
+
+    assert await cache.get('a') == '1'
+    assert await cache.get_many(['a', 'b', 'c']) == ['1', '2', None]
+    assert remote.gets == 3
+
+    assert await cache.get_many(['a', 'b']) == ['1', '2']
+    assert remote.gets == 3
+
+
+@pytest.mark.asyncio
+async def test_tiered_delete_clears_both_tiers():
+    remote = DictCache()
+    cache = TieredCache(LRUCache(10, 60), remote)
+    await cache.put('a', '1', 60)
+
+    await cache.delete('a')
+
+    assert await cache.local.get('a') is None
+    assert await cache.get('a') is None
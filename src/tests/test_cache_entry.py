@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from db import cache_entry
+from db.cache_entry import CacheEntry, jittered
+from db.memory.lru_cache import LRUCache
+from services import base
+from services.base import BaseService
+
+
+@pytest.fixture
+def now(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(cache_entry.time, 'time', lambda: clock[0])
+    return clock
+
+
+def test_entry_round_trips_through_dumps(now):
+    entry = CacheEntry.create('{"id": "a|b"}', 5, 60)
+
+    assert CacheEntry.loads(entry.dumps()) == entry
+    assert CacheEntry.loads(entry.dumps().encode()) == entry
+
+
+@pytest.mark.parametrize('data', ['{"id": 1}', 'v0|1|2|{}', 'v1|1|2'])
+def test_foreign_values_are_not_entries(data):
+    assert CacheEntry.loads(data) is None
+
+
+def test_entry_is_stale_after_soft_and_gone_after_hard_expiry(now):
+    data = CacheEntry.create('payload', 5, 60).dumps()
+
+    assert not CacheEntry.loads(data).is_stale()
+    now[0] += 5
+    assert CacheEntry.loads(data).is_stale()
+    now[0] += 55
+    assert CacheEntry.loads(data) is None
+
+
+def test_jittered_stays_within_bounds():
+    values = [jittered(100, 0.1) for _ in range(1000)]
+
+    assert all(90 <= value <= 110 for value in values)
+    assert len(set(values)) > 1
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_served_while_refreshing(now):
+    service = BaseService(LRUCache(10, 60), None, 'genres')
+    await service.cache.put(
+        'key', CacheEntry.create('old', 5, 60).dumps(), 60
+    )
+    refreshed = asyncio.Event()
+
+    async def refresh():
+        refreshed.set()
+
+    assert await service._get_from_cache('key', refresh) == 'old'
+    assert not base.refresh_tasks
+
+    now[0] += 5
+    assert await service._get_from_cache('key', refresh) == 'old'
+    await asyncio.wait_for(refreshed.wait(), 1)
@@ -0,0 +1,133 @@
+import pytest
+from pydantic import ValidationError
+
+from api.v1.films import FilmIds
+from db.elastic.EsStorage import EsStorage
+from db.memory.lru_cache import LRUCache
+from models.film import Film, FilmShort
+from services.film import FilmService
+
+
+def film(film_id: str) -> dict:
+    return {'id': film_id, 'title': f'film {film_id}', 'description': None,
+            'imdb_rating': 7.5, 'genres': [], 'directors': [], 'actors': [],
+            'writers': []}
+
+
+class MgetElastic:
+    # stands in for AsyncElasticsearch: mget over a fixed set of films
+
+    def __init__(self, *film_ids: str):
+        self.films = {film_id: film(film_id) for film_id in film_ids}
+        self.requested = []
+
+    async def mget(self, index, ids):
+        self.requested.append(list(ids))
+        return {'docs': [
+            {'_id': film_id, 'found': True, '_source': self.films[film_id]}
+            if film_id in self.films else {'_id': film_id, 'found': False}
+            for film_id in ids
+        ]}
+
+
+class RecordingCache(LRUCache):
+
+    def __init__(self):
+        super().__init__(100, 60)
+        self.get_many_calls = []
+        self.put_many_calls = []
+
+    async def get_many(self, keys: list):
+        self.get_many_calls.append(list(keys))
+        return await super().get_many(keys)
+
+    async def put_many(self, items: dict, timeout: int):
+        self.put_many_calls.append(sorted(items))
+        await super().put_many(items, timeout)
+
+
+def make_service(*film_ids: str) -> FilmService:
+    storage = EsStorage()
+    storage.es = MgetElastic(*film_ids)
+    return FilmService(RecordingCache(), storage)
+
+
+@pytest.mark.asyncio
+async def test_cache_misses_are_fetched_in_one_mget_and_back_filled():
+    service = make_service('a', 'b', 'c')
+    await service._put_item_to_cache(service._get_class()(**film('b')))
+
+    films = await service.get_many(['c', 'b', 'a'])
+
+    assert [item.id for item in films] == ['c', 'b', 'a']
+    assert service.cache.get_many_calls == [
+        ['movies:c', 'movies:b', 'movies:a']
+    ]
+    assert service.storage.es.requested == [['c', 'a']]
+    assert service.cache.put_many_calls == [['movies:a', 'movies:c']]
+
+    assert [item.id for item in await service.get_many(['a', 'c'])] \
+        == ['a', 'c']
+    assert service.storage.es.requested == [['c', 'a']]
+
+
+@pytest.mark.asyncio
+async def test_duplicates_are_fetched_once_and_unknown_ids_dropped():
+    service = make_service('a', 'b')
+
+    films = await service.get_many(['b', 'missing', 'a', 'b'])
+
+    assert [item.id for item in films] == ['b', 'a']
+    assert service.storage.es.requested == [['b', 'missing', 'a']]
+    assert service.cache.put_many_calls == [['movies:a', 'movies:b']]
+
+
+@pytest.mark.parametrize('ids, valid', [
+    ([], False),
+    (['a'], True),
+    ([str(i) for i in range(100)], True),
+    ([str(i) for i in range(101)], False),
+])
+def test_batch_accepts_one_to_a_hundred_ids(ids, valid):
+    if valid:
+        assert FilmIds(ids=ids).ids == ids
+    else:
+        with pytest.raises(ValidationError):
+            FilmIds(ids=ids)
+
+
+class ProjectingStorage:
+    # returns only the requested fields, the way source_includes does
+
+    def __init__(self):
+        self.calls = []
+
+    async def get_films(self, page_number, page_size, sort=None, order=None,
+                        query=None, fields=None):
+        self.calls.append(fields)
+        if fields:
+            return [FilmShort(**{name: film('a')[name] for name in fields})]
+        return [Film(**film('a'))]
+
+    async def get_film(self, film_id):
+        self.calls.append(film_id)
+        return Film(**film(film_id))
+
+
+@pytest.mark.asyncio
+async def test_short_and_full_pages_are_cached_apart():
+    service = FilmService(LRUCache(100, 60), ProjectingStorage())
+    page = {'page_number': 0, 'page_size': 2, 'sort': '', 'order': ''}
+
+    short = await service.get_items(short=True, **page)
+    full = await service.get_items(**page)
+    assert await service.get_items(short=True, **page) == short
+    assert await service.get_items(**page) == full
+
+    assert type(short[0]) is FilmShort
+    assert type(full[0]) is Film
+    assert service.storage.calls == [['id', 'title'], None]
+
+    detail = await service.get_by_id('a')
+    assert type(detail) is Film
+    assert service.storage.calls[-1] == 'a'
@@ -0,0 +1,109 @@
+import base64
+import json
+
+import pytest
+from elasticsearch import BadRequestError
+
+from core.config import settings
+from db.elastic.EsStorage import EsStorage
+from db.films_storage import CursorLimitExceeded
+
+
+class PagingElastic:
+    # stands in for AsyncElasticsearch: one index of ``total`` genres
+
+    def __init__(self, total: int):
+        self.total = total
+        self.pits = 0
+        self.closed = []
+
+    async def open_point_in_time(self, index, keep_alive):
+        self.pits += 1
+        return {'id': f'pit-{self.pits}'}
+
+    async def search(self, pit, size, sort, search_after, query,
+                     source_includes=None):
+        start = search_after[0] + 1 if search_after else 0
+        hits = [{'_source': {'id': str(i), 'title': f'genre {i}'},
+                 'sort': [i]}
+                for i in range(start, min(start + size, self.total))]
+        return {'hits': {'hits': hits}, 'pit_id': pit['id']}
+
+    async def close_point_in_time(self, id):
+        self.closed.append(id)
+
+
+def encode(state) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+
+@pytest.mark.parametrize('state', [
+    {'pit': 'p'},
+    {'pit': 'p', 'index': 'genres', 'sort': [{'_shard_doc': 'asc'}],
+     'query': None},
+    {'pit': 'p', 'index': 'movies', 'sort': [{'_shard_doc': 'asc'}],
+     'query': None, 'after': [1]},
+    {'pit': 'p', 'index': 'genres', 'sort': [{'_script': {'order': 'asc'}}],
+     'query': None, 'after': [1]},
+    {'pit': 'p', 'index': 'genres',
+     'sort': [{'title': {'order': 'asc'}}, {'_shard_doc': 'asc'}],
+     'query': None, 'after': [1]},
+    ['not', 'a', 'dict'],
+])
+def test_malformed_cursor_is_rejected(state):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        EsStorage.__decode_cursor__(encode(state), 'genres')
+
+
+@pytest.mark.asyncio
+async def test_open_pits_are_capped_and_released(monkeypatch):
+    monkeypatch.setattr(settings, 'es_max_open_pits', 1)
+    storage = EsStorage()
+    storage.es = PagingElastic(total=3)
+
+    items, cursor = await storage.get_genres_after(page_size=2, cursor='')
+    assert [genre.id for genre in items] == ['0', '1']
+    with pytest.raises(CursorLimitExceeded):
+        await storage.get_genres_after(page_size=2, cursor='')
+
+    items, cursor = await storage.get_genres_after(page_size=2,
+                                                   cursor=cursor)
+    assert [genre.id for genre in items] == ['2']
+    assert cursor is None
+    assert storage.es.closed == ['pit-1']
+    assert storage.open_pits == {}
+    await storage.get_genres_after(page_size=2, cursor='')
+
+
+class FailingElastic(PagingElastic):
+
+    async def search(self, *args, **kwargs):
+        raise BadRequestError('parse_exception', None, {})
+
+
+@pytest.mark.asyncio
+async def test_failed_first_page_releases_its_pit():
+    storage = EsStorage()
+    storage.es = FailingElastic(total=3)
+
+    with pytest.raises(ValueError, match='Invalid query'):
+        await storage.get_genres_after(page_size=2, cursor='', query='a:(')
+
+    assert storage.es.closed == ['pit-1']
+    assert storage.open_pits == {}
+
+
+@pytest.mark.asyncio
+async def test_walk_sorts_only_on_allowed_fields():
+    storage = EsStorage()
+    storage.es = PagingElastic(total=3)
+
+    with pytest.raises(ValueError, match='Cannot sort by title'):
+        await storage.get_genres_after(page_size=2, cursor='', sort='title')
+    assert storage.es.pits == 0
+
+    items, cursor = await storage.get_genres_after(page_size=2, cursor='',
+                                                   sort='rating')
+    assert EsStorage.__decode_cursor__(cursor, 'genres')['sort'][0] == {
+        'rating': {'order': 'asc'}
+    }
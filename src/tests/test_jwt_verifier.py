@@ -0,0 +1,123 @@
+import datetime
+import time
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI
+from jose import JWTError
+
+from api import jwks
+from services.jwt_keys import KeyStore, get_key_store
+from services.jwt_verifier import JWKSVerifier
+
+JWKS_URL = 'http://auth/.well-known/jwks.json'
+
+
+def private_pem() -> str:
+    private_key = rsa.generate_private_key(public_exponent=65537,
+                                           key_size=2048)
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+
+
+@pytest.fixture
+def key_store(tmp_path) -> KeyStore:
+    (tmp_path / 'key-1.pem').write_text(private_pem())
+    return KeyStore('RS256', 'unused', keys_dir=str(tmp_path))
+
+
+def make_verifier(key_store: KeyStore, fail: bool = False) -> JWKSVerifier:
+    def jwks(request: httpx.Request) -> httpx.Response:
+        if fail:
+            return httpx.Response(503)
+        return httpx.Response(200, json=key_store.jwks())
+
+    return JWKSVerifier(JWKS_URL, ['RS256'],
+                        transport=httpx.MockTransport(jwks))
+
+
+def make_token(key_store: KeyStore, lifetime: int, **claims) -> str:
+    expire = datetime.datetime.now() + datetime.timedelta(seconds=lifetime)
+    return key_store.encode({'user': 'someone', 'expire': str(expire),
+                             **claims})
+
+
+@pytest.mark.asyncio
+async def test_valid_token_is_accepted(key_store):
+    token = make_token(key_store, 60, exp=int(time.time()) + 60)
+
+    claims = await make_verifier(key_store).verify(token)
+
+    assert claims['user'] == 'someone'
+
+
+@pytest.mark.asyncio
+async def test_expired_token_is_rejected(key_store):
+    verifier = make_verifier(key_store)
+
+    with pytest.raises(JWTError):
+        await verifier.verify(
+            make_token(key_store, -60, exp=int(time.time()) - 60)
+        )
+    # tokens minted before exp was added are checked against expire
+    with pytest.raises(JWTError):
+        await verifier.verify(make_token(key_store, -60))
+
+
+@pytest.mark.asyncio
+async def test_unknown_kid_is_rejected(key_store):
+    token = make_token(key_store, 60, exp=int(time.time()) + 60)
+    key_store.public_keys = {
+        'key-2': dict(key_store.public_keys['key-1'], kid='key-2')
+    }
+
+    with pytest.raises(JWTError, match='Unknown signing key'):
+        await make_verifier(key_store).verify(token)
+
+
+@pytest.mark.asyncio
+async def test_failed_jwks_fetch_raises_jwt_error(key_store):
+    token = make_token(key_store, 60, exp=int(time.time()) + 60)
+
+    with pytest.raises(JWTError, match='Failed to fetch JWKS'):
+        await make_verifier(key_store, fail=True).verify(token)
+
+
+def test_etag_changes_with_key_material_under_the_same_kid(key_store):
+    etag = key_store.jwks_etag()
+    assert key_store.jwks_etag() == etag
+
+    key_store.add_key('key-1', private_pem())
+
+    assert key_store.jwks_etag() != etag
+
+
+@pytest.mark.asyncio
+async def test_jwks_answers_304_for_a_matching_etag(key_store):
+    app = FastAPI()
+    app.include_router(jwks.router, prefix='/.well-known')
+    app.dependency_overrides[get_key_store] = lambda: key_store
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url='http://auth') as client:
+        response = await client.get('/.well-known/jwks.json')
+        assert response.status_code == 200
+        assert response.json() == key_store.jwks()
+        etag = response.headers['ETag']
+
+        cached = await client.get('/.well-known/jwks.json',
+                                  headers={'If-None-Match': etag})
+        assert cached.status_code == 304
+        assert cached.headers['ETag'] == etag
+        assert cached.content == b''
+
+        key_store.add_key('key-1', private_pem())
+        rotated = await client.get('/.well-known/jwks.json',
+                                   headers={'If-None-Match': etag})
+        assert rotated.status_code == 200
+        assert rotated.headers['ETag'] != etag
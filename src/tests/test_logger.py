@@ -0,0 +1,19 @@
+import logging
+
+from core.logger import SamplingFilter
+
+
+def make_record(name: str, level: int) -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, 1, 'message', None, None)
+
+
+def test_debug_records_are_sampled_per_logger():
+    sampling = SamplingFilter({'services.users': 0, 'services': 1})
+
+    assert not sampling.filter(make_record('services.users', logging.DEBUG))
+    assert not sampling.filter(
+        make_record('services.users.tokens', logging.DEBUG)
+    )
+    assert sampling.filter(make_record('services.users', logging.WARNING))
+    assert sampling.filter(make_record('services.roles', logging.DEBUG))
+    assert sampling.filter(make_record('db', logging.DEBUG))
@@ -0,0 +1,32 @@
+import asyncio
+import uuid
+
+import pytest
+
+from core.config import settings
+from services.login_events import LoginEventWriter
+
+
+@pytest.mark.asyncio
+async def test_stop_writes_the_batch_being_collected(monkeypatch):
+    monkeypatch.setattr(settings, 'login_events_flush_interval_seconds', 60)
+    writer = LoginEventWriter(engine=None)
+    written = []
+
+    async def write(batch):
+        written.extend(batch)
+
+    writer._write = write
+    writer._tasks = [asyncio.create_task(writer._run())]
+    for _ in range(3):
+        writer.record(uuid.uuid4())
+    await asyncio.sleep(0.01)
+    # the events now sit in the run loop's batch, not in the queue
+    assert writer.queue.empty()
+    writer.record(uuid.uuid4())
+
+    await writer.stop()
+
+    assert len(written) == 4
+    # no signin data is stored as NULL
+    assert {event[2] for event in written} == {None}
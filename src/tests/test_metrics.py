@@ -0,0 +1,20 @@
+from core import metrics
+
+
+def test_component_stats_are_flattened_into_gauges():
+    metrics.register_stats('rate_limiter', lambda: {
+        'keys': 2, 'decisions': {'signin:limited': 1}
+    })
+    metrics.register_stats('login_events', lambda: None)
+    try:
+        observations = {
+            (o.attributes['component'], o.attributes['stat']): o.value
+            for o in metrics.observe_stats(None)
+        }
+    finally:
+        metrics.stats_sources.clear()
+
+    assert observations == {
+        ('rate_limiter', 'keys'): 2,
+        ('rate_limiter', 'decisions.signin:limited'): 1,
+    }
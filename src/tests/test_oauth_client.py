@@ -0,0 +1,233 @@
+import asyncio
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+
+from api.v1 import oauth
+from core.config import settings
+from services.oauth import http_client
+from services.oauth.base_oauth import OIDCOAuth
+from services.oauth.http_client import OAuthHTTPClient
+from services.oauth.oauth_service import (
+    ProviderRegistry, get_provider_registry
+)
+from services.oauth.state import STATE_COOKIE
+from services.users import get_user_service
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(settings, 'oauth_http_backoff_seconds', 0.001)
+    monkeypatch.setattr(settings, 'oauth_http_retries', 2)
+
+
+@pytest.mark.asyncio
+async def test_user_info_is_retried_on_unavailable(fast_backoff):
+    calls = []
+
+    def provider(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={'id': '1', 'login': 'stub'})
+
+    client = OAuthHTTPClient(transport=httpx.MockTransport(provider))
+    response = await client.request('stub', 'GET', 'http://stub/info')
+    await client.close()
+
+    assert response.json()['login'] == 'stub'
+    assert len(calls) == 3
+    assert client.stats()['retries'] == 2
+
+
+@pytest.mark.asyncio
+async def test_token_exchange_is_not_retried(fast_backoff):
+    calls = []
+
+    def provider(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(503)
+
+    client = OAuthHTTPClient(transport=httpx.MockTransport(provider))
+    with pytest.raises(httpx.HTTPStatusError):
+        await client.request('stub', 'POST', 'http://stub/token',
+                             data={'code': 'once'})
+    await client.close()
+
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_provider_concurrency_is_bounded(monkeypatch):
+    monkeypatch.setattr(settings, 'oauth_http_provider_concurrency', 2)
+    running = 0
+    peak = 0
+
+    async def provider(request: httpx.Request) -> httpx.Response:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return httpx.Response(200, json={})
+
+    client = OAuthHTTPClient(transport=httpx.MockTransport(provider))
+    await asyncio.gather(*(client.request('stub', 'GET', 'http://stub/info')
+                           for _ in range(10)))
+    await client.close()
+
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_provider_metadata_is_fetched_once(monkeypatch):
+    calls = []
+
+    def provider(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path == '/.well-known/openid-configuration':
+            return httpx.Response(200, json={
+                'issuer': 'http://stub',
+                'authorization_endpoint': 'http://stub/authorize',
+                'token_endpoint': 'http://stub/token',
+                'userinfo_endpoint': 'http://stub/userinfo',
+                'jwks_uri': 'http://stub/jwks',
+            })
+        return httpx.Response(200, json={'keys': []})
+
+    monkeypatch.setattr(
+        http_client, 'oauth_http_client',
+        OAuthHTTPClient(transport=httpx.MockTransport(provider))
+    )
+    monkeypatch.setattr(settings, 'oauth_providers', {'stub': {
+        'client_id': 'client',
+        'client_secret': 'secret',
+        'redirect_uri': 'http://testserver/callback/stub',
+        'discovery_url': 'http://stub/.well-known/openid-configuration',
+    }})
+    registry = ProviderRegistry.from_settings()
+    await registry.start()
+    urls = [await registry.get('stub').get_authorization_url()
+            for _ in range(5)]
+    await registry.stop()
+    await http_client.oauth_http_client.close()
+
+    assert all(url.startswith('http://stub/authorize?') for url in urls)
+    assert calls == ['/.well-known/openid-configuration', '/jwks']
+
+
+@pytest.mark.asyncio
+async def test_unreachable_provider_metadata_is_handled(fast_backoff,
+                                                        monkeypatch):
+    def provider(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(503)
+
+    monkeypatch.setattr(
+        http_client, 'oauth_http_client',
+        OAuthHTTPClient(transport=httpx.MockTransport(provider))
+    )
+    monkeypatch.setattr(settings, 'oauth_providers', {'stub': {
+        'client_id': 'client',
+        'client_secret': 'secret',
+        'redirect_uri': 'http://testserver/callback/stub',
+        'discovery_url': 'http://stub/.well-known/openid-configuration',
+    }})
+    oauth_provider = ProviderRegistry.from_settings().get('stub')
+
+    assert await oauth_provider.get_authorization_url() is None
+    assert await oauth_provider.get_token('code') is None
+    assert await oauth_provider.get_user_info({'access_token': 't'}) is None
+    await http_client.oauth_http_client.close()
+
+
+def stub_provider() -> OIDCOAuth:
+    return OIDCOAuth('client', 'secret', 'http://testserver/callback/stub',
+                     name='stub', authorize_url='http://stub/authorize',
+                     token_url='http://stub/token',
+                     userinfo_url='http://stub/userinfo')
+
+
+def stub_transport(userinfo: dict) -> httpx.MockTransport:
+    def provider(request: httpx.Request) -> httpx.Response:
+        if request.url.path == '/token':
+            return httpx.Response(200, json={'access_token': 'at'})
+        return httpx.Response(200, json=userinfo)
+
+    return httpx.MockTransport(provider)
+
+
+@pytest.mark.asyncio
+async def test_oidc_user_info_without_sub_is_rejected(monkeypatch):
+    monkeypatch.setattr(
+        http_client, 'oauth_http_client',
+        OAuthHTTPClient(transport=stub_transport({'email': 'a@b.c'}))
+    )
+    oauth_provider = stub_provider()
+
+    with pytest.raises(ValueError):
+        oauth_provider.parse_user_info({'email': 'a@b.c'})
+    assert await oauth_provider.get_user_info({'access_token': 'at'}) is None
+    await http_client.oauth_http_client.close()
+
+
+class SocialLogins:
+
+    def __init__(self):
+        self.logins = []
+
+    async def social_login(self, provider: str, user_info: dict):
+        self.logins.append((provider, user_info['id']))
+        return ORJSONResponse({'token': 'issued'})
+
+
+@pytest_asyncio.fixture
+async def oauth_app(monkeypatch):
+    monkeypatch.setattr(settings, 'rate_limit_enabled', False)
+    monkeypatch.setattr(
+        http_client, 'oauth_http_client',
+        OAuthHTTPClient(transport=stub_transport({'sub': 'subject-1'}))
+    )
+    registry = ProviderRegistry({'stub': stub_provider()})
+    service = SocialLogins()
+    app = FastAPI()
+    app.include_router(oauth.router)
+    app.dependency_overrides[get_provider_registry] = lambda: registry
+    app.dependency_overrides[get_user_service] = lambda: service
+    app.state.service = service
+    yield app
+    await http_client.oauth_http_client.close()
+
+
+def make_client(app: FastAPI) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                             base_url='http://testserver')
+
+
+@pytest.mark.asyncio
+async def test_callback_requires_the_state_issued_to_this_browser(oauth_app):
+    async with make_client(oauth_app) as browser, \
+            make_client(oauth_app) as other_browser:
+        response = await browser.get('/login/stub')
+        assert response.status_code == 307
+        assert STATE_COOKIE in response.cookies
+        state = parse_qs(urlparse(response.headers['location']).query)[
+            'state'][0]
+
+        # no state, a forged state, or the right state without the cookie
+        for client, params in [
+            (browser, {'code': 'c'}),
+            (browser, {'code': 'c', 'state': 'forged'}),
+            (other_browser, {'code': 'c', 'state': state}),
+        ]:
+            rejected = await client.get('/callback/stub', params=params)
+            assert rejected.status_code == 400
+        assert oauth_app.state.service.logins == []
+
+        accepted = await browser.get('/callback/stub',
+                                     params={'code': 'c', 'state': state})
+        assert accepted.status_code == 200
+        assert oauth_app.state.service.logins == [('stub', 'subject-1')]
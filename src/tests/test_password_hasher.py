@@ -0,0 +1,36 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from db.memory.lru_cache import LRUCache
+from services.password_hasher import PasswordHasher
+
+FAST_METHOD = 'pbkdf2:sha256:1000'
+
+
+def make_hasher(method: str = FAST_METHOD) -> PasswordHasher:
+    return PasswordHasher(method, 1, 2, LRUCache(10, 60), 'secret')
+
+
+@pytest.mark.parametrize('method', ['pbkdf2:sha256', 'scrypt'])
+def test_shorthand_method_does_not_force_rehash(method):
+    hasher = make_hasher(method)
+
+    assert not hasher.needs_rehash(generate_password_hash('pw', method))
+    assert hasher.needs_rehash(generate_password_hash('pw', FAST_METHOD))
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_run_in_the_process_pool():
+    hasher = make_hasher()
+    try:
+        password_hash = await hasher.hash('password')
+
+        assert not hasher.needs_rehash(password_hash)
+        assert await hasher.verify(password_hash, 'password')
+        assert not await hasher.verify(password_hash, 'wrong')
+        # the second successful check is answered from the verify cache
+        assert await hasher.verify(password_hash, 'password')
+        assert hasher.stats()['completed'] == 3
+        assert hasher._executor._mp_context.get_start_method() == 'spawn'
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,129 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from sqlalchemy.util import greenlet_spawn
+
+from db import postgres
+from db.postgres import InstrumentedPool, PoolMetrics, SessionRouter
+
+
+class FakeEngine:
+    # stands in for a replica engine when measuring its lag
+
+    def __init__(self, host: str, lag):
+        self.url = SimpleNamespace(host=host)
+        self.lag = lag
+
+    @asynccontextmanager
+    async def connect(self):
+        if isinstance(self.lag, Exception):
+            raise self.lag
+        yield SimpleNamespace(execute=self.execute)
+
+    async def execute(self, query):
+        return SimpleNamespace(scalar=lambda: self.lag)
+
+
+def make_router(*lags) -> SessionRouter:
+    router = SessionRouter(postgres.async_session, [])
+    for index, lag in enumerate(lags):
+        replica_engine = postgres.create_engine(
+            postgres.get_dsn(f'replica-{index}', 5432)
+        )
+        router.replicas.append((FakeEngine(f'replica-{index}', lag),
+                                postgres.async_sessionmaker(replica_engine)))
+    return router
+
+
+def bound_host(session) -> str:
+    return session.bind.url.host
+
+
+@pytest.mark.asyncio
+async def test_lagging_replicas_fall_back_to_the_primary(monkeypatch):
+    monkeypatch.setattr(postgres.settings, 'db_replica_max_lag_seconds', 5)
+    router = make_router(30, ConnectionError('down'), None)
+
+    await router.check_replicas()
+
+    assert router.healthy == []
+    assert bound_host(router.read_session()) == postgres.engine.url.host
+
+
+@pytest.mark.asyncio
+async def test_reads_skip_only_the_lagging_replica(monkeypatch):
+    monkeypatch.setattr(postgres.settings, 'db_replica_max_lag_seconds', 5)
+    router = make_router(30, 0, 2)
+
+    await router.check_replicas()
+
+    hosts = {bound_host(router.read_session()) for _ in range(4)}
+    assert hosts == {'replica-1', 'replica-2'}
+
+
+@pytest.mark.asyncio
+async def test_hosts_not_in_recovery_get_no_reads(monkeypatch):
+    monkeypatch.setattr(postgres.settings, 'db_replica_max_lag_seconds', 5)
+    # a promoted replica answers the lag query with NULL
+    router = make_router(None, 1)
+
+    await router.check_replicas()
+
+    hosts = {bound_host(router.read_session()) for _ in range(4)}
+    assert hosts == {'replica-1'}
+    assert 'pg_is_in_recovery()' in str(postgres.REPLICA_LAG_QUERY)
+
+
+@pytest.mark.asyncio
+async def test_writes_never_use_a_replica(monkeypatch):
+    router = make_router(0)
+    await router.check_replicas()
+    monkeypatch.setattr(postgres, 'session_router', router)
+
+    reads, writes = postgres.get_read_session(), postgres.get_session()
+    read, write = await anext(reads), await anext(writes)
+
+    assert bound_host(read) == 'replica-0'
+    assert bound_host(router.write_session()) == postgres.engine.url.host
+    assert bound_host(write) == postgres.engine.url.host
+    await reads.aclose()
+    await writes.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pool_counts_only_checkouts_that_wait(monkeypatch):
+    metrics = PoolMetrics()
+    monkeypatch.setattr(postgres, 'pool_metrics', metrics)
+    waiting_while_connecting = []
+
+    def connect():
+        # opening a connection is not waiting for one
+        waiting_while_connecting.append(metrics.waiting)
+        return mock.Mock()
+
+    pool = InstrumentedPool(connect, pool_size=1, max_overflow=0, timeout=5)
+
+    held = await greenlet_spawn(pool.connect)
+    assert waiting_while_connecting == [0]
+
+    waiter = asyncio.create_task(greenlet_spawn(pool.connect))
+    for _ in range(100):
+        if metrics.waiting:
+            break
+        await asyncio.sleep(0)
+    assert metrics.waiting == 1
+
+    await greenlet_spawn(held.close)
+    connection = await waiter
+    assert metrics.waiting == 0
+    assert metrics.checkouts == 2
+    assert metrics.checkout_timeouts == 0
+    await greenlet_spawn(connection.close)
+
+    # an idle connection is handed out without waiting
+    await greenlet_spawn(lambda: pool.connect().close())
+    assert metrics.waiting == 0
+    assert metrics.checkouts == 3
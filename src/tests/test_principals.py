@@ -0,0 +1,227 @@
+import datetime
+import uuid
+from types import SimpleNamespace
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from core.config import settings
+from db.memory.lru_cache import LRUCache
+from models.principal import Principal
+from services import roles, users
+from services.principal_cache import get_token_key
+from services.roles import RoleService
+from services.users import UserService
+
+
+class FakeSession:
+    # collects the refresh tokens get_token_pair stores
+
+    def __init__(self):
+        self.added = []
+
+    def add(self, row):
+        self.added.append(row)
+
+    async def commit(self):
+        pass
+
+
+class RoleSession:
+    # the primary as RoleService sees it: the version bump is applied to
+    # the single user that holds the role
+
+    def __init__(self, user, role):
+        self.user = user
+        self.role = role
+        self.commits = 0
+
+    async def execute(self, statement):
+        self.user.permission_version += 1
+        return SimpleNamespace(
+            all=lambda: [(self.user.id, self.user.permission_version)]
+        )
+
+    async def commit(self):
+        self.commits += 1
+
+    async def refresh(self, row):
+        pass
+
+    async def delete(self, row):
+        pass
+
+
+@pytest.fixture
+def service(monkeypatch) -> UserService:
+    monkeypatch.setattr(settings, 'token_format', 'principal')
+    monkeypatch.setattr(users, 'principal_cache', LRUCache(100, 60))
+    monkeypatch.setattr(users, 'get_revocations', lambda: None)
+    monkeypatch.setattr(roles, 'get_revocations', lambda: None)
+    return UserService(FakeSession(), LRUCache(100, 60), None, None)
+
+
+def make_user(**fields) -> SimpleNamespace:
+    return SimpleNamespace(**{
+        'id': uuid.uuid4(), 'login': 'user', 'continent': None,
+        'roles': [SimpleNamespace(name='editor')], 'is_superuser': False,
+        'permission_version': 3, **fields
+    })
+
+
+async def issue(service: UserService, user) -> dict:
+    response = await service.get_token_pair(user)
+    return orjson.loads(response.body)
+
+
+async def rejects(service: UserService, token: str) -> str:
+    with pytest.raises(HTTPException) as raised:
+        await service.get_principal(token)
+    assert raised.value.status_code == 401
+    return raised.value.detail
+
+
+@pytest.mark.asyncio
+async def test_cached_principal_is_served_without_decoding(service,
+                                                           monkeypatch):
+    tokens = await issue(service, make_user())
+    principal = await service.get_principal(tokens['token'])
+
+    def decode_again():
+        raise AssertionError('a cache hit must not decode the token')
+
+    monkeypatch.setattr(users, 'get_key_store', decode_again)
+    assert await service.get_principal(tokens['token']) == principal
+
+
+@pytest.mark.asyncio
+async def test_cache_entry_ends_with_its_access_token(service):
+    tokens = await issue(service, make_user())
+    await service.get_principal(tokens['token'])
+
+    expire_at, _ = users.principal_cache._items[get_token_key(tokens['token'])]
+    lifetime = expire_at - users.time.monotonic()
+    assert 0 < lifetime <= settings.access_token_lifetime
+
+
+@pytest.mark.asyncio
+async def test_expired_principal_is_rejected_on_a_hit(service):
+    key = get_token_key('token')
+    expired = datetime.datetime.now() - datetime.timedelta(seconds=1)
+    await users.principal_cache.put(key, Principal(
+        id='1', login='user', jti='jti', expire=str(expired)
+    ).json(), 60)
+
+    assert await rejects(service, 'token') == 'Token expired!'
+    assert await users.principal_cache.get(key) is None
+
+
+@pytest.mark.asyncio
+async def test_revoked_token_is_rejected_on_a_hit(service):
+    tokens = await issue(service, make_user())
+    principal = await service.get_principal(tokens['token'])
+
+    await service.redis.put(f'token:{principal.jti}', tokens['token'], 60)
+
+    assert await rejects(service, tokens['token']) \
+        == 'Token has been invalidated!'
+    assert await users.principal_cache.get(
+        get_token_key(tokens['token'])
+    ) is None
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_is_not_an_access_token(service):
+    tokens = await issue(service, make_user())
+
+    assert await rejects(service, tokens['refresh_token']) == 'Invalid token!'
+    assert users.principal_cache.stats()['size'] == 0
+
+
+@pytest.mark.asyncio
+async def test_principal_claims_round_trip(service):
+    user = make_user(is_superuser=True)
+    tokens = await issue(service, user)
+
+    # pg_read_session is None: the claims alone must be enough
+    principal = await service.get_principal(tokens['token'])
+
+    assert principal.id == str(user.id)
+    assert principal.login == user.login
+    assert principal.is_superuser is True
+    assert principal.roles == ['editor']
+    assert principal.permission_version == 3
+
+
+def role_service(service: UserService, user, role,
+                 monkeypatch) -> RoleService:
+    session = RoleSession(user, role)
+
+    async def get_role(*args):
+        return role
+
+    async def get_user(*args, **kwargs):
+        return user
+
+    monkeypatch.setattr(roles.RoleRepository, 'get_by_id', get_role)
+    monkeypatch.setattr(roles.RoleRepository, 'get_by_name', get_role)
+    monkeypatch.setattr(roles.UserRepository, 'get_by_login', get_user)
+    return RoleService(session, service.redis, None)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('change, holds_role', [
+    (lambda roles, role: roles.update_role(role.id, 'writer'), True),
+    (lambda roles, role: roles.delete_role(role.id), True),
+    (lambda roles, role: roles.assign_role_to_user('user', role.name), False),
+    (lambda roles, role: roles.remove_role_from_user('user', role.name), True),
+], ids=['update', 'delete', 'assign', 'remove'])
+async def test_role_change_invalidates_older_tokens(service, monkeypatch,
+                                                    change, holds_role):
+    role = SimpleNamespace(id=uuid.uuid4(), name='editor', description=None)
+    user = make_user(roles=[role] if holds_role else [])
+    stale = await issue(service, user)
+    await service.get_principal(stale['token'])
+
+    await change(role_service(service, user, role, monkeypatch), role)
+
+    assert user.permission_version == 4
+    assert await rejects(service, stale['token']) \
+        == 'Token has been invalidated!'
+    fresh = await issue(service, user)
+    principal = await service.get_principal(fresh['token'])
+    assert principal.permission_version == 4
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_reuse_revokes_issued_access_tokens(service,
+                                                                monkeypatch):
+    tokens = await issue(service, make_user())
+    await service.get_principal(tokens['token'])
+    row = service.pg_session.added[0]
+    row.used_at = datetime.datetime.now()
+
+    class ReusedTokens:
+        # the refresh token was rotated already: consuming it again fails
+
+        def __init__(self, session):
+            pass
+
+        async def consume(self, token_hash, now):
+            return None
+
+        async def get_by_hash(self, token_hash):
+            return row
+
+        async def revoke_family(self, family_id):
+            assert family_id == row.family_id
+            return [row.jti]
+
+    monkeypatch.setattr(users, 'RefreshTokenRepository', ReusedTokens)
+
+    with pytest.raises(HTTPException):
+        await service.decode_refresh_token(tokens['refresh_token'])
+
+    assert await rejects(service, tokens['token']) \
+        == 'Token has been invalidated!'
@@ -0,0 +1,113 @@
+import pytest
+from starlette.requests import Request
+
+from core.rate_limits import Policy
+from models.principal import Principal
+from services import rate_limiter as rate_limiter_module
+from services.jwt_keys import KeyStore
+from services.principal_cache import get_token_key, principal_cache
+from services.rate_limiter import RateLimiter, get_rate_limit_key
+
+
+def make_request(host: str, headers: dict) -> Request:
+    return Request({
+        'type': 'http',
+        'headers': [(name.lower().encode(), value.encode())
+                    for name, value in headers.items()],
+        'client': (host, 1234),
+    })
+
+
+@pytest.mark.asyncio
+async def test_local_limiter_checks_every_window():
+    limiter = RateLimiter()
+    windows = ((2, 1), (3, 60))
+
+    decisions = [limiter.hit('signin:ip:127.0.0.1', windows)
+                 for _ in range(4)]
+
+    assert [d.allowed for d in decisions] == [True, True, False, False]
+    assert decisions[1].remaining == 0
+    assert decisions[2].headers(Policy(windows))['Retry-After'] == '1'
+    assert limiter.hit('signin:ip:10.0.0.1', windows).allowed
+
+
+@pytest.mark.asyncio
+async def test_forwarded_for_is_trusted_only_from_proxies(monkeypatch):
+    monkeypatch.setattr(rate_limiter_module, 'trusted_proxies',
+                        [rate_limiter_module.ipaddress.ip_network('10.0.0.0/8')])
+    policy = Policy(((5, 60),), key='ip')
+    headers = {'X-Forwarded-For': '203.0.113.7, 10.0.0.3'}
+
+    assert await get_rate_limit_key(make_request('10.0.0.2', headers),
+                                    policy) == 'ip:203.0.113.7'
+    assert await get_rate_limit_key(make_request('198.51.100.1', headers),
+                                    policy) == 'ip:198.51.100.1'
+
+
+@pytest.fixture
+def key_store(monkeypatch):
+    store = KeyStore('HS256', 'secret')
+    monkeypatch.setattr(rate_limiter_module, 'get_key_store', lambda: store)
+    return store
+
+
+@pytest.mark.asyncio
+async def test_principal_key_comes_from_the_principal_cache(key_store):
+    token = 'cached-token'
+    await principal_cache.put(get_token_key(token), Principal(
+        id='42', login='user', jti='jti', expire='2100-01-01 00:00:00'
+    ).json(), 60)
+    policy = Policy(((5, 60),), key='principal')
+    headers = {'Authorization': f'Bearer {token}'}
+
+    try:
+        assert await get_rate_limit_key(make_request('198.51.100.1', headers),
+                                        policy) == 'principal:42'
+    finally:
+        await principal_cache.delete(get_token_key(token))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('expire, key', [
+    ('2100-01-01 00:00:00', 'principal:42'),
+    ('2000-01-01 00:00:00', 'ip:198.51.100.1'),
+])
+async def test_expired_tokens_are_limited_by_ip(key_store, expire, key):
+    token = key_store.encode({'sub': '42', 'user': 'user',
+                              'expire': expire})
+    policy = Policy(((5, 60),), key='principal')
+    headers = {'Authorization': f'Bearer {token}'}
+
+    assert await get_rate_limit_key(make_request('198.51.100.1', headers),
+                                    policy) == key
+
+
+@pytest.mark.asyncio
+async def test_principal_key_is_the_user_id_on_a_hit_and_a_miss(key_store):
+    token = key_store.encode({'sub': '42', 'user': 'login', 'jti': 'jti',
+                              'expire': '2100-01-01 00:00:00'})
+    policy = Policy(((5, 60),), key='principal')
+    request = make_request('198.51.100.1', {'Authorization': f'Bearer {token}'})
+
+    miss = await get_rate_limit_key(request, policy)
+    await principal_cache.put(get_token_key(token), Principal(
+        id='42', login='login', jti='jti', expire='2100-01-01 00:00:00'
+    ).json(), 60)
+    try:
+        hit = await get_rate_limit_key(request, policy)
+    finally:
+        await principal_cache.delete(get_token_key(token))
+
+    assert miss == hit == 'principal:42'
+
+
+@pytest.mark.asyncio
+async def test_tokens_without_a_user_id_are_never_keyed_by_login(key_store):
+    token = key_store.encode({'user': 'login',
+                              'expire': '2100-01-01 00:00:00'})
+    request = make_request('198.51.100.1', {'Authorization': f'Bearer {token}'})
+
+    assert await get_rate_limit_key(
+        request, Policy(((5, 60),), key='principal')
+    ) == 'ip:198.51.100.1'
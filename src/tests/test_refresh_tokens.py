@@ -0,0 +1,63 @@
+import pytest
+
+from core.config import settings
+from services import refresh_tokens
+from services.refresh_tokens import RefreshTokenSweeper
+
+
+class FakeSession:
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def commit(self):
+        pass
+
+
+class SharedTokens:
+    # expired rows shared by every worker; locked while another worker
+    # holds the sweep lock
+
+    expired = 0
+    locked = False
+
+    def __init__(self, session):
+        self.session = session
+
+    async def try_lock_sweep(self) -> bool:
+        return not SharedTokens.locked
+
+    async def delete_expired(self, now, limit: int) -> int:
+        count = min(limit, SharedTokens.expired)
+        SharedTokens.expired -= count
+        return count
+
+
+@pytest.fixture
+def tokens(monkeypatch):
+    monkeypatch.setattr(settings, 'refresh_token_sweep_batch_size', 2)
+    monkeypatch.setattr(refresh_tokens, 'RefreshTokenRepository',
+                        SharedTokens)
+    SharedTokens.expired = 5
+    SharedTokens.locked = False
+    return SharedTokens
+
+
+@pytest.mark.asyncio
+async def test_sweep_deletes_in_batches(tokens):
+    sweeper = RefreshTokenSweeper(FakeSession)
+
+    assert await sweeper.sweep() == 5
+    assert tokens.expired == 0
+
+
+@pytest.mark.asyncio
+async def test_sweep_skips_while_another_worker_holds_the_lock(tokens):
+    tokens.locked = True
+    sweeper = RefreshTokenSweeper(FakeSession)
+
+    assert await sweeper.sweep() == 0
+    assert tokens.expired == 5
@@ -0,0 +1,69 @@
+import datetime
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.compiler import SQLCompiler
+
+from db.partitions import (
+    drop_expired_login_partitions, ensure_login_partitions,
+    get_login_partitions, login_partition_name
+)
+from db.repositories.users import UserRepository
+from models.user import Continent, User
+from tests.conftest import TEST_ADM_LOGIN, TEST_USR_LOGIN
+
+
+@pytest.mark.asyncio
+async def test_user_lookup_compiles_once(prepare_db, monkeypatch):
+    compiles = []
+    original_init = SQLCompiler.__init__
+
+    def counting_init(self, *args, **kwargs):
+        compiles.append(1)
+        original_init(self, *args, **kwargs)
+
+    async with AsyncSession(prepare_db) as session:
+        repository = UserRepository(session)
+        # warm up the compiled cache for both statement shapes
+        await repository.get_by_login(TEST_ADM_LOGIN, with_roles=True)
+
+        monkeypatch.setattr(SQLCompiler, '__init__', counting_init)
+        admin = await repository.get_by_login(TEST_ADM_LOGIN, with_roles=True)
+        session.expunge_all()
+        user = await repository.get_by_login(TEST_USR_LOGIN, with_roles=True)
+
+    assert admin.login == TEST_ADM_LOGIN
+    assert user.login == TEST_USR_LOGIN
+    assert compiles == []
+
+
+@pytest.mark.asyncio
+async def test_login_lookup_prunes_partitions(prepare_db):
+    async with AsyncSession(prepare_db) as session:
+        continent = await UserRepository(session).get_continent(TEST_ADM_LOGIN)
+        stmt = select(User).where(
+            User.login == TEST_ADM_LOGIN, User.continent == continent
+        ).compile(dialect=session.bind.dialect,
+                  compile_kwargs={'literal_binds': True})
+        result = await session.execute(text(f'EXPLAIN {stmt}'))
+        plan = '\n'.join(row[0] for row in result)
+
+    partitions = [f'users_{item.replace(" ", "").lower()}'
+                  for item in Continent]
+    scanned = [name for name in partitions if f' {name} ' in plan]
+    assert scanned == [f'users_{continent.replace(" ", "").lower()}']
+
+
+@pytest.mark.asyncio
+async def test_expired_login_partitions_are_dropped(prepare_db):
+    async with prepare_db.begin() as conn:
+        created = await ensure_login_partitions(
+            conn, 0, today=datetime.date(2000, 1, 15)
+        )
+        dropped = await drop_expired_login_partitions(conn, 12)
+        partitions = await get_login_partitions(conn)
+
+    assert created == ['users_logins_2000_01']
+    assert dropped == ['users_logins_2000_01']
+    assert login_partition_name(datetime.date.today()) in partitions
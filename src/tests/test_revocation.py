@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from services.revocation import BloomFilter, RevocationSet
+
+
+class ScanningRedis:
+    # just enough of redis.asyncio.Redis for resync; the scan pauses until
+    # released so the test can revoke a token in the middle of it
+
+    def __init__(self, keys: dict):
+        self.keys = keys
+        self.scanning = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def scan_iter(self, match: str, count: int):
+        prefix = match.rstrip('*')
+        for key in list(self.keys):
+            if key.startswith(prefix):
+                self.scanning.set()
+                await self.release.wait()
+                yield key
+
+    async def mget(self, keys: list):
+        return [self.keys[key] for key in keys]
+
+
+class SubscribingRedis:
+    # counts the scans a worker makes on boot; the subscription stays idle
+
+    def __init__(self, keys: dict):
+        self.keys = keys
+        self.scans = []
+
+    async def scan_iter(self, match: str, count: int):
+        self.scans.append(match)
+        for key in list(self.keys):
+            if key.startswith(match.rstrip('*')):
+                yield key
+
+    async def mget(self, keys: list):
+        return [self.keys[key] for key in keys]
+
+    def pubsub(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def subscribe(self, channel: str):
+        pass
+
+    async def listen(self):
+        await asyncio.Event().wait()
+        yield
+
+    async def close(self):
+        pass
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    items = [f'jti-{i}' for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items)
+    false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+@pytest.mark.asyncio
+async def test_revocation_during_resync_is_kept():
+    redis = ScanningRedis({'token:old': '1', 'perm_version:u1': '2'})
+    revocations = RevocationSet(redis)
+
+    resync = asyncio.create_task(revocations.resync())
+    await redis.scanning.wait()
+    revocations._apply('jti:new')
+    revocations._apply('pv:u2:5')
+    redis.release.set()
+    await resync
+
+    assert revocations.might_be_revoked('old')
+    assert revocations.might_be_revoked('new')
+    assert revocations.permission_version('u1') == 2
+    assert revocations.permission_version('u2') == 5
+
+
+@pytest.mark.asyncio
+async def test_start_scans_once_after_subscribing():
+    redis = SubscribingRedis({'token:old': '1', 'perm_version:u1': '2'})
+    revocations = RevocationSet(redis)
+
+    await revocations.start()
+
+    assert redis.scans == ['token:*', 'perm_version:*']
+    assert revocations.might_be_revoked('old')
+    assert revocations.permission_version('u1') == 2
+    await revocations.stop()
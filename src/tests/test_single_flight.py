@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from services.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_are_coalesced():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 'value'
+
+    results = await asyncio.gather(
+        *(single_flight.do('key', load) for _ in range(5))
+    )
+
+    assert results == ['value'] * 5
+    assert calls == 1
+    assert single_flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_exception_is_propagated_to_every_caller():
+    single_flight = SingleFlight()
+
+    async def load():
+        await asyncio.sleep(0.01)
+        raise ValueError('boom')
+
+    results = await asyncio.gather(
+        *(single_flight.do('key', load) for _ in range(3)),
+        return_exceptions=True
+    )
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert single_flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_followers_survive_leader_cancellation():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    leader = asyncio.create_task(single_flight.do('key', load))
+    await asyncio.sleep(0)
+    followers = [asyncio.create_task(single_flight.do('key', load))
+                 for _ in range(3)]
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    results = await asyncio.gather(*followers)
+
+    assert leader.cancelled()
+    # one follower took over the load and the others joined it
+    assert results == [2, 2, 2]
+    assert calls == 2
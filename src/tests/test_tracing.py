@@ -0,0 +1,40 @@
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import \
+    InMemorySpanExporter
+from opentelemetry.sdk.trace.sampling import ALWAYS_OFF
+from opentelemetry.trace import Status, StatusCode
+
+from core.tracing import (ErrorKeepingSpanProcessor, RecordUnsampled,
+                          create_tracer_provider, get_sampler)
+
+
+def test_unsampled_spans_are_exported_only_on_error():
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider(sampler=RecordUnsampled(ALWAYS_OFF))
+    provider.add_span_processor(ErrorKeepingSpanProcessor(exporter))
+    tracer = provider.get_tracer(__name__)
+
+    with tracer.start_as_current_span('ok'):
+        pass
+    with tracer.start_as_current_span('failed') as span:
+        span.set_status(Status(StatusCode.ERROR))
+    provider.force_flush()
+
+    assert [span.name for span in exporter.get_finished_spans()] == ['failed']
+    provider.shutdown()
+
+
+def test_provider_uses_the_given_sampler_and_stays_local():
+    exporter = InMemorySpanExporter()
+    provider = create_tracer_provider([exporter], get_sampler(1.0))
+    global_provider = trace.get_tracer_provider()
+
+    with provider.get_tracer(__name__).start_as_current_span('sampled'):
+        pass
+    provider.force_flush()
+
+    assert [span.name for span in exporter.get_finished_spans()] \
+        == ['sampled']
+    assert trace.get_tracer_provider() is global_provider
+    provider.shutdown()
@@ -229,3 +229,44 @@ async def test_logout_invalid_token(client: AsyncClient):
     response = await client.post("/logout", headers=headers)
     assert response.status_code == 401
     assert response.json()["detail"] == "Invalid token!"
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_reuse_revokes_family(client: AsyncClient):
+    await client.post(
+        "/api/users/signup",
+        json={
+            "login": "rotationuser",
+            "password": "rotationpassword",
+            "first_name": "Rotation",
+            "last_name": "User"
+        }
+    )
+    response_signin = await client.post(
+        "/api/users/signin",
+        json={
+            "login": "rotationuser",
+            "password": "rotationpassword"
+        }
+    )
+    first_token = response_signin.json()["refresh_token"]
+
+    response = await client.post("/api/users/refresh",
+                                 json={"token": first_token})
+    assert response.status_code == 200
+    second_token = response.json()["refresh_token"]
+    access_token = response.json()["token"]
+    assert second_token != first_token
+
+    response_reuse = await client.post("/api/users/refresh",
+                                       json={"token": first_token})
+    assert response_reuse.status_code == 401
+
+    response_revoked = await client.post("/api/users/refresh",
+                                         json={"token": second_token})
+    assert response_revoked.status_code == 401
+
+    # the access token issued with the revoked family stops working too
+    response_access = await client.post("/api/users/check_token",
+                                        json={"token": access_token})
+    assert response_access.json() == {"data": "token expired!"}